@@ -1,8 +1,24 @@
 from django.contrib import admin
 
+from . import paginator
 from .models import Kind, Materiel, Product, Thing
 
 
+class LargeChangelistMixin():
+    """Keyset pagination and a cheaper count for large changelists.
+
+    count_mode: paginator.EXACT, CACHED or APPROXIMATE.
+    """
+    count_mode = paginator.CACHED
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return paginator.KeysetPaginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            count_mode=self.count_mode)
+
+
 @admin.register(Kind)
 class KindAdmin(admin.ModelAdmin):
     model = Kind
@@ -10,9 +26,10 @@ class KindAdmin(admin.ModelAdmin):
 
 
 @admin.register(Thing)
-class ThingAdmin(admin.ModelAdmin):
+class ThingAdmin(LargeChangelistMixin, admin.ModelAdmin):
     model = Thing
     list_display = ['img_name_html', 'rank', 'kind', 'desc']
+    list_select_related = ('kind',)
 
 
 class MaterielParentInline(admin.TabularInline):
@@ -31,14 +48,16 @@ class MaterielComponentInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeChangelistMixin, admin.ModelAdmin):
     model = Product
     inlines = (MaterielParentInline, MaterielComponentInline)
     list_display = [
         'thing_img_name_html', 'thing_kind', 'prod_secs', 'low_level']
+    list_select_related = ('kind',)
 
     def thing_kind(self, product):
-        return product.thing.kind
+        # The inherited 'kind' is joined, 'product.thing' would not have it.
+        return product.kind
 
     def thing_img_name_html(self, product):
         return product.thing.img_name_html()
@@ -46,11 +65,14 @@ class ProductAdmin(admin.ModelAdmin):
 
 
 @admin.register(Materiel)
-class MaterielAdmin(admin.ModelAdmin):
+class MaterielAdmin(LargeChangelistMixin, admin.ModelAdmin):
     model = Materiel
     list_display = [
         'id',
         'parent_img_name_html', 'component_img_name_html', 'quantity']
+    # Joining the Products (and their parent Things) is enough:
+    # 'materiel.parent.thing' is built from the Product's inherited fields.
+    list_select_related = ('parent', 'component')
 
     def parent_img_name_html(self, materiel):
         return materiel.parent.thing.img_name_html()
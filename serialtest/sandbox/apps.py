@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SandboxConfig(AppConfig):
     name = 'sandbox'
+
+    def ready(self):
+        from . import signals  # noqa: F401 pylint: disable=unused-import
@@ -0,0 +1,243 @@
+"""ASGI application of the async API paths, served beside the WSGI app.
+
+    /api/things/<iden>/     Thing by natural key (as in sandbox.views)
+    /api/products/<iden>/   Product by natural key
+    /api/changes/           Long poll of the catalog and BOM changes
+
+Django 2.1 has no ASGI support, so this is a plain ASGI 3 application, run
+by any ASGI server (e.g. uvicorn serialtest.asgi:application); the admin
+and the other views stay on WSGI. The ORM is synchronous: lookups run in a
+pool of DB_THREADS threads, each with its own connection. A waiting long
+poll holds no thread, only a coroutine, so one process holds thousands.
+
+    GET /api/changes/?token=<token>&timeout=<secs>
+
+The token stands for the versions (see sandbox.versions) of the WATCHED
+counters a client has seen. The response, as soon as they differ from the
+token's, is {"token": ..., "versions": {...}}; without a token, it is sent
+at once. When the timeout (default 30, at most 300 seconds) passes first,
+the response is 204 No Content. One ChangeBroker per process reads the
+counters for all the clients every POLL_INTERVAL, and right after a save
+or delete is committed in the process.
+"""
+
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.http import parse_etags
+
+from . import bomindex, versions, views
+from .models import Kind, Materiel, Product, Thing
+
+POLL_INTERVAL = 0.5
+DEFAULT_TIMEOUT = 30
+MAX_TIMEOUT = 300
+DB_THREADS = 4
+
+WATCHED = tuple(
+    [versions.model_version_name(model) for model in (Kind, Thing, Materiel)] +
+    [bomindex.VERSION_NAME])
+
+LOOKUPS = (
+    (re.compile(r'^/api/things/(?P<iden>[^/]+)/$'), Thing, views.THING_FIELDS),
+    (re.compile(r'^/api/products/(?P<iden>[^/]+)/$'), Product, views.PRODUCT_FIELDS),
+)
+CHANGES_PATH = '/api/changes/'
+
+_executor = ThreadPoolExecutor(max_workers=DB_THREADS)
+
+
+class ChangeBroker():
+    """Reads the watched versions for all the waiting long polls.
+
+    changed is a Future, resolved and replaced when the versions change.
+    """
+    def __init__(self, names=WATCHED, interval=POLL_INTERVAL):
+        self.names = names
+        self.interval = interval
+        self.versions = {}
+        self.token = None
+        self.changed = None
+        self.waiting = 0
+        self.loop = None
+        self.task = None
+        self.wake_pending = False
+
+    def start(self):
+        """Start polling on the running event loop, once."""
+        if self.task is None:
+            self.loop = asyncio.get_event_loop()
+            self.changed = self.loop.create_future()
+            self.refresh()
+            self.task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.refresh()
+
+    def refresh(self):
+        self.wake_pending = False
+        current = versions.get_versions(self.names)
+        token = '.'.join(str(current[name]) for name in self.names)
+        if token != self.token:
+            first = self.token is None
+            self.versions, self.token = current, token
+            if not first:
+                self.changed.set_result(token)
+                self.changed = self.loop.create_future()
+
+    def wake(self):
+        """Refresh soon. Safe to call from any thread."""
+        if self.loop is not None and not self.wake_pending:
+            self.wake_pending = True
+            self.loop.call_soon_threadsafe(self.refresh)
+
+    async def wait(self, token, timeout, disconnected):
+        """Wait up to timeout seconds for the versions to differ from token.
+
+        Returns whether they did; False also if the client disconnected.
+        """
+        if token != self.token:
+            return True
+        self.waiting += 1
+        try:
+            await asyncio.wait(
+                [self.changed, disconnected], timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.waiting -= 1
+        return token != self.token and not disconnected.done()
+
+
+broker = ChangeBroker()
+
+
+def changed_wake_broker(sender, using, **kwargs):
+    """Wake the broker once a sandbox save or delete is committed."""
+    if sender._meta.app_label == 'sandbox' and broker.loop is not None:
+        transaction.on_commit(broker.wake, using=using)
+
+
+post_save.connect(changed_wake_broker, dispatch_uid='sandbox_asgi_saved_wake_broker')
+post_delete.connect(changed_wake_broker, dispatch_uid='sandbox_asgi_deleted_wake_broker')
+
+
+async def send_response(send, status, body=b'', content_type='application/json', headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type.encode()),
+            (b'content-length', str(len(body)).encode()),
+            (b'cache-control', b'no-cache'),
+        ] + [(name.encode(), value.encode()) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, data, status=200, headers=()):
+    body = json.dumps(data, cls=DjangoJSONEncoder).encode()
+    await send_response(send, status, body, headers=headers)
+
+
+def lookup(model, fields, iden):
+    """Read the resource of a natural key, in a pool thread."""
+    try:
+        row = model.objects.filter(iden=iden).values(*fields).first()
+        return None if row is None else views.resource(row)
+    finally:
+        close_old_connections()
+
+
+async def read_body(receive):
+    """Read the request body; returns whether the client disconnected."""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return True
+        if not message.get('more_body'):
+            return False
+
+
+async def lookup_view(scope, send, model, fields, iden):
+    headers = dict(scope['headers'])
+    loop = asyncio.get_event_loop()
+    etag = await loop.run_in_executor(_executor, views.etag_of, *[
+        versions.model_version_name(model) for model in (Kind, model)])
+    if etag in parse_etags(headers.get(b'if-none-match', b'').decode('latin-1')):
+        await send_response(send, 304, headers=[('etag', etag)])
+        return
+    resource = await loop.run_in_executor(_executor, lookup, model, fields, iden)
+    if resource is None:
+        await send_json(send, {'detail': f'No {model._meta.verbose_name} {iden}.'}, 404)
+    else:
+        await send_json(send, resource, headers=[('etag', etag)])
+
+
+async def changes_view(scope, receive, send):
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    token = query.get('token', [None])[0]
+    try:
+        timeout = min(float(query.get('timeout', [DEFAULT_TIMEOUT])[0]), MAX_TIMEOUT)
+    except ValueError:
+        await send_json(send, {'detail': 'timeout must be a number.'}, 400)
+        return
+    broker.start()
+    # After the request body, the next message is the client's disconnect.
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        if token is not None and not await broker.wait(token, timeout, disconnected):
+            if not disconnected.done():
+                await send_response(send, 204)
+            return
+    finally:
+        disconnected.cancel()
+    await send_json(send, {'token': broker.token, 'versions': broker.versions})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            broker.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            broker.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """The ASGI 3 application."""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise ValueError(f'Unsupported ASGI scope {scope["type"]}.')
+    if scope['method'] not in ('GET', 'HEAD'):
+        await send_json(send, {'detail': 'Method not allowed.'}, 405, [('allow', 'GET, HEAD')])
+        return
+    if await read_body(receive):
+        return
+    path = scope['path']
+    if path == CHANGES_PATH:
+        await changes_view(scope, receive, send)
+        return
+    for pattern, model, fields in LOOKUPS:
+        match = pattern.match(path)
+        if match:
+            await lookup_view(scope, send, model, fields, match.group('iden'))
+            return
+    await send_json(send, {'detail': 'Not found.'}, 404)
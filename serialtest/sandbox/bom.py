@@ -0,0 +1,157 @@
+"""Multi-level bill of materials explosion and where-used implosion.
+
+Walking product.materiels.all() recursively costs a query per node. Here one
+recursive CTE collects every Materiel line reachable from the Product, one
+more query gets the Products' details (from their FlatProducts, without the
+joins), and the indented bill is expanded in memory.
+"""
+
+from collections import defaultdict, namedtuple
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .lowlevel import BOMCycleError, batches
+from .models import Materiel, Product
+
+BOMLine = namedtuple('BOMLine', [
+    'level',              # 0 for the Product exploded (or imploded)
+    'above_id',           # Product of the line above (None at level 0)
+    'product_id',         # Product of this line
+    'iden',
+    'name',
+    'quantity',           # Per one of the line above (see implode())
+    'extended_quantity',  # Per the quantity of the level 0 Product
+    'prod_secs',          # Per one of this line's Product
+    'cumulative_secs',    # Extended quantity times rolled-up seconds
+])
+
+_REACHABLE_SQL = '''
+WITH RECURSIVE bom(parent_id, component_id, quantity) AS (
+    SELECT {parent}, {component}, {quantity} FROM {materiel} WHERE {start} = %s
+    UNION
+    SELECT m.{parent}, m.{component}, m.{quantity}
+    FROM {materiel} m INNER JOIN bom ON m.{start} = bom.{follow}
+)
+SELECT parent_id, component_id, quantity FROM bom
+'''
+
+
+def reachable_lines(pk, upward=False, using=DEFAULT_DB_ALIAS):
+    """Return the (parent, component, quantity) of the Materiel lines below pk.
+
+    Or above it, with upward. One query; the UNION stops on cycles.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    meta = Materiel._meta
+    parent = quote(meta.get_field('parent').column)
+    component = quote(meta.get_field('component').column)
+    start, follow = (component, 'parent_id') if upward else (parent, 'component_id')
+    sql = _REACHABLE_SQL.format(
+        materiel=quote(meta.db_table), parent=parent, component=component,
+        quantity=quote(meta.get_field('quantity').column),
+        start=start, follow=follow)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [pk])
+        return cursor.fetchall()
+
+
+def product_details(pks, using=DEFAULT_DB_ALIAS):
+    """Return a dict of (sort key, iden, name, prod_secs) by Product pk."""
+    details = {}
+    for batch in batches(pks, using):
+        rows = Product.objects.db_manager(using).flat().filter(pk__in=batch).order_by()
+        rows = rows.values_list('pk', 'kind_rank', 'rank', 'iden', 'name', 'prod_secs')
+        for pk, kind_rank, rank, iden, name, prod_secs in rows:
+            details[pk] = ((kind_rank, rank, pk), iden, name, prod_secs)
+    return details
+
+
+def rolled_up_secs(pk, components, details):
+    """Return the rolled-up production seconds per one of each Product below pk.
+
+    A Product's own prod_secs plus, for each line, the quantity times the
+    component's rolled-up seconds. Post-order walk; raises BOMCycleError.
+    """
+    secs = {}
+    on_path = set()
+    stack = [(pk, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            on_path.discard(node)
+            secs[node] = details[node][3] + sum(
+                quantity * secs[component] for component, quantity in components[node])
+            continue
+        if node in secs:
+            continue
+        if node in on_path:
+            raise BOMCycleError([node])
+        on_path.add(node)
+        stack.append((node, True))
+        for component, _ in components[node]:
+            if component in on_path:
+                raise BOMCycleError([node, component])
+            if component not in secs:
+                stack.append((component, False))
+    return secs
+
+
+def _indented(pk, quantity, links, details, secs):
+    """Expand the lines reachable from pk depth first, in Thing order."""
+    for related in links.values():
+        related.sort(key=lambda link: details[link[0]][0])
+    lines = []
+    stack = [(0, None, pk, quantity, quantity, frozenset())]
+    while stack:
+        level, above, node, per, extended, path = stack.pop()
+        _, iden, name, prod_secs = details[node]
+        lines.append(BOMLine(
+            level, above, node, iden, name, per, extended, prod_secs,
+            extended * secs[node] if secs is not None else None))
+        path = path | {node}
+        for related, per_related in reversed(links[node]):
+            if related in path:
+                raise BOMCycleError([node, related])
+            stack.append((
+                level + 1, node, related, per_related, extended * per_related, path))
+    return lines
+
+
+def explode(product, quantity=1, using=DEFAULT_DB_ALIAS):
+    """Return the indented bill of materials of quantity of a Product.
+
+    A list of BOMLine's, the Product itself first at level 0 and each
+    component under its parent, with extended quantities and cumulative
+    production seconds. Two queries, whatever the depth.
+    """
+    pk = getattr(product, 'pk', product)
+    components = defaultdict(list)
+    for parent, component, per in reachable_lines(pk, using=using):
+        components[parent].append((component, per))
+    details = product_details(
+        {pk} | {component for links in components.values() for component, _ in links}, using)
+    if pk not in details:
+        raise Product.DoesNotExist(f'Product {pk} does not exist.')
+    secs = rolled_up_secs(pk, components, details)
+    return _indented(pk, quantity, components, details, secs)
+
+
+def implode(product, using=DEFAULT_DB_ALIAS):
+    """Return the indented where-used list of a Product, following 'usedin'.
+
+    A list of BOMLine's, the Product itself first at level 0 and under each
+    Product the parents it is used in. Here the quantity is of the line
+    above per one of the line's Product, and the extended quantity of the
+    level 0 Product per one of the line's Product. Cumulative seconds are
+    not rolled up (None).
+    """
+    pk = getattr(product, 'pk', product)
+    parents = defaultdict(list)
+    for parent, component, per in reachable_lines(pk, upward=True, using=using):
+        parents[component].append((parent, per))
+    details = product_details(
+        {pk} | {parent for links in parents.values() for parent, _ in links}, using)
+    if pk not in details:
+        raise Product.DoesNotExist(f'Product {pk} does not exist.')
+    return _indented(pk, 1, parents, details, None)
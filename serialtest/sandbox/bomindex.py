@@ -0,0 +1,182 @@
+"""Compact in-memory index of the Materiel BOM graph.
+
+The graph in compressed sparse row (CSR) form, as int64 arrays: the sorted
+Product pk's, the offsets of each Product's lines, and the components (as
+indexes into the Product pk's) and quantities of the lines.
+
+The index is published as a snapshot file that each worker process maps
+read-only, so all the processes share one copy of the pages. Materiel saves
+and deletes bump the 'bom' version counter (see sandbox.versions), and
+get_index() rebuilds or remaps the snapshot when its version is stale.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import versions
+from .models import Materiel, Product
+
+VERSION_NAME = 'bom'
+
+_HEADER = struct.Struct('<8sqqq')  # magic, version, products, lines
+_MAGIC = b'SBOMCSR1'
+_TYPECODE = 'q'
+
+
+class BOMIndex():
+    """CSR adjacency of the Materiel BOM graph.
+
+    product_ids: Sorted Product pk's, a Product's index is its position.
+    offsets: The lines of product index i are offsets[i]:offsets[i + 1].
+    components: Product index of each line's component.
+    quantities: Quantity of each line.
+
+    The arrays are array.array's when built, or memoryview's of the mapped
+    snapshot when loaded.
+    """
+    def __init__(self, version, product_ids, offsets, components, quantities):
+        self.version = version
+        self.product_ids = product_ids
+        self.offsets = offsets
+        self.components = components
+        self.quantities = quantities
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def index_of(self, pk):
+        """Return the index of a Product pk, or None."""
+        index = bisect_left(self.product_ids, pk)
+        if index < len(self.product_ids) and self.product_ids[index] == pk:
+            return index
+        return None
+
+    def components_of(self, pk):
+        """Return the (component pk, quantity) of the Product's lines."""
+        index = self.index_of(pk)
+        if index is None:
+            return []
+        return [
+            (self.product_ids[self.components[line]], self.quantities[line])
+            for line in range(self.offsets[index], self.offsets[index + 1])]
+
+    def descendants(self, pk):
+        """Return the set of Product pk's used, at any depth, in the Product."""
+        index = self.index_of(pk)
+        if index is None:
+            return set()
+        found = set()
+        stack = [index]
+        while stack:
+            index = stack.pop()
+            for line in range(self.offsets[index], self.offsets[index + 1]):
+                component = self.components[line]
+                if component not in found:
+                    found.add(component)
+                    stack.append(component)
+        return {self.product_ids[index] for index in found}
+
+    @classmethod
+    def build(cls, version=0, using=DEFAULT_DB_ALIAS):
+        """Build the index from the database, in two queries."""
+        product_ids = array(_TYPECODE, sorted(
+            Product.objects.using(using).order_by().values_list('pk', flat=True).iterator()))
+        positions = {pk: index for index, pk in enumerate(product_ids)}
+        counts = array(_TYPECODE, bytes(8 * (len(product_ids) + 1)))
+        components = array(_TYPECODE)
+        quantities = array(_TYPECODE)
+        lines = Materiel.objects.using(using).order_by('parent_id', 'component_id').values_list(
+            'parent_id', 'component_id', 'quantity').iterator()
+        for parent, component, quantity in lines:
+            counts[positions[parent] + 1] += 1
+            components.append(positions[component])
+            quantities.append(quantity)
+        for index in range(len(product_ids)):
+            counts[index + 1] += counts[index]
+        return cls(version, product_ids, counts, components, quantities)
+
+    def write(self, path):
+        """Publish the index as a snapshot file, replacing it atomically."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.bomindex-')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                stream.write(_HEADER.pack(
+                    _MAGIC, self.version, len(self.product_ids), len(self.components)))
+                for values in (self.product_ids, self.offsets, self.components, self.quantities):
+                    values = array(_TYPECODE, values)
+                    if sys.byteorder != 'little':
+                        values.byteswap()
+                    values.tofile(stream)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Map a snapshot file read-only, without copying the arrays."""
+        with open(path, 'rb') as stream:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, products, lines = _HEADER.unpack_from(mapped)
+        if magic != _MAGIC:
+            raise ValueError(f'{path} is not a BOM index snapshot.')
+        if sys.byteorder != 'little':
+            values = array(_TYPECODE, mapped[_HEADER.size:])
+            values.byteswap()
+            values = memoryview(values)
+        else:
+            values = memoryview(mapped)[_HEADER.size:].cast(_TYPECODE)
+        sizes = (products, products + 1, lines, lines)
+        arrays = []
+        start = 0
+        for size in sizes:
+            arrays.append(values[start:start + size])
+            start += size
+        return cls(version, *arrays)
+
+
+def snapshot_path():
+    """The snapshot file, setting SANDBOX_BOM_INDEX_PATH."""
+    return getattr(
+        settings, 'SANDBOX_BOM_INDEX_PATH', os.path.join(settings.BASE_DIR, 'bomindex.bin'))
+
+
+def publish(using=DEFAULT_DB_ALIAS):
+    """Build the index at the current version and publish its snapshot."""
+    index = BOMIndex.build(versions.get_version(VERSION_NAME), using=using)
+    index.write(snapshot_path())
+    return index
+
+
+_current = None
+
+
+def get_index(using=DEFAULT_DB_ALIAS):
+    """Return the index at the current version.
+
+    Maps the published snapshot if it is current, otherwise rebuilds and
+    publishes it (the first process to notice does the work, unless several
+    notice at once).
+    """
+    global _current  # pylint: disable=global-statement
+    version = versions.get_version(VERSION_NAME)
+    if _current is not None and _current.version == version:
+        return _current
+    try:
+        index = BOMIndex.load(snapshot_path())
+    except (OSError, ValueError):
+        index = None
+    if index is None or index.version != version:
+        publish(using=using)
+        index = BOMIndex.load(snapshot_path())
+    _current = index
+    return _current
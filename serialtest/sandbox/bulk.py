@@ -0,0 +1,74 @@
+"""Bulk loading of the multi-table inherited Product models.
+
+QuerySet.bulk_create() refuses multi-table inherited models, leaving a
+save_base() per Product (plus a refresh_from_db() to see the Thing fields).
+bulk_create_products() inserts the parent Thing rows and the child rows with
+batched multi-row INSERTs instead.
+
+Like bulk_create(), no pre_save/post_save signals are sent. The Things, new
+or existing, share one change_seq (see sandbox.delta), the version of the
+Things is bumped once (see sandbox.versions), and new Products get their
+rolled-up seconds (see sandbox.rollup) and FlatProducts (see sandbox.flat).
+"""
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import flat, versions
+from .lowlevel import batches
+from .delta import next_change_seq
+from .models import Kind, Product, Product2, Product3, Thing
+
+MTI_PRODUCT_MODELS = (Product, Product2, Product3)
+
+
+def bulk_create_products(model, objs, batch_size=None, using=DEFAULT_DB_ALIAS):
+    """Insert Product, Product2 or Product3 objects in batches.
+
+    Objects with a pk (e.g. Product(thing=thing)) are children of existing
+    Things, and only their child row is inserted. Objects without one get a
+    new Thing row from their Thing fields. The assigned pk's are set on the
+    objects, which are returned.
+    """
+    if model not in MTI_PRODUCT_MODELS:
+        raise ValueError(f'{model.__name__} is not a multi-table inherited Product model.')
+    objs = list(objs)
+    parent_link = model._meta.get_ancestor_link(Thing)
+    with transaction.atomic(using=using, savepoint=False):
+        change_seq = next_change_seq(using)
+        for obj in objs:
+            obj.change_seq = change_seq
+        # The Thing rows of existing Things are not written: number them.
+        for batch in batches([obj.pk for obj in objs if obj.pk is not None], using):
+            Thing.objects.using(using).filter(pk__in=batch).update(change_seq=change_seq)
+        new = [obj for obj in objs if obj.pk is None]
+        if new:
+            parents = [
+                Thing(**{
+                    field.attname: getattr(obj, field.attname)
+                    for field in Thing._meta.concrete_fields})
+                for obj in new]
+            kind_ranks = dict(Kind.objects.using(using).filter(
+                pk__in={parent.kind_id for parent in parents}).values_list('pk', 'rank'))
+            for obj, parent in zip(new, parents):
+                obj.kind_rank = parent.kind_rank = kind_ranks.get(parent.kind_id, 0)
+            Thing.objects.using(using).bulk_create(parents, batch_size=batch_size)
+            # Backends that can not return the ids: look them up by iden.
+            missing = [parent.iden for parent in parents if parent.pk is None]
+            pks = Thing.objects.db_manager(using).in_bulk_by_natural_key(
+                (iden,) for iden in missing)
+            for obj, parent in zip(new, parents):
+                obj.pk = parent.pk if parent.pk is not None else pks[(parent.iden,)]
+        for obj in objs:
+            setattr(obj, Thing._meta.pk.attname, getattr(obj, parent_link.attname))
+            if model is Product:
+                # No Materiel lines refer to a new Product yet.
+                obj.rollup_secs = obj.prod_secs
+        model._base_manager.using(using)._batched_insert(
+            objs, model._meta.local_concrete_fields, batch_size)
+        versions.bump_model_version(model, using=using)
+        if model is Product:
+            flat.refresh([obj.pk for obj in objs], using=using)
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
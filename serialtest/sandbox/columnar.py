@@ -0,0 +1,443 @@
+"""Binary columnar serialization of the Sandbox catalog.
+
+Each run of objects of one model is written as a section of typed column
+arrays instead of a record per object:
+
+    integer fields:  int64 arrays
+    string fields:   int32 indexes into the stream's string table
+    natural keys:    int32 indexes into the stream's natural key table
+    other values:    a JSON list (dates, decimals, NULLs in integer fields)
+
+Each string and each natural key is stored once however many rows refer to
+it. With use_natural_primary_keys, a section also has a column of the rows'
+own natural keys, which are resolved with one in_bulk_by_natural_key()
+query per model when the section is read.
+
+Registered as the 'columnar' serialization format (see SERIALIZATION_MODULES
+in settings). The format is binary: serialize() returns bytes and writes to
+binary streams only, so dumpdata, which writes text, can not use it.
+"""
+
+import io
+import json
+import struct
+import sys
+from array import array
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.serializers import base
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.encoding import is_protected_type
+
+from .lowlevel import batches
+
+MAGIC = b'SBXC'
+VERSION = 1
+
+INT = b'i'
+STRING = b's'
+KEY = b'k'
+JSON = b'j'
+
+NATURAL_KEY_COLUMN = '__natural_key__'
+
+INTEGER_TYPES = {
+    'AutoField', 'BigAutoField', 'BigIntegerField', 'IntegerField',
+    'PositiveIntegerField', 'PositiveSmallIntegerField', 'SmallIntegerField',
+}
+STRING_TYPES = {
+    'CharField', 'EmailField', 'FileField', 'FilePathField', 'ImageField',
+    'SlugField', 'TextField', 'URLField',
+}
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def _array_bytes(typecode, values):
+    """Little-endian bytes of an array of values."""
+    data = array(typecode, values)
+    if _BIG_ENDIAN:
+        data.byteswap()
+    return data.tobytes()
+
+
+def read_natural_keys(model, lookup, values, using=DEFAULT_DB_ALIAS):
+    """Return {value: natural key} of the model's objects whose lookup is in values.
+
+    Managers with natural_key_fields are read with values_list(), so keys
+    spanning relations (Materiel's) do not cost a query per object.
+    """
+    manager = model._default_manager.db_manager(using)
+    fields = getattr(manager, 'natural_key_fields', None)
+    found = {}
+    for batch in batches(values, using):
+        queryset = manager.filter(**{f'{lookup}__in': batch}).order_by()
+        if fields:
+            for row in queryset.values_list(lookup, *fields):
+                found[row[0]] = tuple(row[1:])
+        else:
+            attname = model._meta.get_field(lookup).attname if lookup != 'pk' else 'pk'
+            for obj in queryset:
+                found[getattr(obj, attname)] = obj.natural_key()
+    return found
+
+
+class _Reader():
+    """Read the parts of a columnar stream from a buffer."""
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def unpack(self, fmt):
+        return struct.unpack(fmt, self.read(struct.calcsize(fmt)))
+
+    def read(self, size):
+        if self.pos + size > len(self.data):
+            raise base.DeserializationError('Truncated columnar stream.')
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def array(self, typecode, count):
+        data = array(typecode)
+        data.frombytes(self.read(count * data.itemsize))
+        if _BIG_ENDIAN:
+            data.byteswap()
+        return data
+
+
+class Serializer(base.Serializer):
+    """Serialize a QuerySet (or list of objects) to columnar bytes."""
+
+    internal_use_only = False
+
+    def serialize(self, queryset, *, stream=None, fields=None, use_natural_foreign_keys=False,
+                  use_natural_primary_keys=False, progress_output=None, object_count=0,
+                  **options):
+        self.options = options
+        self.stream = stream if stream is not None else io.BytesIO()
+        if isinstance(self.stream, io.TextIOBase):
+            raise base.SerializationError('The columnar format needs a binary stream.')
+        self.selected_fields = fields
+        self.use_natural_foreign_keys = use_natural_foreign_keys
+        self.use_natural_primary_keys = use_natural_primary_keys
+        self.strings = {}  # string: index
+        self.keys = {}  # (label index, parts index): index
+        self.related_keys = defaultdict(dict)  # model: {value: key index}
+        self.sections = []
+        self.count = 0
+        run = []
+        for obj in queryset:
+            if run and type(obj) is not type(run[0]):
+                self.add_section(run)
+                run = []
+            run.append(obj)
+        if run:
+            self.add_section(run)
+        self.write()
+        return self.getvalue()
+
+    def string(self, value):
+        """Index of a string in the string table."""
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def key(self, model, natural_key):
+        """Index of a model's natural key in the key table."""
+        entry = (
+            self.string(model._meta.label_lower),
+            self.string(json.dumps(list(natural_key), cls=DjangoJSONEncoder)))
+        index = self.keys.get(entry)
+        if index is None:
+            index = self.keys[entry] = len(self.keys)
+        return index
+
+    def selected(self, field):
+        return (
+            self.selected_fields is None or
+            field.name in self.selected_fields or field.attname in self.selected_fields)
+
+    def add_section(self, objs):
+        """Encode a run of objects of one model."""
+        model = type(objs[0])
+        meta = model._meta.concrete_model._meta
+        columns = []
+        if self.use_natural_primary_keys and hasattr(model, 'natural_key'):
+            fields = getattr(model._default_manager, 'natural_key_fields', ())
+            if any('__' in lookup for lookup in fields):
+                found = read_natural_keys(model, 'pk', [obj.pk for obj in objs], objs[0]._state.db)
+                natural_keys = [found[obj.pk] for obj in objs]
+            else:
+                natural_keys = [obj.natural_key() for obj in objs]
+            columns.append((NATURAL_KEY_COLUMN, KEY, [
+                self.key(model, natural_key) for natural_key in natural_keys]))
+        elif not meta.pk.serialize:
+            columns.append(self.column(meta.pk, objs, natural=False))
+        for field in meta.local_fields:
+            if field.serialize and self.selected(field):
+                columns.append(self.column(field, objs))
+        for field in meta.many_to_many:
+            if field.serialize and self.selected(field):
+                raise base.SerializationError(
+                    f'The columnar format does not support many-to-many field {field}.')
+        chunks = [
+            struct.pack('<IQH', self.string(model._meta.label_lower), len(objs), len(columns))]
+        for name, code, values in columns:
+            chunks.append(struct.pack('<I', self.string(name)) + code)
+            chunks.append(self.encode(code, values))
+        self.sections.append(b''.join(chunks))
+        self.count += len(objs)
+
+    def column(self, field, objs, natural=True):
+        """Return (name, type code, values) of a field's column."""
+        name = field.name
+        if field.remote_field:
+            related = field.remote_field.model
+            values = [getattr(obj, field.attname) for obj in objs]
+            if natural and self.use_natural_foreign_keys and hasattr(related, 'natural_key'):
+                return name, KEY, self.related_key_indexes(field, objs, values)
+            internal_type = field.target_field.get_internal_type()
+        else:
+            values = [field.value_from_object(obj) for obj in objs]
+            internal_type = field.get_internal_type()
+        if internal_type in INTEGER_TYPES and None not in values:
+            return name, INT, values
+        if internal_type in STRING_TYPES:
+            return name, STRING, [
+                -1 if value is None else self.string(str(value)) for value in values]
+        return name, JSON, [
+            value if value is None or is_protected_type(value)
+            else field.value_to_string(obj)
+            for obj, value in zip(objs, values)]
+
+    def related_key_indexes(self, field, objs, values):
+        """Key indexes of the objects a foreign key refers to.
+
+        The natural keys of the objects not yet seen are read in one query.
+        """
+        related = field.remote_field.model
+        keys = self.related_keys[related]
+        missing = {value for value in values if value is not None} - set(keys)
+        if missing:
+            found = read_natural_keys(
+                related, field.remote_field.field_name, missing, objs[0]._state.db)
+            for value in missing:
+                if value not in found:
+                    raise base.SerializationError(
+                        f'{related._meta.label} {field.remote_field.field_name}={value!r} '
+                        'does not exist.')
+                keys[value] = self.key(related, found[value])
+        return [-1 if value is None else keys[value] for value in values]
+
+    @staticmethod
+    def encode(code, values):
+        if code == INT:
+            try:
+                return _array_bytes('q', values)
+            except OverflowError:
+                raise base.SerializationError('Integer out of the int64 range.')
+        if code in (STRING, KEY):
+            return _array_bytes('i', values)
+        data = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        return struct.pack('<Q', len(data)) + data
+
+    def write(self):
+        strings = list(self.strings)
+        offsets = [0]
+        for string in strings:
+            offsets.append(offsets[-1] + len(string))
+        text = ''.join(strings).encode()
+        keys = list(self.keys)
+        self.stream.write(b''.join([
+            MAGIC, struct.pack('<HIQ', VERSION, len(strings), len(text)),
+            _array_bytes('Q', offsets), text,
+            struct.pack('<I', len(keys)),
+            _array_bytes('i', [label for label, _ in keys]),
+            _array_bytes('i', [parts for _, parts in keys]),
+            struct.pack('<I', len(self.sections)),
+        ] + self.sections))
+
+    def getvalue(self):
+        if callable(getattr(self.stream, 'getvalue', None)):
+            return self.stream.getvalue()
+
+
+class Deserializer(base.Deserializer):
+    """Deserialize columnar bytes or a binary stream, a section at a time.
+
+    Natural keys are resolved when their section is reached, so that they can
+    refer to the objects of earlier sections, saved by the caller meanwhile.
+    """
+    def __init__(self, stream_or_string, **options):
+        super().__init__(stream_or_string, **options)
+        self.using = options.get('using', DEFAULT_DB_ALIAS)
+        self.ignorenonexistent = options.get('ignorenonexistent', False)
+        self.pks = {}  # key index: pk
+        self._objects = self.objects()
+
+    def __next__(self):
+        return next(self._objects)
+
+    def objects(self):
+        # As Django's deserializers: other errors, e.g. of corrupt data, are
+        # wrapped in a DeserializationError.
+        try:
+            yield from self.read_objects()
+        except (GeneratorExit, base.DeserializationError):
+            raise
+        except Exception as exc:
+            raise base.DeserializationError() from exc
+
+    def read_objects(self):
+        data = self.stream
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.read()
+        reader = _Reader(data)
+        if bytes(reader.read(4)) != MAGIC:
+            raise base.DeserializationError('Not a columnar stream.')
+        version, string_count, text_size = reader.unpack('<HIQ')
+        if version != VERSION:
+            raise base.DeserializationError(f'Unsupported columnar version {version}.')
+        offsets = reader.array('Q', string_count + 1)
+        text = bytes(reader.read(text_size)).decode()
+        self.strings = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+        key_count, = reader.unpack('<I')
+        labels = reader.array('i', key_count)
+        parts = reader.array('i', key_count)
+        self.key_table = list(zip(labels, parts))
+        section_count, = reader.unpack('<I')
+        for _ in range(section_count):
+            yield from self.section(reader)
+
+    def key_of(self, index):
+        """(model, natural key) of a key table index."""
+        label, parts = self.key_table[index]
+        return apps.get_model(self.strings[label]), tuple(json.loads(self.strings[parts]))
+
+    def resolve(self, indexes):
+        """Resolve key indexes to pk's, one query per model."""
+        wanted = {}
+        for index in set(indexes) - set(self.pks) - {-1}:
+            model, key = self.key_of(index)
+            wanted.setdefault(model, {})[key] = index
+        for model, keys in wanted.items():
+            manager = model._default_manager.db_manager(self.using)
+            if hasattr(manager, 'in_bulk_by_natural_key'):
+                found = manager.in_bulk_by_natural_key(keys)
+            else:
+                found = {}
+                for key in keys:
+                    try:
+                        found[key] = manager.get_by_natural_key(*key).pk
+                    except model.DoesNotExist:
+                        pass
+            for key, pk in found.items():
+                self.pks[keys[key]] = pk
+
+    def related_value(self, field, index):
+        """The value of a foreign key given as a key index."""
+        if index == -1:
+            return None
+        related = field.remote_field.model
+        to_pk = field.remote_field.field_name == related._meta.pk.name
+        if to_pk and index in self.pks:
+            return self.pks[index]
+        model, key = self.key_of(index)
+        try:
+            obj = model._default_manager.db_manager(self.using).get_by_natural_key(*key)
+        except model.DoesNotExist as exc:
+            raise base.DeserializationError(f'{model._meta.label} {key!r} does not exist.') from exc
+        if to_pk:
+            self.pks[index] = obj.pk
+            return obj.pk
+        return getattr(obj, related._meta.get_field(field.remote_field.field_name).attname)
+
+    def section(self, reader):
+        label_index, rows, column_count = reader.unpack('<IQH')
+        label = self.strings[label_index]
+        try:
+            model = apps.get_model(label)
+        except (LookupError, ValueError):
+            if not self.ignorenonexistent:
+                raise base.DeserializationError(f"Invalid model identifier: '{label}'")
+            model = None
+        columns = []
+        for _ in range(column_count):
+            name_index, = reader.unpack('<I')
+            code = bytes(reader.read(1))
+            columns.append((self.strings[name_index], code, self.decode(reader, code, rows)))
+        if model is None:
+            return
+        self.resolve([
+            index for _, code, values in columns if code == KEY for index in values])
+        names = []
+        values = []
+        pk_field = model._meta.pk
+        for name, code, column in columns:
+            if name == NATURAL_KEY_COLUMN:
+                continue
+            try:
+                field = model._meta.get_field(name)
+            except Exception:
+                if self.ignorenonexistent:
+                    continue
+                raise base.DeserializationError(f'{label} has no field named {name!r}.')
+            names.append(field.attname)
+            values.append(self.field_values(field, code, column))
+        natural_keys = next((
+            column for name, _, column in columns if name == NATURAL_KEY_COLUMN), None)
+        if natural_keys is not None and pk_field.attname not in names:
+            names.append(pk_field.attname)
+            values.append(self.row_pks(model, natural_keys))
+        for row in zip(*values):
+            yield base.DeserializedObject(model(**dict(zip(names, row))), {})
+
+    def row_pks(self, model, indexes):
+        """The pk's of rows by their own natural keys, None for new rows.
+
+        A model whose pk is a relation (the Product models) is given the pk
+        of the related object with the same natural key, which the Sandbox
+        natural keys delegate to.
+        """
+        pks = [self.pks.get(index) for index in indexes]
+        remote = model._meta.pk.remote_field
+        if remote and None in pks:
+            related = remote.model
+            related_keys = {}
+            for index, pk in zip(indexes, pks):
+                if pk is None:
+                    _, key = self.key_of(index)
+                    related_keys[key] = index
+            found = related._default_manager.db_manager(self.using).in_bulk_by_natural_key(
+                related_keys) if hasattr(related._default_manager, 'in_bulk_by_natural_key') else {}
+            by_index = {related_keys[key]: pk for key, pk in found.items()}
+            pks = [by_index.get(index) if pk is None else pk for index, pk in zip(indexes, pks)]
+        return pks
+
+    def field_values(self, field, code, column):
+        if code == KEY:
+            return [self.related_value(field, index) for index in column]
+        if code == STRING:
+            strings = self.strings
+            return [None if index == -1 else strings[index] for index in column]
+        if code == INT:
+            return column.tolist()
+        target = field.target_field if field.remote_field else field
+        try:
+            return [None if value is None else target.to_python(value) for value in column]
+        except Exception as exc:
+            raise base.DeserializationError(f'Invalid value for {field}: {exc}') from exc
+
+    def decode(self, reader, code, rows):
+        if code == INT:
+            return reader.array('q', rows)
+        if code in (STRING, KEY):
+            return reader.array('i', rows)
+        if code == JSON:
+            size, = reader.unpack('<Q')
+            return json.loads(bytes(reader.read(size)).decode())
+        raise base.DeserializationError(f'Unknown column type {code!r}.')
@@ -0,0 +1,250 @@
+"""Delta exports of the catalog changes after a watermark, and their import.
+
+Kind, Thing (so also the Product models inheriting it) and Materiel have a
+change_seq, numbered from the ChangeSequence by each save, raw or not (see
+sandbox.signals), in the row's transaction (see ChangeTrackedModel, and
+track_saved() for the saves outside one, of deserialized objects). A raw
+save of a Product model writes its own table only, so it numbers its Thing
+row with an UPDATE. Deletes, and saves changing a natural key, leave a
+Tombstone of the natural key gone. QuerySet.update() and bulk_create() are
+not numbered, save by bulk_create_products(); the derived low_level,
+rollup_secs and kind_rank columns are recomputed by apply() instead. Rows
+saved before the tracking began have change_seq 0: copy them with
+dumpcatalog first.
+
+export() writes the rows changed after the watermark as JSON Lines records
+with natural keys, then the Tombstones as 'sandbox.tombstone' records, and
+returns the next watermark. apply() saves the rows by natural key and
+deletes the tombstoned rows still there, so a delta can be applied again.
+"""
+
+import functools
+import json
+
+from django.apps import apps
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Q
+
+from . import lowlevel, natural_keys, rollup, streaming
+from .models import ChangeSequence, Thing, Tombstone
+
+TOMBSTONE_LABEL = Tombstone._meta.label_lower
+
+
+@functools.lru_cache(maxsize=None)
+def is_tracked(model):
+    """Whether saves and deletes of the model are numbered."""
+    return model is not Tombstone and any(
+        field.name == 'change_seq' for field in model._meta.concrete_fields)
+
+
+def tracked_models():
+    """The tracked catalog models in dependency order."""
+    return [model for model in streaming.catalog_models() if is_tracked(model)]
+
+
+def next_change_seq(using=DEFAULT_DB_ALIAS):
+    """Take the next change sequence number, in the caller's transaction.
+
+    The counter row stays locked until that transaction ends, which keeps
+    the numbers committed in order, each with its rows: an export can not
+    pass over a number whose rows are not visible yet.
+    """
+    sequence = ChangeSequence.objects.using(using)
+    if not sequence.filter(pk=1).update(value=F('value') + 1):
+        sequence.get_or_create(pk=1)
+        sequence.filter(pk=1).update(value=F('value') + 1)
+    return sequence.values_list('value', flat=True).get(pk=1)
+
+
+def current_change_seq(using=DEFAULT_DB_ALIAS):
+    """The last change sequence number taken, waiting for writers holding it."""
+    with transaction.atomic(using=using):
+        value = ChangeSequence.objects.using(using).select_for_update().filter(
+            pk=1).values_list('value', flat=True).first()
+    return value or 0
+
+
+def dump_key(natural_key):
+    return json.dumps(list(natural_key), cls=DjangoJSONEncoder)
+
+
+def labels_of(model):
+    """Labels of the model and its multi-table parents, whose rows share its key."""
+    return [model._meta.label_lower] + [
+        parent._meta.label_lower for parent in model._meta.get_parent_list()]
+
+
+def bury(labels, natural_key, using=DEFAULT_DB_ALIAS):
+    """Record Tombstones of a natural key gone from the labelled models."""
+    change_seq = next_change_seq(using)
+    for label in labels:
+        Tombstone.objects.using(using).update_or_create(
+            label=label, natural_key=dump_key(natural_key),
+            defaults={'change_seq': change_seq})
+
+
+def unbury(model, natural_key, using=DEFAULT_DB_ALIAS):
+    """Drop the Tombstones of a natural key saved again."""
+    Tombstone.objects.using(using).filter(
+        label__in=labels_of(model), natural_key=dump_key(natural_key)).delete()
+
+
+def track_save(instance, raw, using=DEFAULT_DB_ALIAS):
+    """Number a save, and keep the Tombstones of its natural key.
+
+    Outside a transaction, e.g. DeserializedObject.save(), which calls
+    Model.save_base() itself, the row is numbered by track_saved() instead.
+    """
+    model = type(instance)
+    old_key = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        fields = model._default_manager.natural_key_fields
+        old_key = model._default_manager.db_manager(using).filter(
+            pk=instance.pk).values_list(*fields).first()
+    if connections[using].in_atomic_block:
+        _number(instance, raw, instance._state.adding, old_key, using)
+    else:
+        instance._change_seq_deferred = (instance._state.adding, old_key)
+
+
+def track_saved(instance, raw, using=DEFAULT_DB_ALIAS):
+    """Number a row saved outside a transaction, in one with an UPDATE of it.
+
+    The row was written with its previous number, so an export passes over
+    it until the new number commits with the UPDATE.
+    """
+    deferred = instance.__dict__.pop('_change_seq_deferred', None)
+    if deferred is None:
+        return
+    model = type(instance)
+    with transaction.atomic(using=using, savepoint=False):
+        _number(instance, raw, *deferred, using)
+        for tracked in [model] + model._meta.get_parent_list():
+            if is_tracked(tracked):
+                tracked._base_manager.using(using).filter(pk=instance.pk).update(
+                    change_seq=instance.change_seq)
+
+
+def _number(instance, raw, adding, old_key, using):
+    model = type(instance)
+    instance.change_seq = next_change_seq(using)
+    if raw and instance.pk is not None:
+        # A raw save only writes the model's own table.
+        for parent in model._meta.get_parent_list():
+            if is_tracked(parent):
+                parent._base_manager.using(using).filter(pk=instance.pk).update(
+                    change_seq=instance.change_seq)
+    try:
+        natural_key = instance.natural_key()
+    except ObjectDoesNotExist:
+        return  # Not a valid row, left to fail on saving.
+    if raw and instance.pk is not None and model._meta.get_parent_list():
+        # The inherited natural key fields are not loaded: read the parent row's.
+        manager = root_of(model)._default_manager.db_manager(using)
+        natural_key = manager.filter(pk=instance.pk).values_list(
+            *manager.natural_key_fields).first() or natural_key
+    if adding:
+        unbury(model, natural_key, using)
+    elif old_key is not None and tuple(old_key) != tuple(natural_key):
+        bury(labels_of(model), old_key, using)
+        unbury(model, natural_key, using)
+        renumber_referrers(model, instance.pk, instance.change_seq, using)
+
+
+def root_of(model):
+    """The model at the root of a multi-table inheritance, whose pk's are shared."""
+    parents = model._meta.get_parent_list()
+    return parents[-1] if parents else model
+
+
+def renumber_referrers(model, pk, change_seq, using=DEFAULT_DB_ALIAS):
+    """Renumber the tracked rows whose foreign keys refer to a re-keyed row.
+
+    Their natural foreign keys changed with it, e.g. the Materiels of a
+    renamed Product, so they must be exported again.
+    """
+    root = root_of(model)
+    for other in tracked_models():
+        condition = Q()
+        for field in other._meta.local_concrete_fields:
+            if (field.remote_field and not field.primary_key and
+                    root_of(field.remote_field.model) is root):
+                condition |= Q(**{field.attname: pk})
+        if condition:
+            other._default_manager.db_manager(using).filter(condition).update(
+                change_seq=change_seq)
+
+
+def export(stream, since=0, chunk_size=streaming.DEFAULT_CHUNK_SIZE, using=DEFAULT_DB_ALIAS):
+    """Write the changes numbered after since to a JSON Lines stream.
+
+    Returns (the number of records written, the watermark to export from
+    next time).
+    """
+    until = current_change_seq(using)
+    count = 0
+    with transaction.atomic(using=using):
+        for model in tracked_models():
+            serializer = streaming.Serializer()
+            serializer.serialize(
+                streaming.streaming_queryset(
+                    model, chunk_size, using, change_seq__gt=since, change_seq__lte=until),
+                stream=stream, use_natural_foreign_keys=True, use_natural_primary_keys=True)
+            count += serializer.count
+        tombstones = Tombstone.objects.using(using).filter(
+            change_seq__gt=since, change_seq__lte=until).order_by('change_seq')
+        for tombstone in tombstones.iterator(chunk_size=chunk_size):
+            json.dump({'model': TOMBSTONE_LABEL, 'fields': {
+                'label': tombstone.label,
+                'natural_key': json.loads(tombstone.natural_key),
+                'change_seq': tombstone.change_seq,
+            }}, stream, separators=(',', ':'))
+            stream.write('\n')
+            count += 1
+    return count, until
+
+
+def _split_tombstones(records, tombstones):
+    """Yield the records, appending the tombstones' fields to tombstones."""
+    for record in records:
+        if record['model'] == TOMBSTONE_LABEL:
+            tombstones.append(record['fields'])
+        else:
+            yield record
+
+
+def apply(stream, batch_size=natural_keys.DEFAULT_BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """Apply a delta in one transaction.
+
+    Rows are saved by natural key, then the tombstoned rows that exist are
+    deleted, dependents first. Returns (rows saved, rows deleted).
+    """
+    saved = deleted = 0
+    tombstones = []
+    resolver = natural_keys.NaturalKeyResolver(using=using)
+    order = {model._meta.label_lower: index for index, model in enumerate(tracked_models())}
+    with transaction.atomic(using=using):
+        records = _split_tombstones(streaming.iter_records(stream), tombstones)
+        for batch in natural_keys.batched(records, batch_size):
+            resolver.resolve(batch)
+            for record in batch:
+                resolver.build(record).save(using=using)
+            saved += len(batch)
+        tombstones.sort(key=lambda fields: -order.get(fields['label'], -1))
+        for fields in tombstones:
+            model = apps.get_model(fields['label'])
+            manager = model._default_manager.db_manager(using)
+            try:
+                obj = manager.get_by_natural_key(*fields['natural_key'])
+            except model.DoesNotExist:
+                continue
+            obj.delete()
+            deleted += 1
+        Thing.objects.db_manager(using).sync_kind_ranks()
+        if saved or deleted:
+            lowlevel.update_low_level_codes(using)
+            rollup.update_rollups(using)
+    return saved, deleted
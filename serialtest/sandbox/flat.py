@@ -0,0 +1,109 @@
+"""Flattened read copy of the Products, kept in FlatProduct.
+
+A Product query joins sandbox_thing through the parent link, and its Kind
+fields join sandbox_kind on top. FlatProduct holds the fields the lists and
+BOM explosions read, one row a Product, so they are read from one table:
+
+    Product.objects.flat().filter(kind_iden='F').values_list('iden', 'prod_secs')
+
+A Thing or Product save updates its row from the instance, in one UPDATE
+(see sandbox.signals); raw saves, and bulk_create_products(), rebuild the
+rows from the joins. The low-level codes are written to both tables, and
+Kind saves update their rows. Deletes cascade. Other bulk updates of the
+copied fields, e.g. QuerySet.update(), are not followed: run rebuild() (the
+flatproducts command) after them.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .lowlevel import batches
+from .models import FlatProduct, Product
+
+# FlatProduct field: Product lookup.
+COLUMNS = (
+    ('product_id', 'pk'),
+    ('iden', 'iden'),
+    ('name', 'name'),
+    ('kind_id', 'kind_id'),
+    ('kind_iden', 'kind__iden'),
+    ('kind_rank', 'kind__rank'),
+    ('rank', 'rank'),
+    ('prod_secs', 'prod_secs'),
+    ('low_level', 'low_level'),
+)
+
+CHUNK_SIZE = 2000
+
+
+def flat_rows(queryset):
+    """Yield the FlatProducts of a Product queryset, read with the joins."""
+    names = [name for name, _ in COLUMNS]
+    for values in queryset.order_by().values_list(
+            *[lookup for _, lookup in COLUMNS]).iterator(chunk_size=CHUNK_SIZE):
+        yield FlatProduct(**dict(zip(names, values)))
+
+
+def refresh(pks, using=DEFAULT_DB_ALIAS):
+    """Rebuild the FlatProducts of the given Products (or Things).
+
+    Rows of pk's that are not Products are dropped. Returns the number of
+    rows written.
+    """
+    count = 0
+    with transaction.atomic(using=using, savepoint=False):
+        for batch in batches({pk for pk in pks if pk is not None}, using):
+            rows = list(flat_rows(Product.objects.using(using).filter(pk__in=batch)))
+            # A plain DELETE: nothing refers to FlatProducts.
+            FlatProduct.objects.using(using).filter(pk__in=batch)._raw_delete(using)
+            FlatProduct.objects.using(using).bulk_create(rows)
+            count += len(rows)
+    return count
+
+
+def track_saved(instance, raw, using=DEFAULT_DB_ALIAS):
+    """Update the FlatProduct of a saved Thing (or Thing child model).
+
+    From the instance's fields: a Product's row is inserted if missing, the
+    other Things update the row of their Product, if any. The low_level is
+    copied on insert only: like Product.save(), updates leave it to
+    sandbox.lowlevel. Raw saves, which may lack the Thing fields, rebuild
+    the row from the joins.
+    """
+    if raw:
+        refresh([instance.pk], using=using)
+        return
+    kind = instance.kind
+    fields = {
+        'iden': instance.iden, 'name': instance.name, 'kind_id': kind.pk,
+        'kind_iden': kind.iden, 'kind_rank': kind.rank, 'rank': instance.rank}
+    if isinstance(instance, Product):
+        fields['prod_secs'] = instance.prod_secs
+    rows = FlatProduct.objects.using(using).filter(pk=instance.pk)
+    if not rows.update(**fields) and isinstance(instance, Product):
+        FlatProduct.objects.using(using).bulk_create([
+            FlatProduct(product_id=instance.pk, low_level=instance.low_level, **fields)])
+
+
+def update_kind(kind, using=DEFAULT_DB_ALIAS):
+    """Copy a Kind's iden and rank to its FlatProducts.
+
+    Returns the number of rows updated.
+    """
+    return FlatProduct.objects.using(using).filter(kind_id=kind.pk).exclude(
+        kind_iden=kind.iden, kind_rank=kind.rank).update(kind_iden=kind.iden, kind_rank=kind.rank)
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """Rebuild every FlatProduct. Returns the number of rows written."""
+    count = 0
+    with transaction.atomic(using=using):
+        FlatProduct.objects.using(using).all()._raw_delete(using)
+        rows = []
+        for row in flat_rows(Product.objects.using(using)):
+            rows.append(row)
+            if len(rows) == CHUNK_SIZE:
+                FlatProduct.objects.using(using).bulk_create(rows)
+                count += len(rows)
+                rows = []
+        FlatProduct.objects.using(using).bulk_create(rows)
+    return count + len(rows)
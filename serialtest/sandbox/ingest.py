@@ -0,0 +1,179 @@
+"""Batch ingestion of Thing images from a directory.
+
+Files are matched to Things by name: a file's stem is its Thing's iden,
+e.g. P-12.jpg is the image of Thing 'P-12'. A process pool validates each
+file with Pillow and, if larger than max_size, downsizes it; JPEG and PNG
+files that fit are kept as they are, the others re-encoded as PNG. Files are
+stored under the hash of their source content:
+
+    ingested/<source sha1>.<jpg|png>
+
+so the same image matched to many Things is stored once. The writer (the
+calling process) saves the new files to the image storage, then sets the
+image, image_hash and change_seq of a chunk of Things with one UPDATE,
+commits, and generates their thumbnails (see sandbox.thumbnails).
+
+Interrupted ingestions can be run again: Things whose image already is the
+target are skipped without resizing, and files already stored are not
+written again. QuerySet.update() sends no signals, so the natural key cache
+is cleared after each chunk.
+"""
+
+import functools
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+from django.core.files.base import ContentFile
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from PIL import Image
+
+from . import delta, parallel, thumbnails, versions
+from .models import Thing
+from .nkcache import natural_key_cache
+
+INGESTED_PATH = 'ingested'
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_CHUNK_SIZE = 200
+
+KEPT_FORMATS = {'JPEG': 'jpg', 'PNG': 'png'}
+
+IngestStats = namedtuple('IngestStats', [
+    'files',      # Image files found
+    'updated',    # Things given a new image
+    'skipped',    # Things already having their image
+    'stored',     # Files written to the storage
+    'bytes',      # Bytes of the files read
+    'unmatched',  # Names of the files without a Thing
+    'failed',     # List of (file name, error) of the files refused
+    'secs',       # Wall time
+])
+
+Processed = namedtuple('Processed', ['iden', 'name', 'data', 'size', 'error'])
+
+
+def scan(directory, recursive=False):
+    """Return a dict of the image files by stem, and the names of duplicates.
+
+    Dot files are skipped. Stems found twice (e.g. P-1.jpg and P-1.png) are
+    left out, as the image to keep is not known.
+    """
+    paths = {}
+    duplicates = set()
+    for root, dirs, files in os.walk(directory):
+        if not recursive:
+            dirs.clear()
+        for filename in sorted(files):
+            if filename.startswith('.'):
+                continue
+            stem = os.path.splitext(filename)[0]
+            if stem in paths:
+                duplicates.add(stem)
+            paths[stem] = os.path.join(root, filename)
+    duplicate_paths = [paths.pop(stem) for stem in sorted(duplicates)]
+    return paths, duplicate_paths
+
+
+def process_file(task, max_size=DEFAULT_MAX_SIZE):
+    """Validate and downsize the image file of a (iden, path, current image).
+
+    Runs in a pool process. Returns Processed, data None when the Thing's
+    current image already is the target, or the file is refused.
+    """
+    iden, path, current = task
+    try:
+        with open(path, 'rb') as file:
+            source = file.read()
+        image = Image.open(io.BytesIO(source))
+        extension = KEPT_FORMATS.get(image.format, 'png')
+        name = f'{INGESTED_PATH}/{hashlib.sha1(source).hexdigest()}.{extension}'
+        if name == current:
+            return Processed(iden, name, None, len(source), None)
+        image.verify()
+        image = Image.open(io.BytesIO(source))
+        if image.format in KEPT_FORMATS and max(image.size) <= max_size:
+            return Processed(iden, name, source, len(source), None)
+        # JPEGs decode straight to a smaller scale, still at least max_size.
+        image.draft('RGB', (max_size, max_size))
+        if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        image.thumbnail((max_size, max_size))
+        buffer = io.BytesIO()
+        if extension == 'jpg':
+            image.save(buffer, 'JPEG', quality=90)
+        else:
+            image.save(buffer, 'PNG')
+        return Processed(iden, name, buffer.getvalue(), len(source), None)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as exc:
+        return Processed(iden, None, None, 0, str(exc) or type(exc).__name__)
+
+
+def _update_images(updates, using):
+    """Set the image and image_hash of the Things of {pk: (name, hash)} in one UPDATE."""
+    def case(index):
+        return models.Case(
+            *[models.When(pk=pk, then=models.Value(values[index]))
+              for pk, values in updates.items()],
+            output_field=models.CharField())
+
+    Thing.objects.using(using).filter(pk__in=list(updates)).update(
+        image=case(0), image_hash=case(1), change_seq=delta.next_change_seq(using))
+    versions.bump_model_version(Thing, using=using)
+
+
+def ingest(directory, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+           max_size=DEFAULT_MAX_SIZE, recursive=False, using=DEFAULT_DB_ALIAS):
+    """Ingest the image files of a directory into the Things they match.
+
+    processes is the number of pool processes, default the number of CPUs;
+    0 processes the files in this process. Returns IngestStats.
+    """
+    start = time.perf_counter()
+    storage = Thing._meta.get_field('image').storage
+    paths, duplicates = scan(directory, recursive)
+    failed = [(path, 'Another file has the same name.') for path in duplicates]
+    unmatched = []
+    updated = skipped = stored = read = 0
+    task = functools.partial(process_file, max_size=max_size)
+    idens = sorted(paths)
+    pool = None
+    if processes != 0:
+        pool = multiprocessing.Pool(processes, initializer=parallel.setup_worker)
+    try:
+        for index in range(0, len(idens), chunk_size):
+            chunk = idens[index:index + chunk_size]
+            things = {
+                iden: (pk, image) for iden, pk, image in Thing.objects.using(using).filter(
+                    iden__in=chunk).values_list('iden', 'pk', 'image')}
+            unmatched.extend(paths[iden] for iden in chunk if iden not in things)
+            tasks = [(iden, paths[iden], things[iden][1]) for iden in chunk if iden in things]
+            results = pool.imap(task, tasks) if pool else map(task, tasks)
+            updates = {}
+            for result in results:
+                read += result.size
+                if result.error is not None:
+                    failed.append((paths[result.iden], result.error))
+                elif result.data is None:
+                    skipped += 1
+                else:
+                    if not storage.exists(result.name):
+                        storage.save(result.name, ContentFile(result.data))
+                        stored += 1
+                    updates[things[result.iden][0]] = (
+                        result.name, hashlib.sha1(result.data).hexdigest())
+            if updates:
+                with transaction.atomic(using=using):
+                    _update_images(updates, using)
+                natural_key_cache.clear()
+                thumbnails.generate(Thing.objects.using(using).filter(pk__in=list(updates)))
+                updated += len(updates)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return IngestStats(
+        len(paths) + len(duplicates), updated, skipped, stored, read,
+        unmatched, failed, time.perf_counter() - start)
@@ -0,0 +1,191 @@
+"""Wall time and SQL query counts by phase of serialization and loading.
+
+    with instrument.profiling('load') as profile:
+        call_command('loaddata', 'catalog.json')
+    profile.report()
+
+The phases are:
+
+    serialize_object: A serializer's start_object() to its end_object().
+    get_by_natural_key, in_bulk_by_natural_key: The NaturalKeyManager lookups.
+    save_base: Model.save_base(), i.e. the INSERT or UPDATE of each object.
+
+Phase times and query counts are inclusive: a natural key lookup made while
+serializing an object counts in both phases. What no phase accounts for (of
+a load, mostly parsing) is the total less the outermost phases.
+
+The profile is kept per thread. The serializer and save_base() hooks are only
+installed while a profile is active, and the natural key hooks then return
+straight away, so instrumentation costs next to nothing when not in use. On
+exit, the report is logged as JSON to the 'sandbox.instrument' logger.
+"""
+
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core import serializers
+from django.db import connections, models
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_hooks_lock = threading.Lock()
+_hooks_users = 0
+_hooks = []  # (owner, name, original)
+
+SERIALIZE_OBJECT = 'serialize_object'
+
+
+class Profile():
+    """Calls, wall time and queries of each phase entered."""
+    def __init__(self, label=''):
+        self.label = label
+        self.phases = OrderedDict()  # name: [calls, secs, queries]
+        self.stack = []  # (name, start, queries)
+        self.queries = 0
+        self.start = time.perf_counter()
+        self.secs = None
+
+    def enter(self, name):
+        self.stack.append((name, time.perf_counter(), self.queries))
+
+    def exit(self):
+        name, start, queries = self.stack.pop()
+        stats = self.phases.setdefault(name, [0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += time.perf_counter() - start
+        stats[2] += self.queries - queries
+
+    def in_phase(self, name):
+        return bool(self.stack) and self.stack[-1][0] == name
+
+    def finish(self):
+        while self.stack:
+            self.exit()
+        self.secs = time.perf_counter() - self.start
+
+    def report(self):
+        """Return the profile as a dict (as logged)."""
+        secs = self.secs if self.secs is not None else time.perf_counter() - self.start
+        return {
+            'label': self.label,
+            'secs': round(secs, 6),
+            'queries': self.queries,
+            'phases': {
+                name: {'calls': calls, 'secs': round(secs, 6), 'queries': queries}
+                for name, (calls, secs, queries) in self.phases.items()},
+        }
+
+
+def active():
+    """The current thread's Profile, or None."""
+    return getattr(_local, 'profile', None)
+
+
+def timed(name):
+    """Decorate a function to be timed as the named phase."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = getattr(_local, 'profile', None)
+            if profile is None:
+                return func(*args, **kwargs)
+            profile.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.exit()
+        return wrapper
+    return decorator
+
+
+def _start_object_hook(original):
+    @functools.wraps(original)
+    def start_object(self, *args, **kwargs):
+        profile = getattr(_local, 'profile', None)
+        if profile is not None and not profile.in_phase(SERIALIZE_OBJECT):
+            profile.enter(SERIALIZE_OBJECT)
+        return original(self, *args, **kwargs)
+    return start_object
+
+
+def _end_object_hook(original):
+    @functools.wraps(original)
+    def end_object(self, *args, **kwargs):
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            profile = getattr(_local, 'profile', None)
+            if profile is not None and profile.in_phase(SERIALIZE_OBJECT):
+                profile.exit()
+    return end_object
+
+
+def _install_hooks():
+    classes = set()
+    for format in serializers.get_serializer_formats():
+        classes.update(
+            cls for cls in serializers.get_serializer(format).__mro__
+            if issubclass(cls, serializers.base.Serializer))
+    for cls in classes:
+        for name, hook in (('start_object', _start_object_hook), ('end_object', _end_object_hook)):
+            if name in vars(cls):
+                original = vars(cls)[name]
+                _hooks.append((cls, name, original))
+                setattr(cls, name, hook(original))
+    original = vars(models.Model)['save_base']
+    _hooks.append((models.Model, 'save_base', original))
+    models.Model.save_base = timed('save_base')(original)
+
+
+def _remove_hooks():
+    while _hooks:
+        owner, name, original = _hooks.pop()
+        setattr(owner, name, original)
+
+
+@contextlib.contextmanager
+def profiling(label='', log=True, enabled=True):
+    """Profile the phases run by this thread in the block.
+
+    Yields the Profile, or None when not enabled. Nested blocks profile
+    into the outer Profile.
+    """
+    global _hooks_users
+    if not enabled:
+        yield None
+        return
+    if active() is not None:
+        yield active()
+        return
+    profile = Profile(label)
+
+    def count_queries(execute, sql, params, many, context):
+        profile.queries += 1
+        return execute(sql, params, many, context)
+
+    with _hooks_lock:
+        if not _hooks_users:
+            _install_hooks()
+        _hooks_users += 1
+    _local.profile = profile
+    try:
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_queries))
+            yield profile
+    finally:
+        _local.profile = None
+        profile.finish()
+        with _hooks_lock:
+            _hooks_users -= 1
+            if not _hooks_users:
+                _remove_hooks()
+        if log:
+            report = profile.report()
+            logger.info(json.dumps(report), extra={'profile': report})
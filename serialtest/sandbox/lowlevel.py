@@ -0,0 +1,206 @@
+"""Low-level codes of the Materiel bill of materials.
+
+The low-level code of a Product is the deepest level at which it appears in
+any bill of materials: 0 for Products not used in any other, otherwise one
+more than the deepest of its parents. MRP processes Products in low-level
+code order, so that all gross requirements of a Product are known before it
+is netted.
+"""
+
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from . import versions
+from .models import FlatProduct, Materiel, Product
+from .nkcache import natural_key_cache
+
+
+class BOMCycleError(ValidationError):
+    """The Materiel bill of materials has a cycle.
+
+    products: The pk's of the Products around the cycle.
+    """
+    def __init__(self, products):
+        self.products = list(products)
+        super().__init__(
+            'Bill of materials cycle through products %(products)s.',
+            code='bom_cycle',
+            params={'products': ', '.join(str(pk) for pk in self.products)})
+
+
+def load_edges(using=DEFAULT_DB_ALIAS):
+    """Return the (parent, component) pk's of every Materiel, in one query."""
+    return Materiel.objects.using(using).order_by().values_list(
+        'parent_id', 'component_id').iterator()
+
+
+def find_cycle(nodes, edges):
+    """Return the pk's around a cycle among nodes, given its (parent, component) edges.
+
+    Every node left over by the topological pass has a parent that is also
+    left over, so walking up the parents must come back around.
+    """
+    parents = {}
+    for parent, component in edges:
+        if parent in nodes and component in nodes:
+            parents.setdefault(component, parent)
+    node = next(iter(nodes))
+    seen = {}
+    path = []
+    while node not in seen:
+        seen[node] = len(path)
+        path.append(node)
+        node = parents[node]
+    cycle = path[seen[node]:]
+    cycle.reverse()
+    return cycle
+
+
+def compute_low_level_codes(edges, products=(), base=None):
+    """Return a dict of low-level codes by Product pk.
+
+    edges: (parent, component) pk pairs. products: pk's of Products without
+    any Materiel (given level 0). base: Lowest levels by pk, for parents
+    left out of the edges. A linear time topological pass (Kahn's
+    algorithm) from the top level Products down; raises BOMCycleError if
+    some Products can not be reached because they are on a cycle.
+    """
+    edges = list(edges)
+    components = defaultdict(list)
+    indegree = defaultdict(int)
+    for parent, component in edges:
+        components[parent].append(component)
+        indegree[component] += 1
+    levels = dict.fromkeys(products, 0)
+    levels.update(dict.fromkeys(components, 0))
+    levels.update(dict.fromkeys(indegree, 0))
+    if base:
+        levels.update((pk, level) for pk, level in base.items() if pk in levels)
+    queue = deque(pk for pk in levels if not indegree[pk])
+    done = 0
+    while queue:
+        parent = queue.popleft()
+        done += 1
+        level = levels[parent] + 1
+        for component in components[parent]:
+            if levels[component] < level:
+                levels[component] = level
+            indegree[component] -= 1
+            if not indegree[component]:
+                queue.append(component)
+    if done < len(levels):
+        raise BOMCycleError(find_cycle({pk for pk in levels if indegree[pk]}, edges))
+    return levels
+
+
+def write_low_level_codes(levels, current, using=DEFAULT_DB_ALIAS):
+    """Update the Products whose low-level code changed.
+
+    levels: New codes by pk. current: Existing codes by pk. One UPDATE per
+    level per batch of pk's. Returns the number of Products updated.
+    """
+    changed = defaultdict(list)
+    for pk, level in levels.items():
+        if current.get(pk) != level:
+            changed[level].append(pk)
+    count = 0
+    with transaction.atomic(using=using):
+        for level, pks in changed.items():
+            # Less one parameter for the low_level.
+            for batch in batches(pks, using, reserve=1):
+                count += Product.objects.using(using).filter(
+                    pk__in=batch).update(low_level=level)
+                FlatProduct.objects.using(using).filter(pk__in=batch).update(low_level=level)
+                natural_key_cache.invalidate_pks(Product, batch)
+        if count:
+            versions.bump_model_version(Product, using=using)
+    return count
+
+
+def batches(pks, using=DEFAULT_DB_ALIAS, reserve=0):
+    """Split pk's into lists that fit the database's query parameter limit."""
+    pks = sorted(pks)
+    batch_size = (connections[using].features.max_query_params or 999) - reserve
+    for start in range(0, len(pks), batch_size):
+        yield pks[start:start + batch_size]
+
+
+def update_low_level_codes(using=DEFAULT_DB_ALIAS):
+    """Compute and save the low-level code of every Product.
+
+    Returns the number of Products updated.
+    """
+    current = dict(Product.objects.using(using).order_by().values_list(
+        'pk', 'low_level').iterator())
+    levels = compute_low_level_codes(load_edges(using), current)
+    return write_low_level_codes(levels, current, using=using)
+
+
+def recompute_below(pks, using=DEFAULT_DB_ALIAS):
+    """Recompute the low-level codes of the given Products and all below them.
+
+    For after Materiel rows using the given Products as components were
+    added or removed: only that subtree can change. Each Product in it takes
+    the deepest level of its parents, inside the subtree (recomputed) or
+    outside it (as saved). Returns the number of Products updated.
+    """
+    pks = {pk for pk in pks if pk is not None}
+    if not pks:
+        return 0
+    with transaction.atomic(using=using):
+        nodes = pks | Materiel.objects.db_manager(using).descendants(pks)
+        edges = []
+        for batch in batches(nodes, using):
+            edges.extend(Materiel.objects.using(using).filter(
+                component_id__in=batch).order_by().values_list('parent_id', 'component_id'))
+        outside = {parent for parent, _ in edges if parent not in nodes}
+        current = {}
+        for batch in batches(nodes | outside, using):
+            current.update(Product.objects.using(using).filter(
+                pk__in=batch).order_by().values_list('pk', 'low_level'))
+        base = defaultdict(int)
+        for parent, component in edges:
+            if parent in outside:
+                base[component] = max(base[component], max(current.get(parent, 0), 0) + 1)
+        levels = compute_low_level_codes(
+            [(parent, component) for parent, component in edges if parent in nodes],
+            products=nodes, base=base)
+        return write_low_level_codes(levels, current, using=using)
+
+
+_deferred = threading.local()
+
+
+def schedule(pks, using=DEFAULT_DB_ALIAS):
+    """Maintain the low-level codes below the given Products.
+
+    Right away, or at the end of the enclosing deferred() block.
+    """
+    queue = getattr(_deferred, 'queue', None)
+    if queue is None:
+        recompute_below(pks, using=using)
+    else:
+        queue[using].update(pks)
+
+
+@contextmanager
+def deferred():
+    """Queue the low-level code maintenance of Materiel saves and deletes.
+
+    At the end of the block the queued Products are recomputed together,
+    one transaction per database. Nested blocks join the outermost one.
+    """
+    if getattr(_deferred, 'queue', None) is not None:
+        yield
+        return
+    _deferred.queue = queue = defaultdict(set)
+    try:
+        yield
+    finally:
+        _deferred.queue = None
+    for using, pks in queue.items():
+        recompute_below(pks, using=using)
@@ -0,0 +1,153 @@
+"""Load test the long polls of the ASGI application."""
+
+import asyncio
+import json
+import resource
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sandbox import asgi, versions
+
+
+def changes_scope(token, timeout):
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': asgi.CHANGES_PATH,
+        'query_string': f'token={token}&timeout={timeout}'.encode(),
+        'headers': [],
+    }
+
+
+def bump():
+    """Bump a watched version, as a commit changing the catalog would."""
+    with transaction.atomic():
+        versions.bump_version(asgi.WATCHED[-1])
+
+
+class Client():
+    """An in-process long poll, holding the connection open until answered."""
+    def __init__(self, token, timeout):
+        self.scope = changes_scope(token, timeout)
+        self.status = None
+        self.answered = None
+        self.hangup = asyncio.get_event_loop().create_future()
+        self.sent_request = False
+
+    async def receive(self):
+        if not self.sent_request:
+            self.sent_request = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.hangup
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            self.answered = time.perf_counter()
+
+    async def run(self):
+        await asgi.application(self.scope, self.receive, self.send)
+        if not self.hangup.done():
+            self.hangup.set_result(None)
+
+
+async def http_get(host, port, path):
+    """GET path on a new connection; returns the status and body."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split(None, 2)[1]), body
+
+
+class Command(BaseCommand):
+    help = (
+        'Hold concurrent long polls of /api/changes/ open, then change a '
+        'watched version and time until they are all answered. In process '
+        'by default, measuring the memory per waiting client; or against a '
+        'running server with --url (sharing its version cache).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients', type=int, default=1000,
+            help='Number of concurrent long polls.')
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Long poll timeout of the clients, in seconds.')
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running ASGI server, e.g. http://127.0.0.1:8000.')
+
+    def report(self, clients, answered, start):
+        latencies = sorted(at - start for at in answered)
+        if not latencies:
+            self.stdout.write('No long poll was answered.')
+            return
+        self.stdout.write(
+            f'{len(latencies)}/{clients} answered: median '
+            f'{latencies[len(latencies) // 2] * 1000:.1f} ms, last {latencies[-1] * 1000:.1f} ms')
+
+    async def in_process(self, count, timeout):
+        asgi.broker.start()
+        token = asgi.broker.token
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            clients = [Client(token, timeout) for _ in range(count)]
+            tasks = [asyncio.ensure_future(client.run()) for client in clients]
+            while asgi.broker.waiting < count:
+                await asyncio.sleep(0.01)
+            held = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.stdout.write(
+            f'{count} long polls waiting: {held / 2 ** 20:.1f} MiB, '
+            f'{held / count / 1024:.1f} KiB per client')
+        start = time.perf_counter()
+        bump()
+        asgi.broker.wake()
+        await asyncio.wait(tasks)
+        self.report(count, [client.answered for client in clients if client.status == 200], start)
+        asgi.broker.stop()
+
+    async def over_http(self, url, count, timeout):
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+        _, body = await http_get(host, port, asgi.CHANGES_PATH)
+        token = json.loads(body.decode())['token']
+        path = f'{asgi.CHANGES_PATH}?token={token}&timeout={timeout}'
+        answered = []
+
+        async def poll():
+            status, _ = await http_get(host, port, path)
+            if status == 200:
+                answered.append(time.perf_counter())
+
+        tasks = [asyncio.ensure_future(poll()) for _ in range(count)]
+        # Let the connections open and the requests reach the server.
+        await asyncio.sleep(min(timeout / 2, 1 + count / 1000))
+        start = time.perf_counter()
+        bump()
+        await asyncio.wait(tasks)
+        self.report(count, answered, start)
+
+    def handle(self, *args, **options):
+        count = options['clients']
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if options['url'] and soft < count + 100:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, count + 100), hard))
+        loop = asyncio.get_event_loop()
+        if options['url']:
+            loop.run_until_complete(self.over_http(options['url'], count, options['timeout']))
+        else:
+            loop.run_until_complete(self.in_process(count, options['timeout']))
@@ -0,0 +1,105 @@
+"""Benchmark Product reads through the MTI joins against FlatProduct."""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_save
+
+from sandbox import signals
+from sandbox.bulk import bulk_create_products
+from sandbox.lowlevel import batches
+from sandbox.models import Kind, Product
+
+MTI_FIELDS = ('iden', 'name', 'kind__iden', 'kind__rank', 'rank', 'prod_secs', 'low_level')
+FLAT_FIELDS = ('iden', 'name', 'kind_iden', 'kind_rank', 'rank', 'prod_secs', 'low_level')
+REPEAT = 3
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Time scans, pages, iden lookups and BOM detail reads of Products '
+        'through the Thing and Kind joins and from FlatProduct, and the '
+        'cost of keeping FlatProduct on saves. The Products are created '
+        'and rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=100000,
+            help='Number of Products to create.')
+        parser.add_argument(
+            '--lookups', type=int, default=1000,
+            help='Number of iden lookups, BOM detail pk\'s and saves.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to benchmark.')
+
+    def populate(self, rows, using):
+        kinds = [
+            Kind.objects.using(using).create(iden=f'BK{index}', name=f'Bench {index}', rank=-index)
+            for index in range(20)]
+        bulk_create_products(Product, (
+            Product(iden=f'B{index:07d}', kind=kinds[index % len(kinds)], name=f'Bench {index}',
+                    desc='Benchmark', rank=index % 1000, prod_secs=index)
+            for index in range(rows)), using=using)
+        with connections[using].cursor() as cursor:
+            if connections[using].vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+    def cases(self, using, idens, pks):
+        mti = Product.objects.using(using)
+        flat = Product.objects.db_manager(using).flat()
+        for label, queryset, fields in (('mti', mti, MTI_FIELDS), ('flat', flat, FLAT_FIELDS)):
+            rows = queryset.values_list(*fields)
+            yield 'scan', label, lambda rows=rows: list(rows.iterator(chunk_size=2000))
+            yield 'first page', label, lambda rows=rows: list(rows[:100])
+            yield 'iden lookups', label, lambda rows=rows: [
+                rows.filter(iden=iden).first() for iden in idens]
+            yield 'bom details', label, lambda rows=rows: [
+                list(rows.filter(pk__in=batch).order_by()) for batch in batches(pks, using)]
+
+    def time_saves(self, products):
+        for product in products:
+            product.prod_secs += 1
+            product.save()
+
+    def handle(self, *args, **options):
+        using = options['database']
+        with transaction.atomic(using=using):
+            self.populate(options['rows'], using)
+            sample = random.Random(0).sample(range(options['rows']), options['lookups'])
+            idens = [f'B{index:07d}' for index in sample]
+            pks = list(Product.objects.using(using).filter(
+                iden__in=idens).values_list('pk', flat=True))
+            results = {}
+            cases = list(self.cases(using, idens, pks))
+            for _ in range(REPEAT):
+                # Interleaved, so neither side runs on a colder cache.
+                for case, label, func in cases:
+                    secs = timed(func)
+                    results[case, label] = min(results.get((case, label), secs), secs)
+            for case in ('scan', 'first page', 'iden lookups', 'bom details'):
+                mti, flat = results[case, 'mti'], results[case, 'flat']
+                self.stdout.write(
+                    f'{case:<13} mti {mti * 1000:9.1f}ms  flat {flat * 1000:9.1f}ms  '
+                    f'x{mti / flat:5.2f}')
+
+            products = list(Product.objects.using(using).filter(pk__in=pks))
+            kept = timed(lambda: self.time_saves(products))
+            post_save.disconnect(dispatch_uid='sandbox_saved_flat_product')
+            try:
+                unkept = timed(lambda: self.time_saves(products))
+            finally:
+                post_save.connect(
+                    signals.saved_flat_product, dispatch_uid='sandbox_saved_flat_product')
+            self.stdout.write(
+                f'{"saves":<13} with FlatProduct {kept * 1000:9.1f}ms  '
+                f'without {unkept * 1000:9.1f}ms')
+            transaction.set_rollback(True, using=using)
@@ -0,0 +1,107 @@
+"""Benchmark MRP netting (sandbox.mrp) over a generated BOM."""
+
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sandbox import mrp
+from sandbox.lowlevel import compute_low_level_codes
+
+
+def generate(products, lines, levels, seed):
+    """A layered BOM in CSR form, with its prod_secs and end item demand.
+
+    The Products are split evenly across levels; each line has a parent
+    in one level and a component in the next, so the low-level codes are
+    the levels. Quantities are 1 to 3, prod_secs 1 to 600 and each end
+    item (level 0) has a demand of 1 to 10.
+    """
+    np = mrp.np
+    random = np.random.RandomState(seed)
+    per_level = products // levels
+    level_of = np.minimum(np.arange(products) // per_level, levels - 1)
+    parents = np.sort(random.randint(0, per_level * (levels - 1), lines))
+    parent_level = level_of[parents]
+    start = (parent_level + 1) * per_level
+    end = np.where(parent_level + 1 == levels - 1, products, start + per_level)
+    components = start + (random.randint(0, 2 ** 62, lines) % (end - start))
+    offsets = np.zeros(products + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(parents, minlength=products))
+    quantities = random.randint(1, 4, lines)
+    prod_secs = random.randint(1, 601, products)
+    gross = np.zeros(products, dtype=np.int64)
+    gross[:per_level] = random.randint(1, 11, per_level)
+    return offsets, components, quantities, prod_secs, gross
+
+
+def reference(offsets, components, quantities, prod_secs, gross):
+    """The plan in plain Python, a Product at a time, in low-level code order."""
+    offsets, components, quantities, prod_secs, gross = (
+        values.tolist() for values in (offsets, components, quantities, prod_secs, gross))
+    edges = [
+        (parent, components[line])
+        for parent in range(len(prod_secs)) for line in range(offsets[parent], offsets[parent + 1])]
+    levels = compute_low_level_codes(edges, products=range(len(prod_secs)))
+    for parent in sorted(levels, key=levels.get):
+        for line in range(offsets[parent], offsets[parent + 1]):
+            gross[components[line]] += gross[parent] * quantities[line]
+    return [quantity * secs for quantity, secs in zip(gross, prod_secs)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time mrp.plan_arrays() netting the demand for the end items of a '
+        'generated layered BOM, in memory, without the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=100000,
+            help='Number of Products.')
+        parser.add_argument(
+            '--lines', type=int, default=1000000,
+            help='Number of Materiel lines.')
+        parser.add_argument(
+            '--levels', type=int, default=8,
+            help='Number of low-level codes.')
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Runs timed, the best is reported.')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of the generated BOM.')
+        parser.add_argument(
+            '--reference', action='store_true',
+            help='Also time, and compare with, the plan in plain Python.')
+
+    def handle(self, *args, **options):
+        if mrp.np is None:
+            raise CommandError('benchmrp requires NumPy.')
+        start = time.perf_counter()
+        arrays = generate(options['products'], options['lines'], options['levels'], options['seed'])
+        self.stdout.write(
+            f'Generated {options["products"]} products, {options["lines"]} lines, '
+            f'{options["levels"]} levels in {time.perf_counter() - start:.2f}s.')
+        best = None
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            levels, gross, _, secs = mrp.plan_arrays(*arrays)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        tracemalloc.start()
+        try:
+            mrp.plan_arrays(*arrays)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.stdout.write(
+            f'plan_arrays: best {best:.3f}s of {options["repeat"]}, '
+            f'peak {peak / 2 ** 20:.1f} MiB, {int(levels.max()) + 1} levels, '
+            f'{int((gross > 0).sum())} products required, '
+            f'{int(secs.sum())} machine seconds')
+        if options['reference']:
+            start = time.perf_counter()
+            expected = reference(*arrays)
+            self.stdout.write(
+                f'plain Python: {time.perf_counter() - start:.3f}s, '
+                f'{"same" if expected == secs.tolist() else "DIFFERENT"} machine seconds')
@@ -0,0 +1,87 @@
+"""Benchmark ordered Thing reads, joined kind__rank against kind_rank."""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from sandbox.models import Kind, Thing
+
+ORDERINGS = (
+    ('before', ('kind__rank', 'rank', 'id')),
+    ('after', ('kind_rank', 'rank', 'id')),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time ordered scans of Things by the joined Kind rank and by the '
+        'indexed kind_rank. The Things are created and rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=1000000,
+            help='Number of Things to create.')
+        parser.add_argument(
+            '--kinds', type=int, default=20,
+            help='Number of Kinds to spread the Things over.')
+        parser.add_argument(
+            '--page-size', type=int, default=100,
+            help='Rows in the first page read.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to benchmark.')
+
+    def populate(self, rows, kinds, using):
+        kinds = [
+            Kind.objects.using(using).create(iden=f'BK{index}', name=f'Bench {index}', rank=-index)
+            for index in range(kinds)]
+        batch = []
+        for index in range(rows):
+            kind = kinds[index % len(kinds)]
+            batch.append(Thing(
+                iden=f'B{index:07d}', kind=kind, kind_rank=kind.rank,
+                name=f'Bench {index}', desc='Benchmark', rank=index % 1000))
+            if len(batch) >= 10000:
+                Thing.objects.using(using).bulk_create(batch)
+                batch = []
+        Thing.objects.using(using).bulk_create(batch)
+        with connections[using].cursor() as cursor:
+            if connections[using].vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+    def explain(self, queryset):
+        """The query plan, on backends that have EXPLAIN QUERY PLAN."""
+        connection = connections[queryset.db]
+        if connection.vendor != 'sqlite':
+            return ''
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return '; '.join(row[-1] for row in cursor.fetchall())
+
+    def handle(self, *args, **options):
+        using = options['database']
+        with transaction.atomic(using=using):
+            start = time.perf_counter()
+            self.populate(options['rows'], options['kinds'], using)
+            self.stdout.write(
+                f'Created {options["rows"]} Things in {time.perf_counter() - start:.1f}s.')
+            for label, ordering in ORDERINGS:
+                queryset = Thing.objects.using(using).order_by(*ordering)
+                ids = queryset.values_list('id', flat=True)
+
+                start = time.perf_counter()
+                list(ids[:options['page_size']])
+                first_page = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for _ in ids.iterator(chunk_size=10000):
+                    pass
+                full_scan = time.perf_counter() - start
+
+                self.stdout.write(
+                    f'{label:>6} order_by{ordering}: first page {first_page * 1000:.1f}ms, '
+                    f'full scan {full_scan:.2f}s')
+                self.stdout.write(f'       plan: {self.explain(ids[:options["page_size"]])}')
+            transaction.set_rollback(True, using=using)
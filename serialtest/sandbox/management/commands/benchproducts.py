@@ -0,0 +1,78 @@
+"""Benchmark bulk_create_products() against the save_base() loop."""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from sandbox.bulk import MTI_PRODUCT_MODELS, bulk_create_products
+from sandbox.models import Kind, Thing
+
+MODELS = {model.__name__.lower(): model for model in MTI_PRODUCT_MODELS}
+
+
+def save_base_loop(model, kind, count, using):
+    """Create Products one at a time, the way the tests do."""
+    for index in range(count):
+        thing = Thing(
+            iden=f'B{index:07d}', kind=kind, name=f'Bench {index}',
+            desc='Benchmark', rank=index)
+        thing.save(using=using)
+        obj = model(prod_secs=index)
+        setattr(obj, model._meta.pk.attname, thing.pk)
+        obj.save_base(raw=True, using=using)
+        obj.refresh_from_db(using=using)
+
+
+def bulk_loop(model, kind, count, using, batch_size=None):
+    """Create Products with bulk_create_products()."""
+    bulk_create_products(model, (
+        model(iden=f'B{index:07d}', kind=kind, name=f'Bench {index}',
+              desc='Benchmark', rank=index, prod_secs=index)
+        for index in range(count)), batch_size=batch_size, using=using)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time creating multi-table inherited Products with save_base() '
+        'and with bulk_create_products(). Everything is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+            help='Numbers of Products to create.')
+        parser.add_argument(
+            '--model', choices=sorted(MODELS), default='product',
+            help='Product model to create.')
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Rows per INSERT, default is the backend maximum.')
+        parser.add_argument(
+            '--skip-save-base', action='store_true',
+            help='Only time bulk_create_products().')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to benchmark.')
+
+    def run(self, func, model, count, using, **kwargs):
+        """Seconds to run func, rolling back its changes."""
+        with transaction.atomic(using=using):
+            kind = Kind.objects.using(using).create(iden='BENCH', name='Benchmark')
+            start = time.perf_counter()
+            func(model, kind, count, using, **kwargs)
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True, using=using)
+        return elapsed
+
+    def handle(self, *args, **options):
+        model = MODELS[options['model']]
+        using = options['database']
+        self.stdout.write(f'{"rows":>10} {"save_base s":>12} {"bulk s":>10} {"speedup":>8}')
+        for count in options['sizes']:
+            bulk = self.run(
+                bulk_loop, model, count, using, batch_size=options['batch_size'])
+            if options['skip_save_base']:
+                self.stdout.write(f'{count:>10} {"-":>12} {bulk:>10.2f} {"-":>8}')
+                continue
+            loop = self.run(save_base_loop, model, count, using)
+            self.stdout.write(f'{count:>10} {loop:>12.2f} {bulk:>10.2f} {loop / bulk:>7.1f}x')
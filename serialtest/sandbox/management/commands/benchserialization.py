@@ -0,0 +1,169 @@
+"""Benchmark serializing and deserializing each Product variant."""
+
+import json
+import platform
+import time
+import tracemalloc
+
+import django
+from django.core import serializers
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from sandbox.bulk import bulk_create_products
+from sandbox.models import Kind, Product, Product2, Product3, Product4, Product5
+
+VARIANTS = (Product, Product2, Product3, Product4, Product5)
+
+KEY_MODES = {
+    'pk': {},
+    'natural-foreign': {'use_natural_foreign_keys': True},
+    'natural': {'use_natural_foreign_keys': True, 'use_natural_primary_keys': True},
+}
+
+
+def populate(size, using):
+    """Create size Things with a row of each Product variant."""
+    kinds = [
+        Kind.objects.using(using).create(iden=f'BK{index}', name=f'Bench {index}', rank=index)
+        for index in range(2)]
+    products = bulk_create_products(Product, (
+        Product(iden=f'B{index:07d}', kind=kinds[index % 2], name=f'Bench {index}',
+                desc='Benchmark', rank=index, prod_secs=index)
+        for index in range(size)), using=using)
+    for model in (Product2, Product3):
+        objs = []
+        for product in products:
+            obj = model(prod_secs=product.prod_secs)
+            setattr(obj, model._meta.pk.attname, product.pk)
+            objs.append(obj)
+        bulk_create_products(model, objs, using=using)
+    for model in (Product4, Product5):
+        model.objects.using(using).bulk_create(
+            model(thing_id=product.pk, prod_secs=product.prod_secs) for product in products)
+
+
+def measure(func, using, memory):
+    """Run func, returning its result and a dict of its costs.
+
+    With memory, func is run a second time under tracemalloc, whose
+    overhead would skew the timing.
+    """
+    queries = []
+
+    def count_queries(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(count_queries):
+        start = time.perf_counter()
+        result = func()
+        secs = time.perf_counter() - start
+    stats = {'secs': round(secs, 6), 'queries': len(queries)}
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            stats['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Time serialization and deserialization of every Product variant, '
+        'for each format and key mode, on generated catalogs. Writes the '
+        'results as JSON. Everything is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000],
+            help='Numbers of Things (and rows of each variant) to generate.')
+        parser.add_argument(
+            '--formats', nargs='+', default=['json', 'xml', 'python'],
+            help='Serialization formats.')
+        parser.add_argument(
+            '--keys', nargs='+', choices=sorted(KEY_MODES), default=sorted(KEY_MODES),
+            help='Key modes: pk, natural-foreign, natural (foreign and primary).')
+        parser.add_argument(
+            '--models', nargs='+', default=[model.__name__ for model in VARIANTS],
+            choices=[model.__name__ for model in VARIANTS],
+            help='Product variants.')
+        parser.add_argument(
+            '--no-memory', action='store_false', dest='memory',
+            help='Skip the second, traced, run measuring peak memory.')
+        parser.add_argument(
+            '--output', '-o',
+            help='File to write the JSON results to, default standard output.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to benchmark.')
+
+    def run_case(self, model, format, keys, using, memory):
+        """Measure one model, format and key mode."""
+        options = KEY_MODES[keys]
+        queryset = model.objects.using(using).all()
+        result = {'model': model.__name__, 'format': format, 'keys': keys}
+
+        def serialize():
+            return serializers.serialize(format, queryset, **options)
+
+        def deserialize():
+            return sum(1 for _ in serializers.deserialize(format, data, using=using))
+
+        data, result['serialize'] = measure(serialize, using, memory)
+        if isinstance(data, (bytes, str)):
+            result['bytes'] = len(data)
+        count = queryset.count()
+        result['objects'] = count
+        try:
+            _, result['deserialize'] = measure(deserialize, using, memory)
+        except Exception as exc:
+            # e.g. Product2 and Product3 can not be found by natural key.
+            cause = exc.__cause__ or exc
+            result['error'] = f'{type(cause).__name__}: {cause}'
+        for phase in ('serialize', 'deserialize'):
+            if phase in result and result[phase]['secs']:
+                result[phase]['objects_per_sec'] = round(count / result[phase]['secs'], 1)
+        return result
+
+    def handle(self, *args, **options):
+        using = options['database']
+        models = [model for model in VARIANTS if model.__name__ in options['models']]
+        report = {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections[using].vendor,
+            'runs': [],
+        }
+        for size in options['sizes']:
+            with transaction.atomic(using=using):
+                populate(size, using)
+                for model in models:
+                    for format in options['formats']:
+                        for keys in options['keys']:
+                            result = self.run_case(model, format, keys, using, options['memory'])
+                            result['size'] = size
+                            report['runs'].append(result)
+                            self.stderr.write(self.summary(result))
+                transaction.set_rollback(True, using=using)
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(text + '\n')
+        else:
+            self.stdout.write(text)
+
+    @staticmethod
+    def summary(result):
+        line = (
+            f'{result["size"]:>8} {result["model"]:<9} {result["format"]:<8} '
+            f'{result["keys"]:<16}')
+        for phase in ('serialize', 'deserialize'):
+            stats = result.get(phase)
+            if stats:
+                line += f' {phase} {stats["secs"]:.3f}s/{stats["queries"]}q'
+        if 'error' in result:
+            line += f' {result["error"].splitlines()[0][:60]}'
+        return line
@@ -0,0 +1,171 @@
+"""Benchmark the catalog load and admin reads under the SQLite profiles."""
+
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.test import Client, override_settings
+
+from sandbox import natural_keys, sqlite, streaming
+from sandbox.bulk import bulk_create_products
+from sandbox.models import Kind, Materiel, Product
+
+CASES = (
+    ('default', False),
+    ('tuned', False),
+    ('tuned', True),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time loading a generated JSON Lines catalog (with a thread reading '
+        'meanwhile), small commits and admin pages, with the SQLite profiles '
+        'of sandbox.sqlite and with bulk_load(). Runs on a scratch database '
+        'file, created and destroyed the way the test runner does.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=20000,
+            help='Number of Products in the catalog.')
+        parser.add_argument(
+            '--batch-size', type=int, default=natural_keys.DEFAULT_BATCH_SIZE,
+            help='Records saved per transaction of the load.')
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Admin pages read per profile.')
+        parser.add_argument(
+            '--commits', type=int, default=1000,
+            help='One-row transactions committed per profile.')
+
+    def populate(self, rows):
+        with transaction.atomic():
+            kind = Kind.objects.create(iden='BK', name='Bench')
+            bulk_create_products(Product, (
+                Product(iden=f'B{index:07d}', kind=kind, name=f'Bench {index}',
+                        desc=f'Benchmark product {index}', rank=index, prod_secs=index)
+                for index in range(rows)))
+            pks = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+            # A tree: Product n is made of Products 10n+1 to 10n+10.
+            Materiel.objects.bulk_create(
+                Materiel(parent_id=pks[(index - 1) // 10], component_id=pks[index], quantity=2)
+                for index in range(1, len(pks)))
+
+    def clear(self):
+        with transaction.atomic(), connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            for model in reversed(streaming.catalog_models()):
+                cursor.execute(f'DELETE FROM {model._meta.db_table}')
+
+    def read_during(self, func):
+        """Run func while another thread reads, counting reads and lock errors."""
+        done = threading.Event()
+        counts = {'reads': 0, 'locked': 0}
+
+        def reader():
+            try:
+                while not done.is_set():
+                    try:
+                        Product.objects.filter(prod_secs__gte=0).count()
+                        counts['reads'] += 1
+                    except OperationalError:
+                        counts['locked'] += 1
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        try:
+            result = func()
+        finally:
+            done.set()
+            thread.join()
+        return result, counts
+
+    def time_load(self, path, batch_size, bulk):
+        self.clear()
+        start = time.perf_counter()
+        with open(path, encoding='utf-8') as stream:
+            if bulk:
+                with sqlite.bulk_load():
+                    count = streaming.load(stream, batch_size=batch_size)
+            else:
+                count = streaming.load(stream, batch_size=batch_size)
+        return count, time.perf_counter() - start
+
+    def time_commits(self, count):
+        """Seconds to commit count one-row updates, each its own transaction."""
+        start = time.perf_counter()
+        for index in range(count):
+            Kind.objects.filter(iden='BK').update(rank=index)
+        return time.perf_counter() - start
+
+    def time_reads(self, client, urls, count):
+        start = time.perf_counter()
+        for index in range(count):
+            response = client.get(urls[index % len(urls)])
+            if response.status_code != 200:
+                raise CommandError(f'{urls[index % len(urls)]}: {response.status_code}')
+        return time.perf_counter() - start
+
+    def admin_urls(self, rows):
+        pk = Product.objects.order_by('pk').values_list('pk', flat=True)[rows // 2]
+        last_page = (rows - 1) // 100
+        return [
+            '/admin/sandbox/thing/',
+            f'/admin/sandbox/thing/?p={last_page}',
+            '/admin/sandbox/product/',
+            f'/admin/sandbox/product/?p={last_page}',
+            '/admin/sandbox/materiel/?o=2',
+            f'/admin/sandbox/product/{pk}/change/',
+        ]
+
+    def run_case(self, options, path, client, label, bulk):
+        (count, secs), reads = self.read_during(
+            lambda: self.time_load(path, options['batch_size'], bulk))
+        self.stdout.write(
+            f'load    {label:<20} {count / secs:9.0f} objects/s ({count} in {secs:.2f}s), '
+            f'concurrent reads {reads["reads"]}, locked {reads["locked"]}')
+        if bulk:
+            return
+        secs = self.time_commits(options['commits'])
+        self.stdout.write(f'commits {label:<20} {options["commits"] / secs:9.0f} commits/s')
+        secs = self.time_reads(client, self.admin_urls(options['rows']), options['requests'])
+        self.stdout.write(f'admin   {label:<20} {options["requests"] / secs:9.1f} pages/s')
+
+    def run(self, options, path):
+        self.populate(options['rows'])
+        with open(path, 'w', encoding='utf-8') as stream:
+            streaming.dump(stream)
+        user = get_user_model().objects.create_superuser('bench', 'bench@example.com', 'bench')
+        client = Client()
+        client.force_login(user)
+        for profile, bulk in CASES:
+            label = profile + (' + bulk_load' if bulk else '')
+            # New connections, in either thread, take the profile's pragmas.
+            with override_settings(SANDBOX_SQLITE_PROFILE=profile):
+                connections.close_all()
+                self.run_case(options, path, client, label, bulk)
+        connections.close_all()
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite.')
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'catalog.jsonl')
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict['TEST'] = dict(
+            connection.settings_dict.get('TEST') or {},
+            NAME=os.path.join(directory, 'bench.sqlite3'))
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                self.run(options, path)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            os.remove(path)
+            os.rmdir(directory)
@@ -0,0 +1,72 @@
+"""Benchmark the memory of full and summary Thing and Product reads."""
+
+import time
+import tracemalloc
+
+from django.core import serializers
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from sandbox import summary
+from sandbox.bulk import bulk_create_products
+from sandbox.models import Kind, Product, Thing
+
+PER_ROWS = 100000
+
+
+def traced(func):
+    """Run func, returning its wall time and peak traced memory."""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        func()
+        secs = time.perf_counter() - start
+        return secs, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the peak memory and time of listing, and serializing, '
+        'Things and Products with all their fields and with summary(). The '
+        'Products are created and rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=PER_ROWS,
+            help='Number of Products to create.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to benchmark.')
+
+    def populate(self, rows, using):
+        kind = Kind.objects.using(using).create(iden='BK', name='Bench')
+        bulk_create_products(Product, (
+            Product(iden=f'B{index:07d}', kind=kind, name=f'Bench {index}',
+                    desc=f'{index:<255}', image=f'bench/{index:07d}.png',
+                    rank=index, prod_secs=index)
+            for index in range(rows)), using=using)
+
+    def cases(self, using):
+        for model in (Thing, Product):
+            name = model.__name__
+            queryset = model.objects.using(using)
+            yield f'{name}.objects.all()', lambda queryset=queryset: list(queryset.all())
+            yield f'{name}.objects.summary()', lambda queryset=queryset: list(queryset.summary())
+            yield (f'{name} json', lambda queryset=queryset:
+                   serializers.serialize('json', queryset.all()))
+            yield (f'{name} summary json', lambda queryset=queryset:
+                   summary.serialize('json', queryset.all()))
+
+    def handle(self, *args, **options):
+        using = options['database']
+        rows = options['rows']
+        with transaction.atomic(using=using):
+            self.populate(rows, using)
+            for label, func in self.cases(using):
+                secs, peak = traced(func)
+                self.stdout.write(
+                    f'{label:<28} {secs:7.2f}s peak {peak / 2 ** 20:8.1f} MiB, '
+                    f'{peak * PER_ROWS / rows / 2 ** 20:8.1f} MiB per {PER_ROWS} rows')
+            transaction.set_rollback(True, using=using)
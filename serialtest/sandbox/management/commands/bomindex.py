@@ -0,0 +1,25 @@
+"""Build and publish the BOM index snapshot."""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import bomindex
+
+
+class Command(BaseCommand):
+    help = 'Build the Materiel BOM index and publish its snapshot for the workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to build from.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = bomindex.publish(using=options['database'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Published {len(index)} product(s), {len(index.components)} line(s) '
+            f'at version {index.version} to {bomindex.snapshot_path()} in {elapsed:.2f}s.')
@@ -0,0 +1,38 @@
+"""Stream the Sandbox catalog to a JSON Lines file."""
+
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import streaming
+
+
+class Command(BaseCommand):
+    help = 'Stream the Sandbox catalog to JSON Lines with constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?',
+            help='File to write, default is standard output.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=streaming.DEFAULT_CHUNK_SIZE,
+            help='Rows fetched from the database at a time.')
+        parser.add_argument(
+            '--no-natural-keys', action='store_false', dest='natural_keys',
+            help='Serialize pk values instead of natural keys.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to dump from.')
+
+    def handle(self, *args, **options):
+        kwargs = dict(
+            chunk_size=options['chunk_size'], using=options['database'],
+            use_natural_foreign_keys=options['natural_keys'],
+            use_natural_primary_keys=options['natural_keys'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                count = streaming.dump(stream, **kwargs)
+            self.stderr.write(f'Dumped {count} object(s).')
+        else:
+            streaming.dump(sys.stdout, **kwargs)
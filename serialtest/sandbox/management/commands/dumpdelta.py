@@ -0,0 +1,38 @@
+"""Export the Sandbox catalog changes after a watermark as JSON Lines."""
+
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import delta, streaming
+
+
+class Command(BaseCommand):
+    help = (
+        'Export the rows changed, and the natural keys deleted, after a '
+        'watermark. The next watermark is written to standard error.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?',
+            help='File to write, default is standard output.')
+        parser.add_argument(
+            '--since', type=int, default=0,
+            help='Watermark returned by the previous export.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=streaming.DEFAULT_CHUNK_SIZE,
+            help='Rows fetched from the database at a time.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to export from.')
+
+    def handle(self, *args, **options):
+        kwargs = dict(
+            since=options['since'], chunk_size=options['chunk_size'], using=options['database'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                count, watermark = delta.export(stream, **kwargs)
+        else:
+            count, watermark = delta.export(sys.stdout, **kwargs)
+        self.stderr.write(f'Exported {count} record(s), next watermark: {watermark}')
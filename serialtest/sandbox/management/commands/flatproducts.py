@@ -0,0 +1,23 @@
+"""Rebuild the flattened read copy of all Products."""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import flat
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FlatProduct row of every Product, e.g. after bulk updates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to update.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = flat.rebuild(using=options['database'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Rebuilt {count} flat product(s) in {elapsed:.2f}s.')
@@ -0,0 +1,49 @@
+"""Ingest a directory of Thing images, matched by iden."""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import ingest
+
+
+class Command(BaseCommand):
+    help = (
+        'Set the images of the Things from the files of a directory named '
+        'by their iden (e.g. P-12.jpg), validated, downsized and stored '
+        'once per content by a process pool. Safe to run again after an '
+        'interruption.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory', help='Directory of the image files.')
+        parser.add_argument(
+            '--recursive', '-r', action='store_true',
+            help='Also scan the subdirectories.')
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Image processes, default the number of CPUs; 0 processes in-process.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=ingest.DEFAULT_CHUNK_SIZE,
+            help='Things updated per transaction.')
+        parser.add_argument(
+            '--max-size', type=int, default=ingest.DEFAULT_MAX_SIZE,
+            help='Largest width and height kept, in pixels.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to update.')
+
+    def handle(self, *args, **options):
+        stats = ingest.ingest(
+            options['directory'], processes=options['processes'],
+            chunk_size=options['chunk_size'], max_size=options['max_size'],
+            recursive=options['recursive'], using=options['database'])
+        for path in stats.unmatched:
+            self.stderr.write(f'{path}: No Thing of that iden.')
+        for path, error in stats.failed:
+            self.stderr.write(f'{path}: {error}')
+        secs = stats.secs or 1e-9
+        self.stdout.write(
+            f'{stats.files} file(s): {stats.updated} updated, {stats.skipped} already '
+            f'ingested, {stats.stored} stored, {len(stats.unmatched)} unmatched, '
+            f'{len(stats.failed)} failed in {stats.secs:.2f}s '
+            f'({stats.files / secs:.1f} files/s, {stats.bytes / secs / 2 ** 20:.1f} MiB/s).')
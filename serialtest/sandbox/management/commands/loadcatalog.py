@@ -0,0 +1,44 @@
+"""Load a JSON Lines file of the Sandbox catalog in batches."""
+
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import instrument, natural_keys, sqlite, streaming
+
+
+class Command(BaseCommand):
+    help = 'Load a JSON Lines catalog, saving it in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', help="File to read, '-' for standard input.")
+        parser.add_argument(
+            '--batch-size', type=int, default=natural_keys.DEFAULT_BATCH_SIZE,
+            help='Records resolved and saved per transaction.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to load into.')
+        parser.add_argument(
+            '--profile', action='store_true',
+            help='Log the time and queries of each phase (sandbox.instrument).')
+        parser.add_argument(
+            '--bulk', action='store_true',
+            help='Relax durability and rebuild the indexes after loading (sandbox.sqlite).')
+
+    def load(self, path, **kwargs):
+        if path == '-':
+            return streaming.load(sys.stdin, **kwargs)
+        with open(path, encoding='utf-8') as stream:
+            return streaming.load(stream, **kwargs)
+
+    def handle(self, *args, **options):
+        kwargs = dict(batch_size=options['batch_size'], using=options['database'])
+        with instrument.profiling('loadcatalog', enabled=options['profile']):
+            if options['bulk']:
+                with sqlite.bulk_load(using=options['database']):
+                    count = self.load(options['input'], **kwargs)
+            else:
+                count = self.load(options['input'], **kwargs)
+        self.stdout.write(f'Loaded {count} object(s).')
@@ -0,0 +1,31 @@
+"""Apply a JSON Lines delta of the Sandbox catalog."""
+
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import delta, natural_keys
+
+
+class Command(BaseCommand):
+    help = 'Apply a delta written by dumpdelta. Applying it again changes nothing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', help="File to read, '-' for standard input.")
+        parser.add_argument(
+            '--batch-size', type=int, default=natural_keys.DEFAULT_BATCH_SIZE,
+            help='Records resolved by natural key at a time.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to apply the delta to.')
+
+    def handle(self, *args, **options):
+        kwargs = dict(batch_size=options['batch_size'], using=options['database'])
+        if options['input'] == '-':
+            saved, deleted = delta.apply(sys.stdin, **kwargs)
+        else:
+            with open(options['input'], encoding='utf-8') as stream:
+                saved, deleted = delta.apply(stream, **kwargs)
+        self.stdout.write(f'Saved {saved} and deleted {deleted} object(s).')
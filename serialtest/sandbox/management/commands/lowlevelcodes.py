@@ -0,0 +1,26 @@
+"""Compute the low-level codes of all Products from the Materiel BOM."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import lowlevel
+
+
+class Command(BaseCommand):
+    help = 'Compute and save the low-level code of every Product.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to update.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            count = lowlevel.update_low_level_codes(using=options['database'])
+        except lowlevel.BOMCycleError as exc:
+            raise CommandError(exc.message % exc.params)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Updated {count} product(s) in {elapsed:.2f}s.')
@@ -0,0 +1,72 @@
+"""Plan the requirements of a gross demand for Products."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import lowlevel, mrp
+from sandbox.models import Product
+
+
+def quantities(args, option):
+    """Parse iden=quantity arguments."""
+    parsed = {}
+    for arg in args:
+        iden, _, quantity = arg.partition('=')
+        try:
+            parsed[iden] = parsed.get(iden, 0) + int(quantity)
+        except ValueError:
+            raise CommandError(f'{option} {arg!r} is not iden=quantity.')
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Net and explode the gross demand for Products through the BOM, in '
+        'low-level code order, listing each required Product with its '
+        'gross and net quantities and machine seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'demand', nargs='+', metavar='iden=quantity',
+            help='Gross demand for a Product.')
+        parser.add_argument(
+            '--on-hand', nargs='+', default=[], metavar='iden=quantity',
+            help='Quantities on hand, netted from the requirements.')
+        parser.add_argument(
+            '--limit', type=int, default=50,
+            help='Products listed, 0 for all.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to plan from.')
+
+    def by_pk(self, by_iden, using):
+        pks = dict(Product.objects.db_manager(using).flat().filter(
+            iden__in=list(by_iden)).values_list('iden', 'pk'))
+        missing = sorted(set(by_iden) - set(pks))
+        if missing:
+            raise CommandError(f'No product {", ".join(missing)}.')
+        return {pks[iden]: quantity for iden, quantity in by_iden.items()}
+
+    def handle(self, *args, **options):
+        if mrp.np is None:
+            raise CommandError('mrp requires NumPy.')
+        using = options['database']
+        demand = self.by_pk(quantities(options['demand'], 'demand'), using)
+        on_hand = self.by_pk(quantities(options['on_hand'], '--on-hand'), using)
+        start = time.perf_counter()
+        try:
+            plan = mrp.plan(demand, on_hand, using=using)
+        except lowlevel.BOMCycleError as exc:
+            raise CommandError(exc.message % exc.params)
+        elapsed = time.perf_counter() - start
+        rows = list(plan.rows())
+        idens = dict(Product.objects.db_manager(using).flat().filter(
+            pk__in=[row[0] for row in rows[:options['limit'] or None]]).values_list('pk', 'iden'))
+        self.stdout.write(f'{"Level":>5} {"Product":<8} {"Gross":>12} {"Net":>12} {"Seconds":>14}')
+        for pk, level, gross, net, secs in rows[:options['limit'] or None]:
+            self.stdout.write(f'{level:>5} {idens.get(pk, pk):<8} {gross:>12} {net:>12} {secs:>14}')
+        self.stdout.write(
+            f'Planned {len(rows)} product(s), {plan.total_secs()} machine seconds, '
+            f'in {elapsed:.2f}s.')
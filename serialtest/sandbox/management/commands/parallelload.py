@@ -0,0 +1,49 @@
+"""Load a JSON Lines file of the Sandbox catalog with a parsing pool."""
+
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import natural_keys, parallel
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a JSON Lines catalog, parsing it with a process pool and '
+        'saving it model stage by model stage.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', help="File to read, '-' for standard input.")
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Parsing processes, default the number of CPUs; 0 parses in-process.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=parallel.DEFAULT_CHUNK_SIZE,
+            help='Lines per parsing task.')
+        parser.add_argument(
+            '--batch-size', type=int, default=natural_keys.DEFAULT_BATCH_SIZE,
+            help='Records per natural key resolution.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to load into.')
+        parser.add_argument(
+            '--ignorenonexistent', '-i', action='store_true',
+            help='Ignore fields and models that do not exist.')
+
+    def handle(self, *args, **options):
+        kwargs = dict(
+            processes=options['processes'], chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'], using=options['database'],
+            ignorenonexistent=options['ignorenonexistent'])
+        if options['input'] == '-':
+            stats = parallel.load(sys.stdin, **kwargs)
+        else:
+            with open(options['input'], encoding='utf-8') as stream:
+                stats = parallel.load(stream, **kwargs)
+        for number, stage in enumerate(stats.stages, start=1):
+            self.stdout.write(f'Stage {number}: {", ".join(stage)}', self.style.SQL_FIELD)
+        self.stdout.write(
+            f'Loaded {stats.count} object(s): parsed in {stats.parse_secs:.2f}s, '
+            f'written in {stats.write_secs:.2f}s.')
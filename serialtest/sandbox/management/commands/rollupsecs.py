@@ -0,0 +1,26 @@
+"""Compute the rolled-up production seconds of all Products."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import lowlevel, rollup
+
+
+class Command(BaseCommand):
+    help = 'Compute and save the rolled-up production seconds of every Product.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to update.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            count = rollup.update_rollups(using=options['database'])
+        except lowlevel.BOMCycleError as exc:
+            raise CommandError(exc.message % exc.params)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Updated {count} product(s) in {elapsed:.2f}s.')
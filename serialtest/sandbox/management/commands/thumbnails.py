@@ -0,0 +1,42 @@
+"""Hash the Thing images and generate their missing thumbnails."""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox import thumbnails
+from sandbox.models import Thing
+
+
+class Command(BaseCommand):
+    help = (
+        'Hash the images of the Things without an image hash (e.g. loaded '
+        'from fixtures) and generate the thumbnails missing, with a pool of '
+        'worker threads.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Worker threads reading and resizing the images.')
+        parser.add_argument(
+            '--rehash', action='store_true',
+            help='Hash every image again, e.g. after replacing the files.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=thumbnails.DEFAULT_CHUNK_SIZE,
+            help='Things per chunk.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to update.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = thumbnails.generate(
+            Thing.objects.using(options['database']), workers=options['workers'],
+            rehash=options['rehash'], chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - start
+        for name, error in stats.failed:
+            self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'{stats.things} image(s), {stats.hashed} hash(es) saved, '
+            f'{len(stats.failed)} failed in {elapsed:.2f}s.')
@@ -0,0 +1,43 @@
+# Generated by Django 2.1 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+def copy_kind_ranks(apps, schema_editor):
+    Kind = apps.get_model('sandbox', 'Kind')
+    Thing = apps.get_model('sandbox', 'Thing')
+    db_alias = schema_editor.connection.alias
+    kind_rank = Kind.objects.filter(pk=models.OuterRef('kind_id')).values('rank')
+    Thing.objects.using(db_alias).update(kind_rank=models.Subquery(kind_rank))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0002_product5'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='product4',
+            options={'ordering': ('thing__kind_rank', 'thing__rank')},
+        ),
+        migrations.AlterModelOptions(
+            name='thing',
+            options={'ordering': ('kind_rank', 'rank', 'id')},
+        ),
+        migrations.AddField(
+            model_name='thing',
+            name='kind_rank',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Kind rank'),
+        ),
+        migrations.RunPython(copy_kind_ranks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='kind',
+            index=models.Index(fields=['rank', 'id'], name='sandbox_kind_ordering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thing',
+            index=models.Index(fields=['kind_rank', 'rank', 'id'], name='sandbox_thing_ordering_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 2.1 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0003_thing_kind_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Value')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='kind',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, serialize=False, verbose_name='Change sequence'),
+        ),
+        migrations.AddField(
+            model_name='materiel',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, serialize=False, verbose_name='Change sequence'),
+        ),
+        migrations.AddField(
+            model_name='thing',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, serialize=False, verbose_name='Change sequence'),
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=100, verbose_name='Model')),
+                ('natural_key', models.CharField(max_length=255, verbose_name='Natural key (JSON)')),
+                ('change_seq', models.BigIntegerField(db_index=True, verbose_name='Change sequence')),
+            ],
+            options={
+                'unique_together': {('label', 'natural_key')},
+            },
+        ),
+    ]
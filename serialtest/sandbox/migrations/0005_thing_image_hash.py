@@ -0,0 +1,18 @@
+# Generated by Django 2.1 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0004_change_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thing',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, serialize=False, verbose_name='Image hash'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 2.1 on 2026-10-18 10:02
+
+from collections import defaultdict, deque
+
+from django.db import migrations, models
+
+MAX_SECS = 2 ** 63 - 1
+
+
+def compute_rollups(prod_secs, lines):
+    """The rolled-up seconds by Product pk, components first; None on a BOM cycle.
+
+    A copy of sandbox.rollup.compute_rollups() as of this migration.
+    """
+    components = defaultdict(list)
+    parents = defaultdict(list)
+    for parent, component, quantity in lines:
+        components[parent].append((component, quantity))
+        parents[component].append(parent)
+    waiting = {pk: len(components[pk]) for pk in prod_secs}
+    queue = deque(pk for pk, count in waiting.items() if not count)
+    rollups = {}
+    while queue:
+        pk = queue.popleft()
+        rollups[pk] = min(MAX_SECS, prod_secs[pk] + sum(
+            quantity * rollups[component] for component, quantity in components[pk]))
+        for parent in parents[pk]:
+            waiting[parent] -= 1
+            if not waiting[parent]:
+                queue.append(parent)
+    return rollups if len(rollups) == len(prod_secs) else None
+
+
+def fill_rollups(apps, schema_editor):
+    Product = apps.get_model('sandbox', 'Product')
+    Materiel = apps.get_model('sandbox', 'Materiel')
+    db_alias = schema_editor.connection.alias
+    prod_secs = dict(Product.objects.using(db_alias).values_list('pk', 'prod_secs').iterator())
+    lines = list(Materiel.objects.using(db_alias).values_list(
+        'parent_id', 'component_id', 'quantity').iterator())
+    rollups = compute_rollups(prod_secs, lines)
+    if rollups is None:
+        return  # A cycle, left for the rollupsecs command to report.
+    by_secs = defaultdict(list)
+    for pk, secs in rollups.items():
+        by_secs[secs].append(pk)
+    for secs, pks in by_secs.items():
+        for start in range(0, len(pks), 500):
+            Product.objects.using(db_alias).filter(
+                pk__in=pks[start:start + 500]).update(rollup_secs=secs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0005_thing_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rollup_secs',
+            field=models.BigIntegerField(default=0, editable=False, serialize=False, verbose_name='Rolled-up production seconds'),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
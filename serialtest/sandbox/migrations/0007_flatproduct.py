@@ -0,0 +1,52 @@
+# Generated by Django 2.1 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_flat_products(apps, schema_editor):
+    Product = apps.get_model('sandbox', 'Product')
+    FlatProduct = apps.get_model('sandbox', 'FlatProduct')
+    db_alias = schema_editor.connection.alias
+    rows = Product.objects.using(db_alias).values_list(
+        'pk', 'iden', 'name', 'kind_id', 'kind__iden', 'kind__rank', 'rank',
+        'prod_secs', 'low_level')
+    FlatProduct.objects.using(db_alias).bulk_create(
+        (FlatProduct(
+            product_id=pk, iden=iden, name=name, kind_id=kind_id, kind_iden=kind_iden,
+            kind_rank=kind_rank, rank=rank, prod_secs=prod_secs, low_level=low_level)
+         for pk, iden, name, kind_id, kind_iden, kind_rank, rank, prod_secs, low_level
+         in rows.iterator()),
+        batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0006_product_rollup_secs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlatProduct',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='flat', serialize=False, to='sandbox.Product')),
+                ('iden', models.CharField(db_index=True, max_length=8, verbose_name='Thing')),
+                ('name', models.CharField(max_length=80, verbose_name='Name')),
+                ('kind_iden', models.CharField(max_length=8, verbose_name='Kind')),
+                ('kind_rank', models.IntegerField(verbose_name='Kind rank')),
+                ('rank', models.IntegerField(verbose_name='Rank')),
+                ('prod_secs', models.IntegerField(verbose_name='Production seconds')),
+                ('low_level', models.IntegerField(verbose_name='Low-level code')),
+                ('kind', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sandbox.Kind')),
+            ],
+            options={
+                'ordering': ('kind_rank', 'rank', 'product_id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='flatproduct',
+            index=models.Index(fields=['kind_rank', 'rank', 'product'], name='sandbox_flatproduct_order_idx'),
+        ),
+        migrations.RunPython(build_flat_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0007_flatproduct'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='low_level',
+            field=models.IntegerField(default=-1, editable=False, verbose_name='Low-level code'),
+        ),
+    ]
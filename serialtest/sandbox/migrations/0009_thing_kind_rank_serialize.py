@@ -0,0 +1,18 @@
+# Generated by Django 2.1 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0008_product_low_level_editable'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='thing',
+            name='kind_rank',
+            field=models.IntegerField(default=0, editable=False, serialize=False, verbose_name='Kind rank'),
+        ),
+    ]
@@ -5,21 +5,97 @@ import os
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.files.storage import FileSystemStorage
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.utils.html import format_html
 
+from . import instrument, summary, thumbnails, versions
+from .nkcache import natural_key_cache
+
 STATIC_IMAGES_PATH = 'sandbox/images'
 IMAGE_ASSET_STORAGE = FileSystemStorage(
     location=os.path.join(settings.STATIC_ROOT, STATIC_IMAGES_PATH),
     base_url=os.path.join(settings.STATIC_URL, STATIC_IMAGES_PATH))
 
 
-class KindManager(models.Manager):
-    def get_by_natural_key(self, iden):
-        return self.get(iden=iden)
+class NaturalKeyManager(models.Manager):
+    """Manager with natural key lookups of single and many instances.
+
+    natural_key_fields: Lookups matching the parts of the natural_key().
+
+    cache_natural_keys: Whether lookups use the natural key cache (when
+    enabled by SANDBOX_NATURAL_KEY_CACHE_SIZE, see sandbox.nkcache).
+    """
+    natural_key_fields = ('iden',)
+    cache_natural_keys = True
+
+    def _use_cache(self):
+        return self.cache_natural_keys and natural_key_cache.enabled
+
+    @instrument.timed('get_by_natural_key')
+    def get_by_natural_key(self, *key):
+        if not self._use_cache():
+            return self.get(**dict(zip(self.natural_key_fields, key)))
+        obj = natural_key_cache.get(self.model, self.db, key)
+        if obj is None:
+            obj = self.get(**dict(zip(self.natural_key_fields, key)))
+            # Rows read in a transaction may yet be rolled back.
+            if not connections[self.db].in_atomic_block:
+                natural_key_cache.put(self.model, self.db, key, obj)
+        return obj
+
+    @instrument.timed('in_bulk_by_natural_key')
+    def in_bulk_by_natural_key(self, keys):
+        """Return a dict mapping natural keys (tuples) to pk's.
+
+        Keys that do not exist are omitted. Issues one query per batch of
+        keys (not cached) that fits within the database's query parameter
+        limit.
+        """
+        keys = {tuple(key) for key in keys}
+        found = {}
+        if self._use_cache():
+            for key in keys:
+                pk = natural_key_cache.get_pk(self.model, self.db, key)
+                if pk is not None:
+                    found[key] = pk
+            keys.difference_update(found)
+        fields = self.natural_key_fields
+        max_params = connections[self.db].features.max_query_params or 999
+        batch_size = max(max_params // len(fields), 1)
+        ordered = sorted(keys)
+        for start in range(0, len(ordered), batch_size):
+            batch = ordered[start:start + batch_size]
+            filters = {
+                f'{field}__in': {key[index] for key in batch}
+                for index, field in enumerate(fields)}
+            rows = self.filter(**filters).order_by().values_list(*fields, 'pk')
+            for row in rows:
+                if row[:-1] in keys:
+                    found[row[:-1]] = row[-1]
+        return found
+
+
+class ChangeTrackedModel(models.Model):
+    """Model numbered by each save for delta exports (see sandbox.delta).
+
+    The number is taken by a pre_save receiver: save_base() runs in a
+    transaction, so that it commits with the row.
+    """
+    class Meta:
+        abstract = True
+
+    def save_base(self, raw=False, force_insert=False, force_update=False, using=None,
+                  update_fields=None):
+        using = using or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save_base(raw, force_insert, force_update, using, update_fields)
+
+
+class KindManager(NaturalKeyManager):
+    """Kind model manager."""
 
 
-class Kind(models.Model):
+class Kind(ChangeTrackedModel):
     """Kind Model is the Kind of the Thing."""
     objects = KindManager()
 
@@ -27,9 +103,16 @@ class Kind(models.Model):
     name = models.CharField('Name', max_length=80)
     desc = models.CharField('Description', max_length=255, blank=True)
     rank = models.IntegerField('Rank', default=0)
+    # Set from the ChangeSequence by each save, for delta exports (see
+    # sandbox.delta). Local to the database, so not serialized.
+    change_seq = models.BigIntegerField(
+        'Change sequence', default=0, db_index=True, editable=False, serialize=False)
 
     class Meta:
         ordering = ('rank', 'id',)
+        indexes = [
+            models.Index(fields=['rank', 'id'], name='sandbox_kind_ordering_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -38,12 +121,40 @@ class Kind(models.Model):
         return (self.iden,)
 
 
-class ThingManager(models.Manager):
-    def get_by_natural_key(self, iden):
-        return self.get(iden=iden)
+class ThingQuerySet(models.QuerySet):
+    """Thing querysets, with summaries for lists and BOMs."""
+
+    def summary(self, *fields):
+        """Load only the summary fields and the fields named.
+
+        The other fields load on first access, in bulk (see sandbox.summary).
+        """
+        clone = self.only(*summary.SUMMARY_FIELDS, *fields)
+        clone._iterable_class = summary.SummaryIterable
+        return clone
+
+
+class ThingManager(NaturalKeyManager.from_queryset(ThingQuerySet)):
+    """Thing model manager, inherited by the Thing child models."""
+
+    def sync_kind_ranks(self):
+        """Copy each Kind's rank to its Things' kind_rank, where it differs.
 
+        For Things saved without Thing.save(), e.g. raw or bulk loads.
+        Returns the number of Things updated.
+        """
+        kind_rank = Kind.objects.filter(pk=models.OuterRef('kind_id')).values('rank')
+        count = Thing.objects.using(self.db).exclude(
+            kind_rank=models.Subquery(kind_rank),
+        ).update(kind_rank=models.Subquery(kind_rank))
+        if count:
+            versions.bump_model_version(Thing, using=self.db)
+            # Which Things changed is not known: drop every cached row.
+            natural_key_cache.clear()
+        return count
 
-class Thing(models.Model):
+
+class Thing(ChangeTrackedModel):
     """General collection of objects.
 
     Named 'things' instead of objects as that would get confusing referring to Object.objects, etc.
@@ -56,9 +167,24 @@ class Thing(models.Model):
     desc = models.CharField('Description', max_length=255)
     rank = models.IntegerField('Rank', default=0)
     image = models.ImageField('Thing', storage=IMAGE_ASSET_STORAGE, blank=True)
+    # SHA-1 of the image's content, naming its thumbnail (see
+    # sandbox.thumbnails). Derived from the local files, so not serialized.
+    image_hash = models.CharField(
+        'Image hash', max_length=40, blank=True, editable=False, serialize=False)
+    # Denormalized kind.rank, so that the ordering is read from one index
+    # instead of joining and sorting. Kept by save() and Kind saves, so not
+    # serialized.
+    kind_rank = models.IntegerField('Kind rank', default=0, editable=False, serialize=False)
+    # Set from the ChangeSequence by each save, for delta exports (see
+    # sandbox.delta). Local to the database, so not serialized.
+    change_seq = models.BigIntegerField(
+        'Change sequence', default=0, db_index=True, editable=False, serialize=False)
 
     class Meta:
-        ordering = ('kind__rank', 'rank', 'id',)
+        ordering = ('kind_rank', 'rank', 'id',)
+        indexes = [
+            models.Index(fields=['kind_rank', 'rank', 'id'], name='sandbox_thing_ordering_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -66,13 +192,28 @@ class Thing(models.Model):
     def natural_key(self):
         return (self.iden,)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'image' in field_names:
+            # To tell a changed image on save (see sandbox.thumbnails).
+            instance._loaded_image = values[field_names.index('image')]
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.kind_id is not None:
+            self.kind_rank = self.kind.rank
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Deferred fields of summary() instances load for their cohort.
+        if using is not None or fields is None or not summary.load_deferred(self, fields):
+            super().refresh_from_db(using, fields)
+
     def img_html(self):
-        """Image tag for image file."""
+        """Image tag for image file, served as its thumbnail."""
         if self.image:
-            return format_html(
-                '<img src="{0}" alt="{1}" title={1}>',
-                self.image.url,
-                self.name)
+            return thumbnails.img_html(self)
         return self.__str__()
     img_html.short_description = 'Thing'
 
@@ -87,15 +228,44 @@ class Thing(models.Model):
     img_name_html.short_description = 'Thing'
 
 
+class ProductManager(ThingManager):
+    """Product model manager."""
+
+    def flat(self):
+        """FlatProduct rows of the Products, read without the Thing and Kind joins.
+
+        Filter, order and read them by the Product lookups, e.g. iden,
+        kind_rank or prod_secs; kind_iden is the Kind's iden.
+        """
+        return FlatProduct.objects.db_manager(self.db).all()
+
+
 class Product(Thing):
     """Product for things that can be produced.
 
     A child record of Thing.
     """
+    objects = ProductManager()
+
     thing = models.OneToOneField(
         Thing, on_delete=models.CASCADE, parent_link=True)
     prod_secs = models.IntegerField('Production seconds')
-    low_level = models.IntegerField('Low-level code', default=-1)
+    # Kept by QuerySet.update() from the Materiels (see sandbox.lowlevel),
+    # so left out of the UPDATE of a save, which could hold a stale code.
+    low_level = models.IntegerField('Low-level code', default=-1, editable=False)
+    # prod_secs plus the quantity-weighted rollup_secs of the components,
+    # kept by saves (see sandbox.rollup). Derived, so not serialized.
+    rollup_secs = models.BigIntegerField(
+        'Rolled-up production seconds', default=0, editable=False, serialize=False)
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if update_fields is None and not force_insert and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'low_level' and
+                field.attname not in deferred]
+        super().save(force_insert, force_update, using, update_fields)
 # Tweak the 'thing' field's 'serialize' attribute.
 # This overrides the normally 'False' value, which omits
 # the 'thing' field from serialization when using
@@ -103,19 +273,79 @@ class Product(Thing):
 Product._meta.get_field('thing').serialize = True
 
 
-class MaterielManager(models.Manager):
-    def get_by_natural_key(self, parent, component):
-        return self.get(
-            parent__thing__iden=parent, component__thing__iden=component)
+class FlatProduct(models.Model):
+    """Flattened read copy of a Product with its Thing and Kind fields.
 
+    Kept by the saves of Things, Products and Kinds (see sandbox.flat).
+    Read it with Product.objects.flat().
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='flat')
+    iden = models.CharField('Thing', max_length=8, db_index=True)
+    name = models.CharField('Name', max_length=80)
+    kind = models.ForeignKey(Kind, on_delete=models.CASCADE, related_name='+')
+    kind_iden = models.CharField('Kind', max_length=8)
+    kind_rank = models.IntegerField('Kind rank')
+    rank = models.IntegerField('Rank')
+    prod_secs = models.IntegerField('Production seconds')
+    low_level = models.IntegerField('Low-level code')
+
+    class Meta:
+        ordering = ('kind_rank', 'rank', 'product_id')
+        indexes = [
+            models.Index(
+                fields=['kind_rank', 'rank', 'product'], name='sandbox_flatproduct_order_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class MaterielManager(NaturalKeyManager):
+    """Materiel model manager."""
+    natural_key_fields = ('parent__thing__iden', 'component__thing__iden')
+
+    def descendants(self, pks):
+        """Return the pk's of the Products used, at any depth, in the given Products.
+
+        One query per BOM level (and batch of pk's); a cycle is walked once.
+        """
+        return self._walk(pks, 'parent_id', 'component_id')
+
+    def ancestors(self, pks):
+        """Return the pk's of the Products using, at any depth, the given Products.
+
+        Following 'usedin', one query per BOM level (and batch of pk's).
+        """
+        return self._walk(pks, 'component_id', 'parent_id')
+
+    def _walk(self, pks, start, follow):
+        batch_size = connections[self.db].features.max_query_params or 999
+        found = set()
+        frontier = set(pks)
+        while frontier:
+            frontier = sorted(frontier)
+            reached = set()
+            for index in range(0, len(frontier), batch_size):
+                reached.update(self.filter(**{
+                    f'{start}__in': frontier[index:index + batch_size],
+                }).order_by().values_list(follow, flat=True))
+            frontier = reached - found
+            found.update(frontier)
+        return found
 
-class Materiel(models.Model):
+
+class Materiel(ChangeTrackedModel):
     """Materiel Bill-Of-Material records."""
     objects = MaterielManager()
 
     parent = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='materiels')
     component = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='usedin')
     quantity = models.IntegerField()
+    # Set from the ChangeSequence by each save, for delta exports (see
+    # sandbox.delta). Local to the database, so not serialized.
+    change_seq = models.BigIntegerField(
+        'Change sequence', default=0, db_index=True, editable=False, serialize=False)
 
     class Meta:
         unique_together = (('parent', 'component'),)
@@ -128,6 +358,9 @@ class Materiel(models.Model):
         """Validate BOM relationship."""
         if self.parent and self.component and self.parent == self.component:
             raise ValidationError('Parent and component can not be the same.')
+        if (self.parent_id and self.component_id and
+                self.parent_id in Materiel.objects.descendants([self.component_id])):
+            raise ValidationError('Component can not be used in its own parent.')
 
     def parent_name(self):
         return self.parent.thing.name
@@ -163,10 +396,9 @@ class Product3(Thing):
 # Product3._meta.get_field('thing').serialize = True
 
 
-class Product4Manager(models.Manager):
+class Product4Manager(NaturalKeyManager):
     """Old Product model manager."""
-    def get_by_natural_key(self, iden):
-        return self.get(thing__iden=iden)
+    natural_key_fields = ('thing__iden',)
 
 
 class Product4(models.Model):
@@ -184,7 +416,7 @@ class Product4(models.Model):
     low_level = models.IntegerField('Low-level code', default=-1)
 
     class Meta:
-        ordering = ('thing__kind__rank', 'thing__rank')
+        ordering = ('thing__kind_rank', 'thing__rank')
 
     def __str__(self):
         return self.thing.name
@@ -219,3 +451,27 @@ class Product5(models.Model):
     natural_key.dependencies = ['sandbox.thing']
 # # Tweak the 'thing' field's 'serialize' attribute.
 # Product5._meta.get_field('thing').serialize = True
+
+
+class ChangeSequence(models.Model):
+    """Counter numbering the changes of the tracked models, one row."""
+    value = models.BigIntegerField('Value', default=0)
+
+    def __str__(self):
+        return str(self.value)
+
+
+class Tombstone(models.Model):
+    """Natural key of a deleted (or re-keyed) tracked row, for delta exports.
+
+    Dropped when a row with the natural key is saved again.
+    """
+    label = models.CharField('Model', max_length=100)
+    natural_key = models.CharField('Natural key (JSON)', max_length=255)
+    change_seq = models.BigIntegerField('Change sequence', db_index=True)
+
+    class Meta:
+        unique_together = (('label', 'natural_key'),)
+
+    def __str__(self):
+        return f'{self.label} {self.natural_key}'
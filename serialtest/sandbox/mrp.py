@@ -0,0 +1,175 @@
+"""MRP netting over the Materiel BOM graph, with NumPy arrays.
+
+Given the gross demand for some Products (end items, or any others), and
+optionally their quantities on hand, plan() explodes the requirements level
+by level in low-level code order: every gross requirement of a Product is
+known before it is netted, so each Product is netted once.
+
+    net = max(gross - on_hand, 0)
+    gross of a component += net of its parent * line quantity
+    machine seconds = net * prod_secs
+
+The BOM comes from the compressed sparse row arrays of the BOM index (see
+sandbox.bomindex), viewed as NumPy arrays without a copy, and the prod_secs
+from the FlatProducts (see sandbox.flat): no model instances are made. The
+levels are the rounds of a topological pass (Kahn's algorithm), a Product
+being netted in the round after its last parent, so they are the low-level
+codes, computed along the way; a BOM cycle raises BOMCycleError.
+
+The quantities are summed as float64, exact up to 2 ** 53; beyond that
+OverflowError is raised, and likewise for seconds beyond int64.
+
+NumPy is an optional dependency: without it, plan() raises
+ImproperlyConfigured.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+
+from . import bomindex
+from .lowlevel import BOMCycleError, find_cycle
+from .models import Product
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+MAX_EXACT = 2 ** 53
+MAX_SECS = 2 ** 63 - 1
+
+
+class Plan():
+    """Requirements of each Product, as arrays in product_ids order.
+
+    product_ids: Sorted Product pk's. levels: Low-level codes. gross, net:
+    Required quantities before and after netting the quantities on hand.
+    secs: Machine seconds of the net quantities.
+    """
+    def __init__(self, product_ids, levels, gross, net, secs):
+        self.product_ids = product_ids
+        self.levels = levels
+        self.gross = gross
+        self.net = net
+        self.secs = secs
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def rows(self):
+        """Yield (pk, level, gross, net, secs) of the Products with gross demand.
+
+        In low-level code, then pk order.
+        """
+        required = np.flatnonzero(self.gross)
+        required = required[np.lexsort((self.product_ids[required], self.levels[required]))]
+        for index in required:
+            yield (
+                int(self.product_ids[index]), int(self.levels[index]), int(self.gross[index]),
+                int(self.net[index]), int(self.secs[index]))
+
+    def total_secs(self):
+        return int(self.secs.sum())
+
+
+def require_numpy():
+    if np is None:
+        raise ImproperlyConfigured('MRP planning (sandbox.mrp) requires NumPy.')
+
+
+def line_ranges(offsets, rows):
+    """Indexes of the CSR lines of the given rows, concatenated."""
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - counts), counts)
+
+
+def plan_arrays(offsets, components, quantities, prod_secs, gross, on_hand=None):
+    """Net and explode gross demand over a CSR BOM, in low-level code order.
+
+    offsets, components, quantities: The CSR adjacency (see
+    bomindex.BOMIndex), by Product index. prod_secs: Seconds per Product.
+    gross: Gross demand per Product (copied). on_hand: Quantity on hand per
+    Product, default none. Returns (levels, gross, net, secs) arrays.
+    Raises BOMCycleError, with Product indexes, and OverflowError.
+    """
+    require_numpy()
+    offsets = np.asarray(offsets, dtype=np.int64)
+    components = np.asarray(components, dtype=np.int64)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    size = len(offsets) - 1
+    gross = np.array(gross, dtype=np.float64)
+    on_hand = np.zeros(size) if on_hand is None else np.asarray(on_hand, dtype=np.float64)
+    net = np.zeros(size)
+    levels = np.full(size, -1, dtype=np.int64)
+    indegree = np.bincount(components, minlength=size)
+    frontier = np.flatnonzero(indegree == 0)
+    level = 0
+    while len(frontier):
+        levels[frontier] = level
+        net[frontier] = np.maximum(gross[frontier] - on_hand[frontier], 0)
+        lines = line_ranges(offsets, frontier)
+        if len(lines):
+            below = components[lines]
+            parents = np.repeat(frontier, offsets[frontier + 1] - offsets[frontier])
+            gross += np.bincount(
+                below, weights=net[parents] * quantities[lines], minlength=size)
+            indegree -= np.bincount(below, minlength=size)
+            below = np.unique(below)
+            frontier = below[indegree[below] == 0]
+        else:
+            frontier = lines[:0]
+        level += 1
+    if (levels < 0).any():
+        left = np.flatnonzero(levels < 0)
+        parents = np.repeat(np.arange(size), np.diff(offsets))
+        on_cycle = np.isin(parents, left)
+        raise BOMCycleError(find_cycle(
+            set(left.tolist()), zip(parents[on_cycle].tolist(), components[on_cycle].tolist())))
+    if len(gross) and gross.max() >= MAX_EXACT:
+        raise OverflowError('Required quantities exceed the exact float64 range.')
+    prod_secs = np.asarray(prod_secs, dtype=np.int64)
+    if len(net) and (net * prod_secs).max() > MAX_SECS:
+        raise OverflowError('Machine seconds exceed the int64 range.')
+    net = net.astype(np.int64)
+    return levels, gross.astype(np.int64), net, net * prod_secs
+
+
+def plan(demand, on_hand=None, index=None, using=DEFAULT_DB_ALIAS):
+    """Plan the requirements of the gross demand.
+
+    demand: Gross quantity by Product pk. on_hand: Quantity on hand by
+    Product pk, default none. index: BOM index, default the current one
+    (bomindex.get_index()). Returns a Plan; raises BOMCycleError (with
+    Product pk's), KeyError for a pk that is not a Product, and
+    OverflowError.
+    """
+    require_numpy()
+    if index is None:
+        index = bomindex.get_index(using=using)
+    product_ids = np.asarray(index.product_ids, dtype=np.int64)
+    size = len(product_ids)
+    prod_secs = np.zeros(size, dtype=np.int64)
+    rows = Product.objects.db_manager(using).flat().order_by().values_list('pk', 'prod_secs')
+    pks, secs = np.array(list(rows.iterator()), dtype=np.int64).reshape(-1, 2).T
+    found = np.searchsorted(product_ids, pks)
+    known = (found < size) & (product_ids[np.minimum(found, size - 1)] == pks)
+    prod_secs[found[known]] = secs[known]
+
+    def positions(quantities):
+        array = np.zeros(size, dtype=np.int64)
+        for pk, quantity in (quantities or {}).items():
+            position = int(np.searchsorted(product_ids, pk))
+            if position >= size or product_ids[position] != pk:
+                raise KeyError(pk)
+            array[position] += quantity
+        return array
+
+    try:
+        levels, gross, net, secs = plan_arrays(
+            index.offsets, index.components, index.quantities, prod_secs,
+            positions(demand), positions(on_hand))
+    except BOMCycleError as exc:
+        raise BOMCycleError([int(product_ids[position]) for position in exc.products])
+    return Plan(product_ids, levels, gross, net, secs)
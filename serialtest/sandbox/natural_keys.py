@@ -0,0 +1,238 @@
+"""Batched natural key resolution for deserializing Sandbox fixtures.
+
+Django's deserializers resolve each natural key with its own
+get_by_natural_key() query. Here the records are read in batches, the natural
+keys of a batch are resolved with one query per model (using the managers'
+in_bulk_by_natural_key()), and the objects are built from the in-memory map.
+"""
+
+import json
+from collections import OrderedDict, defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers import base
+from django.core.serializers.python import Deserializer as PythonDeserializer
+from django.core.serializers.python import _get_model
+from django.db import DEFAULT_DB_ALIAS, models
+
+DEFAULT_BATCH_SIZE = 500
+
+DEFAULT_MAX_KEYS = 100000
+
+
+def load_records(format, stream_or_string):
+    """Return the records of a 'json' or 'python' serialization."""
+    if format == 'python':
+        return stream_or_string
+    if format == 'json':
+        if not isinstance(stream_or_string, (bytes, str)):
+            stream_or_string = stream_or_string.read()
+        if isinstance(stream_or_string, bytes):
+            stream_or_string = stream_or_string.decode()
+        return json.loads(stream_or_string)
+    raise base.SerializerDoesNotExist(
+        f'Batched deserialization is not supported for {format!r}.')
+
+
+def batched(records, batch_size=DEFAULT_BATCH_SIZE):
+    """Group records into lists of consecutive records of the same model.
+
+    A fixture lists dependencies first, so keeping each batch to one model
+    lets the keys of a batch refer to objects saved by earlier batches.
+    """
+    batch = []
+    for record in records:
+        if batch and (
+                len(batch) >= batch_size or batch[0]['model'] != record['model']):
+            yield batch
+            batch = []
+        batch.append(record)
+    if batch:
+        yield batch
+
+
+class NaturalKeyResolver():
+    """Resolve the natural keys of deserialized records in bulk.
+
+    Resolved pk's are kept in an LRU of max_keys entries (of all the models),
+    so memory does not grow with the stream: the least recently used are
+    dropped before resolving a batch, never the keys of the batch being
+    built. Keys that were not found are looked up again by later batches.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS, ignorenonexistent=False,
+                 max_keys=DEFAULT_MAX_KEYS):
+        self.using = using
+        self.ignorenonexistent = ignorenonexistent
+        self.max_keys = max_keys
+        self.pks = OrderedDict()  # (Model, natural key): pk
+        self.bulk_lookups = 0
+
+    @staticmethod
+    def supports(model):
+        """Whether the model's default manager resolves keys in bulk."""
+        return hasattr(model._meta.default_manager, 'in_bulk_by_natural_key')
+
+    def natural_key_of(self, model, record):
+        """Natural key of a record without a pk, or None if not derivable.
+
+        Each of the manager's natural_key_fields either names a field of the
+        record or follows a foreign key serialized as a one-part natural key.
+        """
+        key = []
+        for lookup in model._meta.default_manager.natural_key_fields:
+            value = record['fields'].get(lookup.split('__')[0])
+            if '__' in lookup:
+                if not isinstance(value, (list, tuple)) or len(value) != 1:
+                    return None
+                value = value[0]
+            if value is None:
+                return None
+            key.append(value)
+        return tuple(key)
+
+    def needs_pk(self, model, record):
+        """Whether the record leaves its pk to be found by natural key."""
+        pk_field = model._meta.pk
+        return (
+            record.get('pk') is None and
+            record['fields'].get(pk_field.name) is None and
+            hasattr(model, 'natural_key') and self.supports(model))
+
+    def resolve(self, batch):
+        """Resolve all the natural keys of a batch of records."""
+        while len(self.pks) > self.max_keys:
+            self.pks.popitem(last=False)
+        wanted = defaultdict(set)
+        for record in batch:
+            try:
+                model = _get_model(record['model'])
+            except base.DeserializationError:
+                continue
+            if self.needs_pk(model, record):
+                key = self.natural_key_of(model, record)
+                if key is not None:
+                    wanted[model].add(key)
+            for name, value in record['fields'].items():
+                field = self._fk_field(model, name)
+                if field and isinstance(value, (list, tuple)) and self._to_pk(field):
+                    wanted[field.remote_field.model].add(tuple(value))
+        for model, keys in wanted.items():
+            for key in list(keys):
+                if (model, key) in self.pks:
+                    self.pks.move_to_end((model, key))
+                    keys.discard(key)
+            if keys:
+                manager = model._meta.default_manager.db_manager(self.using)
+                for key, pk in manager.in_bulk_by_natural_key(keys).items():
+                    self.pks[model, key] = pk
+                self.bulk_lookups += 1
+
+    @staticmethod
+    def _fk_field(model, name):
+        """The model's foreign key named name, or None."""
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.remote_field and isinstance(field.remote_field, models.ManyToOneRel):
+            return field
+        return None
+
+    def _to_pk(self, field):
+        """Whether the foreign key refers to the pk of its related model."""
+        related = field.remote_field.model
+        return field.remote_field.field_name == related._meta.pk.name and self.supports(related)
+
+    def fk_value(self, field, value):
+        """Deserialize a foreign key value, natural keys from the map."""
+        related = field.remote_field.model
+        if isinstance(value, (list, tuple)):
+            key = tuple(value)
+            manager = related._default_manager.db_manager(self.using)
+            if not self._to_pk(field):
+                obj = manager.get_by_natural_key(*key)
+                return getattr(obj, related._meta.get_field(field.remote_field.field_name).attname)
+            pk = self.pks.get((related, key))
+            if pk is None:
+                pk = manager.get_by_natural_key(*key).pk
+                self.pks[related, key] = pk
+            return pk
+        if value is None:
+            return None
+        return related._meta.get_field(field.remote_field.field_name).to_python(value)
+
+    def build(self, record):
+        """Build a DeserializedObject from a resolved record.
+
+        Records with many-to-many values are handed to Django's deserializer.
+        """
+        try:
+            model = _get_model(record['model'])
+        except base.DeserializationError:
+            if self.ignorenonexistent:
+                return None
+            raise
+        field_names = {field.name for field in model._meta.get_fields()}
+        data = {}
+        if 'pk' in record:
+            try:
+                data[model._meta.pk.attname] = model._meta.pk.to_python(record.get('pk'))
+            except Exception as exc:
+                raise base.DeserializationError.WithData(
+                    exc, record['model'], record.get('pk'), None)
+        for name, value in record['fields'].items():
+            if self.ignorenonexistent and name not in field_names:
+                continue
+            field = model._meta.get_field(name)
+            if field.many_to_many:
+                return next(iter(PythonDeserializer(
+                    [record], using=self.using,
+                    ignorenonexistent=self.ignorenonexistent)), None)
+            try:
+                if field.remote_field:
+                    data[field.attname] = self.fk_value(field, value)
+                else:
+                    data[field.name] = field.to_python(value)
+            except Exception as exc:
+                raise base.DeserializationError.WithData(
+                    exc, record['model'], record.get('pk'), value)
+        if self.needs_pk(model, record):
+            key = self.natural_key_of(model, record)
+            if key is not None:
+                # A key missing from the map is a new object.
+                data[model._meta.pk.attname] = self.pks.get((model, key))
+            else:
+                data = self._build_instance_data(model, data)
+        return base.DeserializedObject(model(**data), {})
+
+    def _build_instance_data(self, model, data):
+        """Fall back to Django to look up the pk of the record."""
+        obj = base.build_instance(model, data, self.using)
+        data[model._meta.pk.attname] = obj.pk
+        return data
+
+
+def deserialize(format, stream_or_string, batch_size=DEFAULT_BATCH_SIZE,
+                using=DEFAULT_DB_ALIAS, ignorenonexistent=False, resolver=None):
+    """Deserialize like serializers.deserialize(), resolving natural keys in bulk."""
+    return deserialize_records(
+        load_records(format, stream_or_string), batch_size=batch_size,
+        using=using, ignorenonexistent=ignorenonexistent, resolver=resolver)
+
+
+def deserialize_records(records, batch_size=DEFAULT_BATCH_SIZE,
+                        using=DEFAULT_DB_ALIAS, ignorenonexistent=False, resolver=None):
+    """Deserialize records of the python serialization format.
+
+    Yields DeserializedObject's; objects are built one at a time so that
+    saving each object before the next is taken keeps forward references
+    working as with Django's deserializers.
+    """
+    if resolver is None:
+        resolver = NaturalKeyResolver(using=using, ignorenonexistent=ignorenonexistent)
+    for batch in batched(records, batch_size):
+        resolver.resolve(batch)
+        for record in batch:
+            obj = resolver.build(record)
+            if obj is not None:
+                yield obj
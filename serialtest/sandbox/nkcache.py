@@ -0,0 +1,135 @@
+"""Process-wide LRU cache of natural key lookups.
+
+Used by NaturalKeyManager.get_by_natural_key() and in_bulk_by_natural_key()
+when SANDBOX_NATURAL_KEY_CACHE_SIZE (the number of entries shared by all
+the models) is set; 0, the default, disables it.
+
+An entry holds the row of a model instance, so each lookup gets its own
+instance. Only rows read outside a transaction are cached, as one rolled
+back could leave rows that never existed, or not any more. Entries are invalidated by post_save and post_delete signals (see
+sandbox.signals) through tokens: (root model, pk) of the row itself and of
+each row it refers to, so saving a Thing also drops the cached Products and
+Materiels of that Thing. QuerySet.update() sends no signals: the Sandbox
+bulk updates call invalidate_pks(), others must too, or clear() after.
+"""
+
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+
+
+def root_label(model):
+    """Label of the model at the root of its multi-table inheritance."""
+    parents = model._meta.get_parent_list()
+    return (parents[-1] if parents else model)._meta.label_lower
+
+
+def instance_token(instance):
+    """The token a save or delete of the instance invalidates."""
+    return (root_label(type(instance)), instance.pk)
+
+
+class NaturalKeyCache():
+    """LRU of natural key -> row, with hit and miss counters by model."""
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self.lock = threading.RLock()
+        self.entries = OrderedDict()  # (db, label, key): (tokens, names, values)
+        self.tokens = defaultdict(set)  # token: {entry key}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    @property
+    def max_size(self):
+        if self._max_size is None:
+            return getattr(settings, 'SANDBOX_NATURAL_KEY_CACHE_SIZE', 0)
+        return self._max_size
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, model, using, key):
+        """Return a new instance for the natural key, or None."""
+        entry_key = (using, model._meta.label_lower, tuple(key))
+        with self.lock:
+            entry = self.entries.get(entry_key)
+            if entry is None:
+                self.misses[model._meta.label_lower] += 1
+                return None
+            self.entries.move_to_end(entry_key)
+            self.hits[model._meta.label_lower] += 1
+        _, names, values = entry
+        return model.from_db(using, names, values)
+
+    def get_pk(self, model, using, key):
+        """Return the pk for the natural key, or None."""
+        obj = self.get(model, using, key)
+        return None if obj is None else obj.pk
+
+    def put(self, model, using, key, instance):
+        """Cache the instance's row under its natural key."""
+        fields = model._meta.concrete_fields
+        names = [field.attname for field in fields]
+        values = [getattr(instance, name) for name in names]
+        tokens = {(root_label(model), instance.pk)}
+        for field in fields:
+            value = getattr(instance, field.attname)
+            if field.remote_field and value is not None:
+                tokens.add((root_label(field.remote_field.model), value))
+        entry_key = (using, model._meta.label_lower, tuple(key))
+        with self.lock:
+            self._discard(entry_key)
+            self.entries[entry_key] = (tokens, names, values)
+            for token in tokens:
+                self.tokens[token].add(entry_key)
+            while len(self.entries) > self.max_size:
+                self._discard(next(iter(self.entries)))
+
+    def _discard(self, entry_key):
+        entry = self.entries.pop(entry_key, None)
+        if entry is not None:
+            for token in entry[0]:
+                keys = self.tokens[token]
+                keys.discard(entry_key)
+                if not keys:
+                    del self.tokens[token]
+
+    def invalidate(self, instance):
+        """Drop the entries of the instance and of rows referring to it."""
+        with self.lock:
+            for entry_key in list(self.tokens.get(instance_token(instance), ())):
+                self._discard(entry_key)
+
+    def invalidate_pks(self, model, pks):
+        """Drop the entries of the model's rows with the pk's, as invalidate() does.
+
+        For after a QuerySet.update() of those rows.
+        """
+        if not self.entries:
+            return
+        label = root_label(model)
+        with self.lock:
+            for pk in pks:
+                for entry_key in list(self.tokens.get((label, pk), ())):
+                    self._discard(entry_key)
+
+    def clear(self):
+        """Drop all the entries (the counters are kept)."""
+        with self.lock:
+            self.entries.clear()
+            self.tokens.clear()
+
+    def stats(self):
+        """Return a dict of the size, and hits and misses by model label."""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': dict(self.hits),
+                'misses': dict(self.misses),
+            }
+
+
+natural_key_cache = NaturalKeyCache()
@@ -0,0 +1,232 @@
+"""Pagination for large tables: keyset pages and cheap counts.
+
+KeysetPaginator seeks to a page with a WHERE on the ordering tuple, e.g.
+(kind__rank, rank, id) > (last row of the previous page), instead of an
+OFFSET that reads and skips all the rows before it. An ordering by a
+relation, e.g. 'kind', sorts by the related model's ordering, so it is
+expanded into those fields (kind__rank, kind__id). The key of each page's
+last row is kept as a bookmark, so paging forward from any page served
+costs as much as page one. Pages without a bookmark before them seek to the
+nearest bookmark and OFFSET from there.
+
+Counting is selected by count_mode:
+
+    EXACT: SELECT COUNT(*) each time.
+    CACHED: The exact count, cached for COUNT_TIMEOUT seconds.
+    APPROXIMATE: The table statistics for unfiltered lists (PostgreSQL
+        pg_class.reltuples, SQLite sqlite_stat1 after ANALYZE), otherwise
+        as CACHED.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+EXACT = 'exact'
+CACHED = 'cached'
+APPROXIMATE = 'approximate'
+
+COUNT_TIMEOUT = 60
+MAX_BOOKMARKS = 1000
+
+
+def query_signature(queryset):
+    """A cache key part identifying the queryset's SQL and parameters.
+
+    None for querysets known to match no rows, e.g. none() or pk__in=[],
+    which have no SQL.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    text = f'{queryset.db}:{sql}:{params!r}'
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def approximate_count(queryset):
+    """Return the table's row count statistic, or None if not available.
+
+    Only for unfiltered querysets of a single table.
+    """
+    query = queryset.query
+    if query.where or query.distinct or query.low_mark or query.high_mark is not None:
+        return None
+    table = query.get_meta().db_table
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            return max(counts) if counts else None
+    return None
+
+
+def expand_ordering(name, opts, seen=frozenset()):
+    """Return the field names ordering as the ordering name does, or None.
+
+    A relation sorts by its model's Meta.ordering, as by order_by(), unless
+    named by its attname (e.g. 'kind_id'). None for names that are not
+    paths of single-valued fields.
+    """
+    descending = name.startswith('-')
+    path = name.lstrip('-')
+    field = None
+    for part in path.split('__'):
+        if field is not None:
+            if not field.is_relation:
+                return None
+            opts = field.related_model._meta
+        try:
+            field = opts.pk if part == 'pk' else opts.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if field.many_to_many or field.one_to_many:
+            return None
+    if not field.is_relation or path == field.attname or not field.related_model._meta.ordering:
+        return [name]
+    related = field.related_model._meta
+    if related.label in seen:
+        return None
+    names = []
+    for item in related.ordering:
+        if not isinstance(item, str) or item == '?':
+            return None
+        expanded = expand_ordering(item, related, seen | {related.label})
+        if expanded is None:
+            return None
+        for sub in expanded:
+            prefix = '-' if sub.startswith('-') != descending else ''
+            names.append(f'{prefix}{path}__{sub.lstrip("-")}')
+    return names
+
+
+class KeysetPaginator(Paginator):
+    """Paginator seeking pages by their ordering key.
+
+    Querysets ordered by expressions (rather than field names) are paged
+    with OFFSET, as by Paginator.
+    """
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 count_mode=EXACT):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.count_mode = count_mode
+        self.ordering = self.seek_ordering(object_list)
+        if self.ordering is not None:
+            self.object_list = object_list.order_by(*self.ordering)
+
+    @staticmethod
+    def seek_ordering(object_list):
+        """Return the ordering as field names ending in the pk, or None.
+
+        Relations are expanded into their model's ordering fields.
+        """
+        query = getattr(object_list, 'query', None)
+        if query is None:
+            return None
+        ordering = list(query.order_by)
+        if not ordering and query.default_ordering:
+            ordering = list(query.get_meta().ordering)
+        if not all(isinstance(field, str) and field != '?' for field in ordering):
+            return None
+        expanded = []
+        for field in ordering:
+            if field.lstrip('-') in query.annotations:
+                expanded.append(field)
+                continue
+            names = expand_ordering(field, query.get_meta())
+            if names is None:
+                return None
+            expanded.extend(names)
+        ordering = expanded
+        pk_names = {'pk', query.get_meta().pk.name}
+        if not any(field.lstrip('-') in pk_names for field in ordering):
+            ordering.append('pk')
+        return ordering
+
+    @cached_property
+    def signature(self):
+        return query_signature(self.object_list)
+
+    @cached_property
+    def count(self):
+        """Return the number of objects, as selected by count_mode."""
+        if self.count_mode == EXACT or not hasattr(self.object_list, 'query'):
+            return super().count
+        if self.signature is None:
+            return 0
+        if self.count_mode == APPROXIMATE:
+            count = approximate_count(self.object_list)
+            if count is not None:
+                return count
+        key = f'sandbox:count:{self.signature}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, COUNT_TIMEOUT)
+        return count
+
+    def key_of(self, obj):
+        """The ordering values of an object, None if any are NULL."""
+        key = []
+        for field in self.ordering:
+            value = obj
+            for name in field.lstrip('-').split('__'):
+                value = getattr(value, name)
+            if value is None:
+                return None
+            key.append(value)
+        return tuple(key)
+
+    def seek(self, key):
+        """Q for the rows after key in the ordering."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, key):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _bookmarks_key(self):
+        return f'sandbox:bookmarks:{self.signature}:{self.per_page}'
+
+    def page(self, number):
+        """Return a Page, seeking from the nearest bookmark before it."""
+        if self.ordering is None:
+            return super().page(number)
+        number = self.validate_number(number)
+        if self.signature is None:
+            return self._get_page([], number, self)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        bookmarks = cache.get(self._bookmarks_key(), {})
+        start = max((page for page in bookmarks if page < number), default=0)
+        object_list = self.object_list
+        if start:
+            object_list = object_list.filter(self.seek(bookmarks[start]))
+        offset = bottom - start * self.per_page
+        objects = list(object_list[offset:offset + top - bottom])
+        if objects and number not in bookmarks and len(bookmarks) < MAX_BOOKMARKS:
+            key = self.key_of(objects[-1])
+            if key is not None:
+                bookmarks[number] = key
+                cache.set(self._bookmarks_key(), bookmarks, COUNT_TIMEOUT)
+        return self._get_page(objects, number, self)
@@ -0,0 +1,189 @@
+"""Parallel loading of JSON Lines fixtures in dependency-ordered stages.
+
+The fixture's lines are split into chunks that a process pool parses,
+converting the field values with each field's to_python(). The records are
+then staged by model: a model's stage comes after the stages of the models
+its foreign keys and natural_key.dependencies refer to, so the Sandbox
+stages are Kind, Thing, the Products and Materiel. A single writer (the
+calling process) resolves the natural keys of each batch in bulk and saves
+each stage in one transaction.
+
+All the records are held in memory between parsing and writing.
+"""
+
+import functools
+import multiprocessing
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+
+import django
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers import base
+from django.core.serializers.python import _get_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import natural_keys, streaming
+from .models import Thing
+
+DEFAULT_CHUNK_SIZE = 5000
+
+LoadStats = namedtuple('LoadStats', [
+    'count',       # Objects saved
+    'stages',      # List of the lists of model labels of each stage
+    'parse_secs',  # Wall time reading, parsing and staging the records
+    'write_secs',  # Wall time resolving and saving the records
+])
+
+
+def model_stages(models):
+    """Group models into stages, each after the stages it depends on.
+
+    Returns a list of lists of models, the models in the order given.
+    """
+    depths = {}
+
+    def depth(model, seen=()):
+        if model not in depths:
+            related = {
+                field.remote_field.model for field in model._meta.concrete_fields
+                if field.remote_field}
+            natural_key = getattr(model, 'natural_key', None)
+            related.update(
+                apps.get_model(label)
+                for label in getattr(natural_key, 'dependencies', ()))
+            related.difference_update({model}, seen)
+            depths[model] = 1 + max(
+                (depth(other, seen + (model,)) for other in related), default=-1)
+        return depths[model]
+
+    stages = defaultdict(list)
+    for model in models:
+        stages[depth(model)].append(model)
+    return [stages[level] for level in sorted(stages)]
+
+
+def chunked_lines(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of chunk_size non-blank lines of the stream."""
+    chunk = []
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode()
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def convert_record(record, ignorenonexistent=False):
+    """Convert a record's non-relational field values with to_python().
+
+    Foreign keys are left to the writer, which resolves them.
+    """
+    try:
+        model = _get_model(record['model'])
+    except base.DeserializationError:
+        if ignorenonexistent:
+            return None
+        raise
+    fields = {}
+    for name, value in record['fields'].items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            if ignorenonexistent:
+                continue
+            raise
+        if not field.is_relation:
+            try:
+                value = field.to_python(value)
+            except Exception as exc:
+                raise base.DeserializationError.WithData(
+                    exc, record['model'], record.get('pk'), value)
+        fields[name] = value
+    record['fields'] = fields
+    return record
+
+
+def parse_chunk(lines, ignorenonexistent=False):
+    """Parse and convert a chunk of lines, in a pool process.
+
+    Returns an OrderedDict of the records by model label, in line order.
+    """
+    staged = OrderedDict()
+    for record in streaming.iter_records(lines):
+        record = convert_record(record, ignorenonexistent)
+        if record is not None:
+            staged.setdefault(record['model'].lower(), []).append(record)
+    return staged
+
+
+def setup_worker():
+    """Set up Django in pool processes that were spawned rather than forked."""
+    if not apps.ready:
+        django.setup()
+
+
+def parse(stream, processes=None, chunk_size=DEFAULT_CHUNK_SIZE, ignorenonexistent=False):
+    """Return a dict of the stream's records by model label.
+
+    processes is the number of pool processes, default the number of CPUs;
+    0 parses in this process.
+    """
+    chunks = chunked_lines(stream, chunk_size)
+    task = functools.partial(parse_chunk, ignorenonexistent=ignorenonexistent)
+    if processes == 0:
+        return _merge(map(task, chunks))
+    with multiprocessing.Pool(processes, initializer=setup_worker) as pool:
+        return _merge(pool.imap(task, chunks))
+
+
+def _merge(results):
+    staged = defaultdict(list)
+    for result in results:
+        for label, records in result.items():
+            staged[label].extend(records)
+    return staged
+
+
+def write(staged, batch_size=natural_keys.DEFAULT_BATCH_SIZE, using=DEFAULT_DB_ALIAS,
+          ignorenonexistent=False):
+    """Save staged records stage by stage, each stage in one transaction.
+
+    Returns the number of objects saved and the stages.
+    """
+    models = [_get_model(label) for label in staged]
+    stages = model_stages(models)
+    resolver = natural_keys.NaturalKeyResolver(
+        using=using, ignorenonexistent=ignorenonexistent)
+    count = 0
+    for stage in stages:
+        with transaction.atomic(using=using):
+            for model in stage:
+                records = staged[model._meta.label_lower]
+                for batch in natural_keys.batched(records, batch_size):
+                    resolver.resolve(batch)
+                    for record in batch:
+                        obj = resolver.build(record)
+                        if obj is not None:
+                            obj.save(using=using)
+                            count += 1
+    return count, [[model._meta.label_lower for model in stage] for stage in stages]
+
+
+def load(stream, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+         batch_size=natural_keys.DEFAULT_BATCH_SIZE, using=DEFAULT_DB_ALIAS,
+         ignorenonexistent=False):
+    """Load a JSON Lines fixture, parsing in parallel and writing in stages.
+
+    The Things' kind_rank is synced at the end. Returns LoadStats.
+    """
+    start = time.perf_counter()
+    staged = parse(stream, processes, chunk_size, ignorenonexistent)
+    parsed = time.perf_counter()
+    count, stages = write(staged, batch_size, using, ignorenonexistent)
+    Thing.objects.db_manager(using).sync_kind_ranks()
+    return LoadStats(count, stages, parsed - start, time.perf_counter() - parsed)
@@ -0,0 +1,158 @@
+"""Rolled-up production seconds of the Products, kept in Product.rollup_secs.
+
+The rolled-up seconds of a Product are the production time of one with
+everything in it: its own prod_secs plus, for each of its Materiel lines,
+the quantity times the component's rolled-up seconds. They are computed
+bottom-up in low-level code order, components before their parents.
+
+A Product save (its prod_secs) and a Materiel save or delete (its quantity,
+or the line itself) change the rollups of that Product (or parent) and of
+the Products using it, at any depth: only those are recomputed (see
+sandbox.signals), right away or at the end of a deferred() block. Raw
+saves are left alone: run update_rollups() (the rollupsecs command) after
+loading. bulk_create_products() sets the rollups of the Products it creates,
+and migration 0006 computes them for the existing ones.
+
+Rollups saturate at MAX_SECS, the largest BigIntegerField value.
+"""
+
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+from . import versions
+from .lowlevel import batches, compute_low_level_codes
+from .models import Materiel, Product
+from .nkcache import natural_key_cache
+
+MAX_SECS = 2 ** 63 - 1
+
+
+def compute_rollups(prod_secs, lines, base=None):
+    """Return a dict of rolled-up seconds by Product pk.
+
+    prod_secs: Own seconds by pk of the Products to compute. lines: The
+    (parent, component, quantity) Materiel lines of those Products. base:
+    Rolled-up seconds of the components left out of prod_secs, as saved.
+    Raises BOMCycleError.
+    """
+    levels = compute_low_level_codes(
+        [(parent, component) for parent, component, _ in lines if component in prod_secs],
+        products=prod_secs)
+    components = defaultdict(list)
+    for parent, component, quantity in lines:
+        components[parent].append((component, quantity))
+    base = base or {}
+    rollups = {}
+    for pk in sorted(levels, key=levels.get, reverse=True):
+        rollups[pk] = min(MAX_SECS, prod_secs[pk] + sum(
+            quantity * (rollups[component] if component in rollups else base.get(component, 0))
+            for component, quantity in components[pk]))
+    return rollups
+
+
+def write_rollups(rollups, current, using=DEFAULT_DB_ALIAS):
+    """Update the Products whose rolled-up seconds changed.
+
+    rollups: New seconds by pk. current: Saved seconds by pk. One UPDATE
+    (of a CASE) per batch of pk's. Returns the number of Products updated.
+    """
+    changed = sorted(pk for pk, secs in rollups.items() if current.get(pk) != secs)
+    # Three parameters a Product: its pk in the WHEN and the IN, and its seconds.
+    batch_size = (connections[using].features.max_query_params or 999) // 3
+    count = 0
+    with transaction.atomic(using=using):
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            count += Product.objects.using(using).filter(pk__in=batch).update(
+                rollup_secs=models.Case(
+                    *[models.When(pk=pk, then=models.Value(rollups[pk])) for pk in batch],
+                    output_field=models.BigIntegerField()))
+            natural_key_cache.invalidate_pks(Product, batch)
+        if count:
+            versions.bump_model_version(Product, using=using)
+    return count
+
+
+def update_rollups(using=DEFAULT_DB_ALIAS):
+    """Compute and save the rolled-up seconds of every Product.
+
+    Returns the number of Products updated.
+    """
+    prod_secs = {}
+    current = {}
+    for pk, secs, rollup_secs in Product.objects.using(using).order_by().values_list(
+            'pk', 'prod_secs', 'rollup_secs').iterator():
+        prod_secs[pk] = secs
+        current[pk] = rollup_secs
+    lines = Materiel.objects.using(using).order_by().values_list(
+        'parent_id', 'component_id', 'quantity')
+    return write_rollups(compute_rollups(prod_secs, list(lines)), current, using=using)
+
+
+def recompute_above(pks, using=DEFAULT_DB_ALIAS):
+    """Recompute the rolled-up seconds of the given Products and all above them.
+
+    For after the given Products' prod_secs or Materiel lines changed: only
+    they and their ancestors, following 'usedin', can change. The other
+    components keep their rollups as saved. Returns the number of Products
+    updated.
+    """
+    pks = {pk for pk in pks if pk is not None}
+    if not pks:
+        return 0
+    with transaction.atomic(using=using):
+        nodes = pks | Materiel.objects.db_manager(using).ancestors(pks)
+        lines = []
+        for batch in batches(nodes, using):
+            lines.extend(Materiel.objects.using(using).filter(
+                parent_id__in=batch).order_by().values_list(
+                    'parent_id', 'component_id', 'quantity'))
+        outside = {component for _, component, _ in lines if component not in nodes}
+        prod_secs = {}
+        current = {}
+        for batch in batches(nodes | outside, using):
+            for pk, secs, rollup_secs in Product.objects.using(using).filter(
+                    pk__in=batch).order_by().values_list('pk', 'prod_secs', 'rollup_secs'):
+                current[pk] = rollup_secs
+                if pk in nodes:
+                    prod_secs[pk] = secs
+        base = {pk: current[pk] for pk in outside if pk in current}
+        lines = [line for line in lines if line[0] in prod_secs]
+        return write_rollups(compute_rollups(prod_secs, lines, base), current, using=using)
+
+
+_deferred = threading.local()
+
+
+def schedule(pks, using=DEFAULT_DB_ALIAS):
+    """Maintain the rolled-up seconds above the given Products.
+
+    Right away, or at the end of the enclosing deferred() block.
+    """
+    queue = getattr(_deferred, 'queue', None)
+    if queue is None:
+        recompute_above(pks, using=using)
+    else:
+        queue[using].update(pks)
+
+
+@contextmanager
+def deferred():
+    """Queue the rollup maintenance of Product and Materiel saves and deletes.
+
+    At the end of the block the queued Products are recomputed together,
+    one transaction per database. Nested blocks join the outermost one.
+    """
+    if getattr(_deferred, 'queue', None) is not None:
+        yield
+        return
+    _deferred.queue = queue = defaultdict(set)
+    try:
+        yield
+    finally:
+        _deferred.queue = None
+    for using, pks in queue.items():
+        recompute_above(pks, using=using)
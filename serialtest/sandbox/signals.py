@@ -0,0 +1,161 @@
+"""Signal receivers of the Sandbox models.
+
+Connected by SandboxConfig.ready(). Raw saves (loading fixtures) are left
+alone: recompute after loading instead (e.g. the lowlevelcodes command).
+"""
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import bomindex, delta, flat, lowlevel, rollup, sqlite, streaming, thumbnails, versions
+from .nkcache import natural_key_cache
+from .models import Kind, Materiel, Product, Thing
+
+
+@receiver(pre_save, sender=Materiel, dispatch_uid='sandbox_materiel_saving_bom')
+def materiel_saving_bom(sender, instance, raw, using, **kwargs):
+    """Remember the (parent, component) the saved Materiel is moved from, if any."""
+    instance._saved_bom = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        instance._saved_bom = Materiel.objects.using(using).filter(
+            pk=instance.pk).values_list('parent_id', 'component_id').first()
+
+
+def saved_bom(instance):
+    """The (parent, component) pk's the saved Materiel was moved from, or Nones."""
+    return getattr(instance, '_saved_bom', None) or (None, None)
+
+
+@receiver(post_save, sender=Materiel, dispatch_uid='sandbox_materiel_saved_low_level')
+def materiel_saved_low_level(sender, instance, raw, using, **kwargs):
+    """Maintain the low-level codes below the saved Materiel's parent.
+
+    The parent may have become one (its code is then 0 unless it is used),
+    and a component it was moved from is recomputed too.
+    """
+    if not raw:
+        _, old_component_id = saved_bom(instance)
+        lowlevel.schedule([instance.parent_id, old_component_id], using=using)
+
+
+@receiver(post_delete, sender=Materiel, dispatch_uid='sandbox_materiel_deleted_low_level')
+def materiel_deleted_low_level(sender, instance, using, **kwargs):
+    """Maintain the low-level codes below the deleted Materiel's component."""
+    lowlevel.schedule([instance.component_id], using=using)
+
+
+@receiver(post_save, sender=Materiel, dispatch_uid='sandbox_materiel_saved_rollup')
+def materiel_saved_rollup(sender, instance, raw, using, **kwargs):
+    """Maintain the rolled-up seconds of the Materiel's parent, old and new, and above."""
+    if not raw:
+        old_parent_id, _ = saved_bom(instance)
+        rollup.schedule([instance.parent_id, old_parent_id], using=using)
+
+
+@receiver(post_delete, sender=Materiel, dispatch_uid='sandbox_materiel_deleted_rollup')
+def materiel_deleted_rollup(sender, instance, using, **kwargs):
+    """Maintain the rolled-up seconds of the deleted Materiel's parent and above."""
+    rollup.schedule([instance.parent_id], using=using)
+
+
+@receiver(post_save, sender=Product, dispatch_uid='sandbox_product_saved_rollup')
+def product_saved_rollup(sender, instance, raw, using, **kwargs):
+    """Maintain the rolled-up seconds of the saved Product and above."""
+    if not raw:
+        rollup.schedule([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Materiel, dispatch_uid='sandbox_materiel_saved_bom_version')
+@receiver(post_delete, sender=Materiel, dispatch_uid='sandbox_materiel_deleted_bom_version')
+def materiel_changed_bom_version(sender, instance, using, **kwargs):
+    """Invalidate the BOM index snapshot, including on raw saves."""
+    versions.bump_version(bomindex.VERSION_NAME, using=using)
+
+
+@receiver(pre_save, sender=Thing, dispatch_uid='sandbox_thing_saving_kind_rank')
+def thing_saving_kind_rank(sender, instance, raw, using, **kwargs):
+    """Copy the Kind's rank to a raw saved Thing, as Thing.save() does (not serialized)."""
+    if raw and instance.kind_id is not None:
+        instance.kind_rank = Kind.objects.using(using).filter(
+            pk=instance.kind_id).values_list('rank', flat=True).first() or 0
+
+
+@receiver(post_save, sender=Kind, dispatch_uid='sandbox_kind_saved_kind_rank')
+def kind_saved_kind_rank(sender, instance, using, **kwargs):
+    """Copy the Kind's rank to its Things' kind_rank, including on raw saves."""
+    if Thing.objects.using(using).filter(kind=instance).exclude(
+            kind_rank=instance.rank).update(kind_rank=instance.rank):
+        versions.bump_model_version(Thing, using=using)
+        # The cached Things refer to the Kind.
+        natural_key_cache.invalidate(instance)
+
+
+@receiver(post_save, dispatch_uid='sandbox_saved_flat_product')
+def saved_flat_product(sender, instance, raw, using, **kwargs):
+    """Update the FlatProduct of a saved Thing or Product, including on raw saves."""
+    if issubclass(sender, Thing):
+        flat.track_saved(instance, raw, using=using)
+
+
+@receiver(post_save, sender=Kind, dispatch_uid='sandbox_kind_saved_flat_product')
+def kind_saved_flat_product(sender, instance, using, **kwargs):
+    """Copy the Kind's iden and rank to its FlatProducts, including on raw saves."""
+    flat.update_kind(instance, using=using)
+
+
+@receiver(post_save, dispatch_uid='sandbox_saved_model_version')
+@receiver(post_delete, dispatch_uid='sandbox_deleted_model_version')
+def changed_model_version(sender, instance, using, **kwargs):
+    """Bump the version of a changed catalog model, including on raw saves."""
+    if sender._meta.app_label == 'sandbox' and sender not in streaming.LOCAL_MODELS:
+        versions.bump_model_version(sender, using=using)
+
+
+@receiver(post_save, dispatch_uid='sandbox_saved_natural_key_cache')
+@receiver(post_delete, dispatch_uid='sandbox_deleted_natural_key_cache')
+def changed_natural_key_cache(sender, instance, **kwargs):
+    """Drop the cached natural keys of a changed Sandbox instance."""
+    if sender._meta.app_label == 'sandbox' and natural_key_cache.entries:
+        natural_key_cache.invalidate(instance)
+
+
+@receiver(pre_save, dispatch_uid='sandbox_saving_change_seq')
+def saving_change_seq(sender, instance, raw, using, **kwargs):
+    """Number a tracked save for delta exports, including raw saves."""
+    if delta.is_tracked(sender):
+        delta.track_save(instance, raw, using=using)
+
+
+@receiver(post_save, dispatch_uid='sandbox_saved_change_seq')
+def saved_change_seq(sender, instance, raw, using, **kwargs):
+    """Number a tracked save made outside a transaction."""
+    if delta.is_tracked(sender):
+        delta.track_saved(instance, raw, using=using)
+
+
+@receiver(pre_delete, dispatch_uid='sandbox_deleting_tombstone')
+def deleting_tombstone(sender, instance, using, **kwargs):
+    """Leave a Tombstone of a tracked row's natural key for delta exports."""
+    if delta.is_tracked(sender):
+        delta.bury([sender._meta.label_lower], instance.natural_key(), using=using)
+
+
+@receiver(pre_save, dispatch_uid='sandbox_saving_image_hash')
+def saving_image_hash(sender, instance, raw, **kwargs):
+    """Hash a Thing's changed image."""
+    if not raw and issubclass(sender, Thing):
+        thumbnails.track_saving(instance)
+
+
+@receiver(post_save, dispatch_uid='sandbox_saved_thumbnail')
+def saved_thumbnail(sender, instance, raw, **kwargs):
+    """Generate the thumbnail of a Thing's changed image."""
+    if not raw and issubclass(sender, Thing):
+        thumbnails.track_saved(instance)
+
+
+@receiver(connection_created, dispatch_uid='sandbox_connection_created_sqlite_profile')
+def connection_created_sqlite_profile(sender, connection, **kwargs):
+    """Set the SQLite pragmas of SANDBOX_SQLITE_PROFILE on the new connection."""
+    sqlite.apply_profile(connection)
@@ -0,0 +1,137 @@
+"""SQLite performance profiles, the pragmas set on each new connection.
+
+The SANDBOX_SQLITE_PROFILE setting names one of PROFILES, or is a dict of
+pragmas; apply_profile() sets them when a connection is created (see
+sandbox.signals). None, the default, leaves SQLite's settings: WAL mode is
+kept in the database file, so the 'tuned' profile is opted into. It sets:
+
+    busy_timeout   Writers wait up to 30s for a lock instead of failing
+                   at once with "database is locked".
+    journal_mode   WAL: readers and the writer do not block each other,
+                   and a commit appends to the log instead of rewriting
+                   the database file.
+    synchronous    NORMAL: in WAL mode, fsync at checkpoints rather than
+                   at every commit. A power loss may roll back the last
+                   commits, never corrupt the database.
+    cache_size     64 MiB of page cache per connection.
+    mmap_size      Read up to 256 MiB of the file through a memory map.
+
+bulk_load() relaxes durability further for loading a catalog: see there.
+"""
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.transaction import TransactionManagementError
+
+from .streaming import catalog_models
+
+PROFILES = {
+    # SQLite's own settings, as Django leaves them.
+    'default': {
+        'busy_timeout': 5000,
+        'journal_mode': 'delete',
+        'synchronous': 'full',
+        'cache_size': -2000,
+        'mmap_size': 0,
+    },
+    'tuned': {
+        'busy_timeout': 30000,
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'cache_size': -64 * 1024,
+        'mmap_size': 256 * 2 ** 20,
+    },
+}
+
+BULK_LOAD_PRAGMAS = {
+    'synchronous': 'off',
+    'cache_size': -256 * 1024,
+    'temp_store': 'memory',
+}
+
+
+def profile_pragmas(profile=None):
+    """The pragmas of profile, default is the SANDBOX_SQLITE_PROFILE setting."""
+    if profile is None:
+        profile = getattr(settings, 'SANDBOX_SQLITE_PROFILE', None)
+    if profile is None:
+        return {}
+    if isinstance(profile, str):
+        return PROFILES[profile]
+    return profile
+
+
+def set_pragmas(connection, pragmas):
+    """Set pragmas on a connection, outside any transaction."""
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def get_pragmas(connection, names):
+    """Return a dict of the current values of the named pragmas."""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
+
+
+def apply_profile(connection, profile=None):
+    """Set the pragmas of the profile on a new SQLite connection."""
+    if connection.vendor == 'sqlite':
+        set_pragmas(connection, profile_pragmas(profile))
+
+
+def secondary_indexes(connection, tables):
+    """The (name, sql) of the non-unique indexes Django created on tables.
+
+    Leaves out the unique indexes, which enforce constraints (and serve
+    the natural key lookups of a load), and those SQLite makes itself.
+    """
+    tables = list(tables)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            f"AND tbl_name IN ({', '.join(['%s'] * len(tables))}) ORDER BY name", tables)
+        return [
+            (name, sql) for name, sql in cursor.fetchall()
+            if not sql.upper().startswith('CREATE UNIQUE')]
+
+
+@contextmanager
+def bulk_load(using=DEFAULT_DB_ALIAS, models=None):
+    """Relax durability, and drop secondary indexes, while loading models.
+
+    For loading a catalog (default: the whole one) outside a transaction:
+    synchronous is OFF, so commits do not fsync, and the non-unique
+    indexes of the models' tables are dropped, then rebuilt, in one sort
+    each, and analyzed at the end of the block. A crash of the machine
+    during the block may corrupt the database: load into a copy, or one you
+    can load again. Does nothing on other database backends.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    if connection.in_atomic_block:
+        raise TransactionManagementError('bulk_load() can not be used in a transaction.')
+    tables = {model._meta.db_table for model in models or catalog_models()}
+    saved = get_pragmas(connection, BULK_LOAD_PRAGMAS)
+    indexes = secondary_indexes(connection, sorted(tables))
+    set_pragmas(connection, BULK_LOAD_PRAGMAS)
+    try:
+        with connection.cursor() as cursor:
+            for name, _ in indexes:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+            for table in sorted(tables):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+        set_pragmas(connection, saved)
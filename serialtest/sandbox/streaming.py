@@ -0,0 +1,135 @@
+"""Streaming JSON Lines serialization of the Sandbox catalog.
+
+One record (in the python serialization format) per line, written as each
+object is read and saved in bounded batches as the lines are read, so memory
+use does not grow with the size of the catalog.
+
+Registered as the 'jsonl' serialization format (see SERIALIZATION_MODULES in
+settings), so it also works with dumpdata and loaddata.
+"""
+
+import json
+
+from django.apps import apps
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.serializers.python import Serializer as PythonSerializer
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import natural_keys
+from .models import ChangeSequence, FlatProduct, Thing, Tombstone
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class Serializer(PythonSerializer):
+    """Serialize a QuerySet to JSON Lines, one object at a time."""
+
+    internal_use_only = False
+
+    def start_serialization(self):
+        self._current = None
+        self.count = 0
+        self.json_kwargs = self.options.copy()
+        self.json_kwargs.pop('stream', None)
+        self.json_kwargs.pop('fields', None)
+        self.json_kwargs.pop('indent', None)
+        self.json_kwargs['separators'] = (',', ':')
+        self.json_kwargs.setdefault('cls', DjangoJSONEncoder)
+        self.json_kwargs.setdefault('ensure_ascii', False)
+
+    def end_object(self, obj):
+        json.dump(self.get_dump_object(obj), self.stream, **self.json_kwargs)
+        self.stream.write('\n')
+        self._current = None
+        self.count += 1
+
+    def getvalue(self):
+        # Grandparent behavior: the stream's value, not a list of objects.
+        return super(PythonSerializer, self).getvalue()
+
+
+def iter_records(stream_or_string):
+    """Yield the records of a JSON Lines stream, one line at a time."""
+    if isinstance(stream_or_string, bytes):
+        stream_or_string = stream_or_string.decode()
+    if isinstance(stream_or_string, str):
+        stream_or_string = stream_or_string.splitlines()
+    for line in stream_or_string:
+        if isinstance(line, bytes):
+            line = line.decode()
+        if line.strip():
+            yield json.loads(line)
+
+
+def Deserializer(stream_or_string, **options):
+    """Deserialize a JSON Lines stream, resolving natural keys in bulk."""
+    options.pop('handle_forward_references', None)
+    try:
+        yield from natural_keys.deserialize_records(
+            iter_records(stream_or_string), **options)
+    except (GeneratorExit, serializers.base.DeserializationError):
+        raise
+    except Exception as exc:
+        raise serializers.base.DeserializationError() from exc
+
+
+# Bookkeeping and derived copies of this database, not part of the catalog.
+LOCAL_MODELS = (ChangeSequence, FlatProduct, Tombstone)
+
+
+def catalog_models():
+    """The Sandbox models in dependency order."""
+    app_config = apps.get_app_config('sandbox')
+    return [
+        model for model in serializers.sort_dependencies([(app_config, None)])
+        if model not in LOCAL_MODELS]
+
+
+def streaming_queryset(model, chunk_size=DEFAULT_CHUNK_SIZE, using=DEFAULT_DB_ALIAS, **filters):
+    """Iterate a model (filtered by filters) in pk order, joining the serialized foreign keys.
+
+    The joins keep natural foreign keys from costing a query per row.
+    """
+    related = [
+        field.name for field in model._meta.concrete_fields
+        if field.remote_field and field.serialize]
+    queryset = model._default_manager.using(using).filter(**filters).order_by(model._meta.pk.name)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def dump(stream, models=None, chunk_size=DEFAULT_CHUNK_SIZE, using=DEFAULT_DB_ALIAS,
+         use_natural_foreign_keys=True, use_natural_primary_keys=True):
+    """Write the models (default: the whole catalog) to a JSON Lines stream.
+
+    Returns the number of objects written.
+    """
+    count = 0
+    for model in models or catalog_models():
+        serializer = Serializer()
+        serializer.serialize(
+            streaming_queryset(model, chunk_size, using), stream=stream,
+            use_natural_foreign_keys=use_natural_foreign_keys,
+            use_natural_primary_keys=use_natural_primary_keys)
+        count += serializer.count
+    return count
+
+
+def load(stream, batch_size=natural_keys.DEFAULT_BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """Load a JSON Lines stream, saving each batch in its own transaction.
+
+    The Things' kind_rank is synced at the end. Returns the number of
+    objects saved.
+    """
+    count = 0
+    resolver = natural_keys.NaturalKeyResolver(using=using)
+    for batch in natural_keys.batched(iter_records(stream), batch_size):
+        with transaction.atomic(using=using):
+            resolver.resolve(batch)
+            for record in batch:
+                resolver.build(record).save(using=using)
+        count += len(batch)
+    Thing.objects.db_manager(using).sync_kind_ranks()
+    return count
@@ -0,0 +1,96 @@
+"""Summary querysets and serializer field profiles of Things and Products.
+
+Lists and BOMs need a Thing's iden, name, kind and rank, not its desc or
+image. Thing.objects.summary() (and so Product.objects.summary(), through
+the multi-table join) loads only SUMMARY_FIELDS, plus any fields named:
+
+    for product in Product.objects.summary('prod_secs'):
+        ...
+
+The instances a summary queryset reads are grouped in cohorts of up to
+COHORT_SIZE. The first access of a deferred field of one instance loads the
+deferred fields of every instance of its cohort still alive, with one query
+per batch of pk's, instead of Django's one query per instance.
+
+serialize() serializes a summary queryset with the summary field profile of
+its model (see serializer_fields()).
+"""
+
+import weakref
+
+from django.core import serializers
+from django.db import connections
+from django.db.models.query import ModelIterable
+
+SUMMARY_FIELDS = ('iden', 'name', 'kind', 'rank')
+
+COHORT_SIZE = 2000
+
+
+class SummaryIterable(ModelIterable):
+    """Yield model instances, each knowing its cohort (by weak reference)."""
+    cohort_size = COHORT_SIZE
+
+    def __iter__(self):
+        cohort = []
+        for obj in super().__iter__():
+            if len(cohort) >= self.cohort_size:
+                cohort = []
+            cohort.append(weakref.ref(obj))
+            obj._summary_cohort = cohort
+            yield obj
+
+
+def load_deferred(instance, fields):
+    """Load the deferred fields of the instance's cohort, if it has one.
+
+    fields are the attnames Django is refreshing. Returns whether they were
+    loaded; if not, the caller falls back on refresh_from_db().
+    """
+    cohort = getattr(instance, '_summary_cohort', None)
+    deferred = instance.get_deferred_fields()
+    if cohort is None or not deferred.issuperset(fields):
+        return False
+    attnames = sorted(deferred)
+    # Fields assigned since the read are no longer deferred, and kept.
+    pending = {}
+    for ref in cohort:
+        obj = ref()
+        if obj is not None:
+            still_deferred = obj.get_deferred_fields().intersection(attnames)
+            if still_deferred:
+                pending[obj.pk] = obj, still_deferred
+    pending[instance.pk] = instance, deferred
+    model = type(instance)
+    using = instance._state.db
+    batch_size = (connections[using].features.max_query_params or 999) - 1
+    pks = list(pending)
+    for start in range(0, len(pks), batch_size):
+        rows = model._base_manager.db_manager(using).filter(
+            pk__in=pks[start:start + batch_size]).order_by().values_list('pk', *attnames)
+        for pk, *values in rows:
+            obj, still_deferred = pending[pk]
+            for attname, value in zip(attnames, values):
+                if attname in still_deferred:
+                    setattr(obj, attname, value)
+    return True
+
+
+def serializer_fields(model):
+    """The summary field profile of a Thing model, for a serializer's fields=.
+
+    Django serializes a model's local fields only. Thing's are cut to the
+    SUMMARY_FIELDS; those of its child models (a Product's thing, prod_secs
+    and low_level) are light and all kept.
+    """
+    names = [field.name for field in model._meta.local_fields if field.serialize]
+    if not model._meta.parents:
+        names = [name for name in names if name in SUMMARY_FIELDS]
+    return tuple(names)
+
+
+def serialize(format, queryset, **options):
+    """Serialize the summary of a Thing or Product queryset."""
+    fields = serializer_fields(queryset.model)
+    return serializers.serialize(
+        format, queryset.summary(*fields), fields=fields, **options)
@@ -0,0 +1,31 @@
+"""Sandbox: Test catalog helpers"""
+
+from sandbox.models import Kind, Materiel, Product, Product4, Thing
+
+
+def make_catalog(size=5, product4=False):
+    """Create Kinds, size Things with Products, and a BOM.
+
+    Product 'P-0' is made of each of the other Products, and each Product
+    'P-n' (n > 1) is made of 'P-(n-1)'. Returns the list of Products.
+    """
+    kinds = [
+        Kind.objects.create(iden='F', name='Fruit', desc='You know ... fruit', rank=1),
+        Kind.objects.create(iden='B', name='Baked', desc='Something baked.', rank=2),
+    ]
+    prods = []
+    for index in range(size):
+        thing = Thing.objects.create(
+            iden=f'P-{index}', kind=kinds[index % 2], name=f'Thing {index}',
+            desc=f'Thing number {index}', rank=index)
+        prod = Product(thing=thing, prod_secs=10 * (index + 1))
+        prod.save_base(raw=True)
+        prod.refresh_from_db()
+        prods.append(prod)
+        if product4:
+            Product4.objects.create(thing=thing, prod_secs=10 * (index + 1))
+    for index, prod in enumerate(prods[1:], start=1):
+        Materiel.objects.create(parent=prods[0], component=prod, quantity=index)
+        if index > 1:
+            Materiel.objects.create(parent=prod, component=prods[index - 1], quantity=2)
+    return prods
@@ -0,0 +1,51 @@
+"""Sandbox: Admin changelist unit tests"""
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sandbox import paginator
+from sandbox.models import Kind, Materiel, Product, Thing
+
+from .catalog import make_catalog
+
+
+class ChangelistQueryCountTest(TestCase):
+    """Test the changelists cost the same queries at any row count."""
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:sandbox_{model._meta.model_name}_changelist')
+        cache.clear()  # Cached counts.
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        return len(context.captured_queries)
+
+    def test_fixed_queries(self):
+        """Test each changelist's queries do not grow with its rows."""
+        make_catalog(size=2)
+        few = {model: self.changelist_queries(model)
+               for model in (Kind, Thing, Product, Materiel)}
+        Kind.objects.all().delete()
+        make_catalog(size=40)
+        for model, queries in few.items():
+            with self.subTest(model=model.__name__):
+                self.assertEqual(queries, self.changelist_queries(model))
+
+    def test_keyset_pages(self):
+        """Test the changelist pages through the keyset paginator."""
+        make_catalog(size=130)
+        url = reverse('admin:sandbox_thing_changelist')
+        first = self.client.get(url)
+        second = self.client.get(url, {'p': 1})
+        self.assertIsInstance(
+            first.context['cl'].paginator, paginator.KeysetPaginator)
+        self.assertEqual(100, len(first.context['cl'].result_list))
+        self.assertEqual(
+            list(Thing.objects.all()[100:]), list(second.context['cl'].result_list))
@@ -0,0 +1,121 @@
+"""Sandbox: ASGI application unit tests"""
+
+import asyncio
+import json
+
+from django.test import TransactionTestCase, override_settings
+
+from sandbox import asgi, versions
+from sandbox.models import Thing
+
+from .catalog import make_catalog
+from .test_views import TEST_CACHES
+
+
+class Exchange():
+    """One request to the application, and its response."""
+    def __init__(self, path, query='', method='GET', headers=()):
+        self.scope = {
+            'type': 'http', 'method': method, 'path': path,
+            'query_string': query.encode(), 'headers': list(headers)}
+        self.messages = [{'type': 'http.request', 'body': b''}]
+        self.hangup = asyncio.get_event_loop().create_future()
+        self.status = None
+        self.headers = {}
+        self.body = b''
+
+    async def receive(self):
+        if self.messages:
+            return self.messages.pop(0)
+        await self.hangup
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            self.headers = dict(message['headers'])
+        else:
+            self.body += message['body']
+
+    def run(self):
+        return asyncio.ensure_future(asgi.application(self.scope, self.receive, self.send))
+
+    def json(self):
+        return json.loads(self.body.decode())
+
+
+@override_settings(CACHES=TEST_CACHES, SANDBOX_VERSION_CACHE='sandbox')
+class ASGITest(TransactionTestCase):
+    """Test the async lookups and the change long polls."""
+    def setUp(self):
+        versions.version_cache().clear()
+        make_catalog(size=3)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        task = asgi.broker.task
+        asgi.broker.stop()
+        if task is not None:
+            self.loop.run_until_complete(asyncio.wait([task]))
+        asgi.broker.__init__()
+        self.loop.close()
+
+    def run_until(self, future, timeout=5):
+        return self.loop.run_until_complete(asyncio.wait_for(future, timeout))
+
+    def request(self, *args, **kwargs):
+        exchange = Exchange(*args, **kwargs)
+        self.run_until(exchange.run())
+        return exchange
+
+    def test_lookups(self):
+        exchange = self.request('/api/products/P-1/')
+        self.assertEqual(200, exchange.status)
+        self.assertEqual('Thing 1', exchange.json()['name'])
+        self.assertEqual(20, exchange.json()['prod_secs'])
+        self.assertEqual('F', self.request('/api/things/P-2/').json()['kind'])
+        self.assertEqual(404, self.request('/api/things/X/').status)
+        self.assertEqual(404, self.request('/api/kinds/').status)
+        self.assertEqual(405, self.request('/api/things/P-1/', method='POST').status)
+
+    def test_not_modified(self):
+        etag = self.request('/api/things/P-1/').headers[b'etag']
+        self.assertEqual(
+            304, self.request('/api/things/P-1/', headers=[(b'if-none-match', etag)]).status)
+        thing = Thing.objects.get(iden='P-1')
+        thing.name = 'Renamed'
+        thing.save()
+        exchange = self.request('/api/things/P-1/', headers=[(b'if-none-match', etag)])
+        self.assertEqual(200, exchange.status)
+        self.assertEqual('Renamed', exchange.json()['name'])
+
+    def test_changes(self):
+        """Test waiting long polls are answered after a save."""
+        data = self.request('/api/changes/').json()
+        self.assertEqual(set(asgi.WATCHED), set(data['versions']))
+        polls = [Exchange('/api/changes/', f'token={data["token"]}') for _ in range(3)]
+        tasks = [poll.run() for poll in polls]
+        self.run_until(asyncio.sleep(0.05))
+        self.assertEqual(3, asgi.broker.waiting)
+        Thing.objects.filter(iden='P-1').get().save()
+        self.run_until(asyncio.wait(tasks))
+        self.assertEqual([200] * 3, [poll.status for poll in polls])
+        self.assertNotEqual(data['token'], polls[0].json()['token'])
+        self.assertEqual(0, asgi.broker.waiting)
+
+    def test_timeout(self):
+        token = self.request('/api/changes/').json()['token']
+        self.assertEqual(204, self.request('/api/changes/', f'token={token}&timeout=0.05').status)
+        self.assertEqual(200, self.request('/api/changes/', 'token=stale&timeout=5').status)
+        self.assertEqual(400, self.request('/api/changes/', 'timeout=x').status)
+
+    def test_disconnect(self):
+        token = self.request('/api/changes/').json()['token']
+        poll = Exchange('/api/changes/', f'token={token}')
+        task = poll.run()
+        self.run_until(asyncio.sleep(0.05))
+        poll.hangup.set_result(None)
+        self.run_until(task)
+        self.assertIsNone(poll.status)
+        self.assertEqual(0, asgi.broker.waiting)
@@ -0,0 +1,42 @@
+"""Sandbox: Serialization benchmark command unit tests"""
+
+import io
+import json
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from sandbox.models import Thing
+
+
+class BenchSerializationTest(TestCase):
+    """Test the benchserialization command's JSON report."""
+    def test_report(self):
+        stdout = io.StringIO()
+        call_command(
+            'benchserialization', sizes=[3], formats=['json', 'python'],
+            keys=['pk', 'natural'], memory=False, stdout=stdout, stderr=io.StringIO())
+        report = json.loads(stdout.getvalue())
+        self.assertEqual('sqlite', report['database'])
+        runs = report['runs']
+        self.assertEqual(5 * 2 * 2, len(runs))
+        run = next(
+            run for run in runs
+            if (run['model'], run['format'], run['keys']) == ('Product', 'json', 'pk'))
+        self.assertEqual(3, run['objects'])
+        self.assertEqual(1, run['serialize']['queries'])
+        self.assertIn('objects_per_sec', run['deserialize'])
+        self.assertNotIn('peak_bytes', run['serialize'])
+        # Product5 can not be deserialized by natural primary key.
+        self.assertTrue(all(
+            'error' in run for run in runs
+            if (run['model'], run['keys']) == ('Product5', 'natural')))
+        self.assertEqual(0, Thing.objects.count())
+
+    def test_peak_memory(self):
+        stdout = io.StringIO()
+        call_command(
+            'benchserialization', sizes=[2], formats=['json'], keys=['pk'],
+            models=['Product4'], stdout=stdout, stderr=io.StringIO())
+        run, = json.loads(stdout.getvalue())['runs']
+        self.assertGreater(run['serialize']['peak_bytes'], 0)
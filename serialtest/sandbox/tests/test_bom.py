@@ -0,0 +1,60 @@
+"""Sandbox: BOM explosion and implosion unit tests"""
+
+from django.test import TestCase
+
+from sandbox import bom
+
+from .catalog import make_catalog
+
+
+class BOMTest(TestCase):
+    """Test the indented bill of materials of the test catalog.
+
+    P-0 is made of P-1 (1), P-2 (2) and P-3 (3), P-2 of P-1 (2) and P-3 of
+    P-2 (2). Production seconds are 10, 20, 30 and 40.
+    """
+    def setUp(self):
+        self.prods = make_catalog(size=4)
+
+    def test_explode(self):
+        """Test levels, extended quantities and cumulative seconds."""
+        with self.assertNumQueries(2):
+            lines = bom.explode(self.prods[0], quantity=1)
+        self.assertEqual([
+            (0, 'P-0', 1, 1, 710),
+            (1, 'P-2', 2, 2, 140),
+            (2, 'P-1', 2, 4, 80),
+            (1, 'P-1', 1, 1, 20),
+            (1, 'P-3', 3, 3, 540),
+            (2, 'P-2', 2, 6, 420),
+            (3, 'P-1', 2, 12, 240),
+        ], [(line.level, line.iden, line.quantity, line.extended_quantity,
+             line.cumulative_secs) for line in lines])
+        self.assertEqual(self.prods[2].pk, lines[2].above_id)
+
+    def test_explode_quantity(self):
+        """Test the quantity exploded multiplies the extended values."""
+        lines = bom.explode(self.prods[3].pk, quantity=5)
+        self.assertEqual(
+            [(0, 5, 900), (1, 10, 700), (2, 20, 400)],
+            [(line.level, line.extended_quantity, line.cumulative_secs) for line in lines])
+
+    def test_implode(self):
+        """Test the where-used list follows 'usedin' to the top."""
+        with self.assertNumQueries(2):
+            lines = bom.implode(self.prods[1])
+        self.assertEqual([
+            (0, 'P-1', 1, 1),
+            (1, 'P-0', 1, 1),
+            (1, 'P-2', 2, 2),
+            (2, 'P-0', 2, 4),
+            (2, 'P-3', 2, 4),
+            (3, 'P-0', 3, 12),
+        ], [(line.level, line.iden, line.quantity, line.extended_quantity)
+            for line in lines])
+
+    def test_leaf(self):
+        """Test a Product without components explodes to itself."""
+        lines = bom.explode(self.prods[1])
+        self.assertEqual([(0, 'P-1', 20)], [
+            (line.level, line.iden, line.cumulative_secs) for line in lines])
@@ -0,0 +1,110 @@
+"""Sandbox: BOM index unit tests"""
+
+import os
+import tempfile
+import time
+
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from sandbox import bomindex, versions
+from sandbox.models import Materiel
+
+from .catalog import make_catalog
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sandbox': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+class BOMIndexTest(TestCase):
+    """Test building, writing and mapping the index."""
+    def setUp(self):
+        self.prods = make_catalog(size=4)
+        self.pks = [prod.pk for prod in self.prods]
+
+    def check(self, index):
+        self.assertEqual(4, len(index))
+        self.assertEqual(5, len(index.components))
+        self.assertEqual(
+            [(self.pks[1], 1), (self.pks[2], 2), (self.pks[3], 3)],
+            index.components_of(self.pks[0]))
+        self.assertEqual([(self.pks[1], 2)], index.components_of(self.pks[2]))
+        self.assertEqual([], index.components_of(self.pks[1]))
+        self.assertEqual([], index.components_of(0))
+        self.assertEqual({self.pks[1], self.pks[2]}, index.descendants(self.pks[3]))
+
+    def test_build(self):
+        """Test the index is built in two queries."""
+        with self.assertNumQueries(2):
+            index = bomindex.BOMIndex.build(version=7)
+        self.assertEqual(7, index.version)
+        self.check(index)
+
+    def test_snapshot(self):
+        """Test a written snapshot maps back to the same index."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bomindex.bin')
+            bomindex.BOMIndex.build(version=7).write(path)
+            index = bomindex.BOMIndex.load(path)
+            self.assertIsInstance(index.offsets, memoryview)
+            self.assertEqual(7, index.version)
+            self.check(index)
+            del index
+
+    def test_not_snapshot(self):
+        """Test other files are refused."""
+        with tempfile.NamedTemporaryFile() as stream:
+            stream.write(b'x' * 64)
+            stream.flush()
+            with self.assertRaises(ValueError):
+                bomindex.BOMIndex.load(stream.name)
+
+
+class GetIndexTest(TransactionTestCase):
+    """Test Materiel changes invalidate the published snapshot."""
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            CACHES=TEST_CACHES, SANDBOX_VERSION_CACHE='sandbox',
+            SANDBOX_BOM_INDEX_PATH=os.path.join(self.directory.name, 'bomindex.bin'))
+        self.settings.enable()
+        bomindex._current = None
+        self.prods = make_catalog(size=3)
+
+    def tearDown(self):
+        bomindex._current = None
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def test_rebuild_on_change(self):
+        """Test the index is reused until a Materiel is saved or deleted."""
+        index = bomindex.get_index()
+        self.assertTrue(os.path.exists(bomindex.snapshot_path()))
+        with self.assertNumQueries(0):
+            self.assertIs(index, bomindex.get_index())
+
+        Materiel.objects.get(parent=self.prods[0], component=self.prods[1]).delete()
+        changed = bomindex.get_index()
+        self.assertGreater(changed.version, index.version)
+        self.assertEqual([(self.prods[2].pk, 2)], changed.components_of(self.prods[0].pk))
+
+        # Another process maps the published snapshot without building it.
+        bomindex._current = None
+        with self.assertNumQueries(0):
+            self.assertEqual(changed.version, bomindex.get_index().version)
+
+
+class VersionTest(TestCase):
+    """Test the version counters."""
+    def test_persists(self):
+        """Test a bumped counter outlives the cache's default timeout."""
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'sandbox': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': directory, 'TIMEOUT': 0.2}}, SANDBOX_VERSION_CACHE='sandbox'):
+            version = versions.get_version('test')
+            versions._increment('test')
+            time.sleep(0.3)
+            self.assertEqual(version + 1, versions.get_version('test'))
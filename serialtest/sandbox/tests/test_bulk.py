@@ -0,0 +1,67 @@
+"""Sandbox: Bulk Product loading unit tests"""
+
+from django.test import TestCase
+
+from sandbox.bulk import bulk_create_products
+from sandbox.models import Kind, Materiel, Product, Product2, Product3, Product4, Thing
+
+
+class BulkCreateProductsTest(TestCase):
+    """Test bulk_create_products() for each multi-table inherited model."""
+    def setUp(self):
+        self.kind = Kind.objects.create(
+            iden='F', name='Fruit', desc='You know ... fruit', rank=1)
+
+    def make(self, model, count, prefix):
+        return [
+            model(iden=f'{prefix}-{index}', kind=self.kind, name=f'Fruit {index}',
+                  desc='Some fruit', rank=index, prod_secs=index)
+            for index in range(count)]
+
+    def test_new_things(self):
+        """Test Thing and child rows are inserted and the pk's set."""
+        for model, prefix in ((Product, 'P'), (Product2, 'P2'), (Product3, 'P3')):
+            with self.subTest(model=model.__name__):
+                objs = bulk_create_products(model, self.make(model, 12, prefix))
+                self.assertEqual(12, model.objects.count())
+                for obj in objs:
+                    self.assertIsNotNone(obj.pk)
+                    self.assertFalse(obj._state.adding)
+                    fetched = model.objects.get(pk=obj.pk)
+                    self.assertEqual((obj.iden, obj.prod_secs), (fetched.iden, fetched.prod_secs))
+                    self.assertEqual(fetched, model.objects.get_by_natural_key(obj.iden))
+
+    def test_batched_queries(self):
+        """Test the queries depend on the batches, not the rows."""
+        objs = self.make(Product, 20, 'P')
+        # Kind ranks, change sequence, Thing inserts, Thing pk lookup,
+        # Product inserts and the FlatProducts' read, delete and insert.
+        with self.assertNumQueries(1 + 2 + 4 + 1 + 4 + 3):
+            bulk_create_products(Product, objs, batch_size=5)
+
+    def test_existing_things(self):
+        """Test Products of existing Things insert only the child rows."""
+        things = [
+            Thing.objects.create(iden=f'T-{index}', kind=self.kind, name='Thing', rank=index)
+            for index in range(3)]
+        # Change sequence, the Things' change_seq update, the Product
+        # inserts and the FlatProducts' read, delete and insert.
+        with self.assertNumQueries(2 + 1 + 1 + 3):
+            bulk_create_products(
+                Product, [Product(thing=thing, prod_secs=42) for thing in things])
+        self.assertEqual(3, Thing.objects.count())
+        self.assertEqual(
+            ['T-0', 'T-1', 'T-2'],
+            list(Product.objects.values_list('iden', flat=True)))
+
+    def test_rollups(self):
+        """Test new Products roll up their own seconds, so their parents add up."""
+        parent, component = bulk_create_products(Product, self.make(Product, 3, 'P')[1:])
+        self.assertEqual(2, Product.objects.get(pk=component.pk).rollup_secs)
+        Materiel.objects.create(parent=parent, component=component, quantity=3)
+        self.assertEqual(1 + 3 * 2, Product.objects.get(pk=parent.pk).rollup_secs)
+
+    def test_not_mti_product(self):
+        """Test models that bulk_create() handles are refused."""
+        with self.assertRaises(ValueError):
+            bulk_create_products(Product4, [])
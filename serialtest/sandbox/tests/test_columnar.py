@@ -0,0 +1,113 @@
+"""Sandbox: Binary columnar serialization unit tests"""
+
+import io
+
+from django.core import serializers
+from django.test import TestCase
+
+from sandbox import columnar, streaming
+from sandbox.models import (
+    Kind, Materiel, Product, Product2, Product3, Product4, Product5, Thing)
+
+from .catalog import make_catalog
+
+NATURAL = dict(use_natural_foreign_keys=True, use_natural_primary_keys=True)
+
+
+def python_dump(**options):
+    """Every catalog model in the python format, ordered by natural key."""
+    return [
+        serializers.serialize('python', model.objects.order_by('pk'), **options)
+        for model in streaming.catalog_models()]
+
+
+class ColumnarTest(TestCase):
+    """Test the columnar format round-trips the catalog."""
+    def setUp(self):
+        prods = make_catalog(size=6, product4=True)
+        for prod in prods[:3]:
+            for model in (Product2, Product3):
+                obj = model(prod_secs=prod.prod_secs, low_level=prod.low_level)
+                setattr(obj, model._meta.pk.attname, prod.pk)
+                obj.save_base(raw=True)
+            Product5.objects.create(thing_id=prod.pk, prod_secs=prod.prod_secs)
+
+    def serialize(self, **options):
+        objs = [obj for model in streaming.catalog_models() for obj in model.objects.order_by('pk')]
+        return serializers.serialize('columnar', objs, **options)
+
+    def test_round_trip_pks(self):
+        """Test loading a dump with pk's over the rows it was dumped from."""
+        expected = python_dump()
+        data = self.serialize()
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(b'SBXC', data[:4])
+        objs = list(serializers.deserialize('columnar', data))
+        self.assertEqual(
+            Thing.objects.count() + Product.objects.count() + Product2.objects.count() +
+            Product3.objects.count() + Product4.objects.count() + Product5.objects.count() +
+            Kind.objects.count() + Materiel.objects.count(), len(objs))
+        Kind.objects.all().delete()
+        for obj in objs:
+            obj.save()
+        self.assertEqual(expected, python_dump())
+
+    def test_round_trip_natural_keys(self):
+        """Test loading a natural key dump into an empty database."""
+        expected = python_dump(**NATURAL)
+        data = self.serialize(**NATURAL)
+        Kind.objects.all().delete()
+        self.assertEqual(0, Thing.objects.count())
+        for obj in serializers.deserialize('columnar', data):
+            obj.save()
+        self.assertEqual(3, Product5.objects.count())
+        self.assertEqual(expected, python_dump(**NATURAL))
+
+    def test_natural_keys_stored_once(self):
+        """Test each string appears once, however many rows refer to it."""
+        data = self.serialize(**NATURAL)
+        self.assertEqual(1, data.count(b'Fruit'))
+        self.assertEqual(1, data.count(b'["P-1"]'))
+
+    def test_serialize_queries(self):
+        """Test natural keys cost a query per column, not per row."""
+        objs = list(Materiel.objects.all())
+        with self.assertNumQueries(3):
+            serializers.serialize('columnar', objs, **NATURAL)
+
+    def test_deserialize_queries(self):
+        """Test natural keys are resolved in bulk."""
+        data = serializers.serialize('columnar', Materiel.objects.all(), **NATURAL)
+        with self.assertNumQueries(2):
+            objs = list(serializers.deserialize('columnar', data))
+        self.assertEqual(
+            sorted(Materiel.objects.values_list('pk', 'parent', 'component', 'quantity')),
+            sorted((obj.object.pk, obj.object.parent_id, obj.object.component_id,
+                    obj.object.quantity) for obj in objs))
+
+    def test_text_stream_refused(self):
+        with self.assertRaises(serializers.base.SerializationError):
+            serializers.serialize('columnar', Kind.objects.all(), stream=io.StringIO())
+
+    def test_bad_stream(self):
+        data = self.serialize()
+        for bad in (b'JSON' + data[4:], data[:len(data) // 2]):
+            with self.subTest(bad=bad[:4]), self.assertRaises(
+                    serializers.base.DeserializationError):
+                list(serializers.deserialize('columnar', bad))
+
+    def test_truncated(self):
+        """Test a stream cut anywhere raises DeserializationError."""
+        data = serializers.serialize('columnar', Kind.objects.all())
+        for size in range(len(data)):
+            with self.subTest(size=size), self.assertRaises(
+                    serializers.base.DeserializationError):
+                list(serializers.deserialize('columnar', data[:size]))
+
+    def test_binary_stream(self):
+        stream = io.BytesIO()
+        columnar.Serializer().serialize(Kind.objects.all(), stream=stream)
+        stream.seek(0)
+        self.assertEqual(
+            list(Kind.objects.all()),
+            [obj.object for obj in serializers.deserialize('columnar', stream)])
@@ -0,0 +1,197 @@
+"""Sandbox: Delta export and import unit tests"""
+
+import io
+import json
+
+from django.core import serializers
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from sandbox import delta, lowlevel, rollup, streaming
+from sandbox.bulk import bulk_create_products
+from sandbox.models import Kind, Materiel, Product, Thing, Tombstone
+
+from .catalog import make_catalog
+
+
+def catalog_dump():
+    """The catalog with natural keys, ordered by natural key."""
+    return [
+        serializers.serialize(
+            'python', model.objects.order_by(*model._default_manager.natural_key_fields),
+            use_natural_foreign_keys=True, use_natural_primary_keys=True)
+        for model in delta.tracked_models()]
+
+
+class ChangeTrackingTest(TestCase):
+    """Test saves are numbered and deletes leave Tombstones."""
+    def setUp(self):
+        self.prods = make_catalog(size=4)
+
+    def test_saves_numbered(self):
+        start = delta.current_change_seq()
+        kind = Kind.objects.get(iden='F')
+        kind.save()
+        self.assertEqual(start + 1, kind.change_seq)
+        prod = Product.objects.get(iden='P-1')
+        prod.prod_secs = 99
+        prod.save()
+        self.assertEqual(start + 2, Thing.objects.get(iden='P-1').change_seq)
+        self.assertEqual(start + 2, delta.current_change_seq())
+
+    def exported(self, since):
+        stream = io.StringIO()
+        delta.export(stream, since=since)
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_raw_save_numbers_thing(self):
+        """Test a raw saved Product of an existing Thing numbers the Thing row."""
+        thing = Thing.objects.create(iden='N-1', kind=self.prods[0].kind, name='New')
+        since = delta.current_change_seq()
+        Product(thing=thing, prod_secs=5).save_base(raw=True)
+        self.assertEqual(
+            {'sandbox.thing', 'sandbox.product'},
+            {record['model'] for record in self.exported(since)})
+
+    def test_bulk_numbers_existing_things(self):
+        """Test bulk created Products of existing Things number the Thing rows."""
+        things = [
+            Thing.objects.create(iden=f'N-{index}', kind=self.prods[0].kind, name='New')
+            for index in range(2)]
+        since = delta.current_change_seq()
+        bulk_create_products(Product, [Product(thing=thing, prod_secs=5) for thing in things])
+        records = self.exported(since)
+        self.assertEqual(
+            ['sandbox.product', 'sandbox.product', 'sandbox.thing', 'sandbox.thing'],
+            sorted(record['model'] for record in records))
+        self.assertEqual(
+            [['N-0'], ['N-1']],
+            sorted(record['fields']['thing'] for record in records
+                   if record['model'] == 'sandbox.product'))
+
+    def test_delete_tombstone(self):
+        Materiel.objects.get(parent=self.prods[0], component=self.prods[1]).delete()
+        tombstone = Tombstone.objects.get()
+        self.assertEqual('sandbox.materiel', tombstone.label)
+        self.assertEqual(['P-0', 'P-1'], json.loads(tombstone.natural_key))
+        Materiel.objects.create(parent=self.prods[0], component=self.prods[1], quantity=1)
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_rename_tombstone(self):
+        """Test changing a natural key leaves a Tombstone of the old one."""
+        prod = Product.objects.get(iden='P-3')
+        prod.iden = 'P-X'
+        prod.save()
+        self.assertEqual(
+            [('sandbox.product', '["P-3"]'), ('sandbox.thing', '["P-3"]')],
+            sorted(Tombstone.objects.values_list('label', 'natural_key')))
+
+    def test_delete_cascade(self):
+        Thing.objects.get(iden='P-3').delete()
+        self.assertEqual(
+            ['sandbox.materiel', 'sandbox.product', 'sandbox.thing'],
+            sorted(set(Tombstone.objects.values_list('label', flat=True))))
+
+
+class DeltaExportTest(TestCase):
+    """Test exporting changes and applying them to an older copy."""
+    def setUp(self):
+        self.prods = make_catalog(size=5)
+        lowlevel.update_low_level_codes()
+        self.watermark = delta.current_change_seq()
+
+    def change(self):
+        thing = Thing.objects.get(iden='P-1')
+        thing.name = 'Renamed'
+        thing.save()
+        Materiel.objects.get(parent=self.prods[0], component=self.prods[2]).delete()
+        Materiel.objects.create(parent=self.prods[4], component=self.prods[1], quantity=7)
+        prod = Product.objects.get(iden='P-4')
+        prod.iden = 'P-9'
+        prod.save()
+
+    def test_export_changes_only(self):
+        self.change()
+        stream = io.StringIO()
+        count, watermark = delta.export(stream, since=self.watermark)
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(records), count)
+        self.assertEqual(delta.current_change_seq(), watermark)
+        models = [record['model'] for record in records]
+        self.assertNotIn('sandbox.kind', models)
+        self.assertEqual(
+            {'P-1', 'P-9'},
+            {record['fields']['iden'] for record in records if record['model'] == 'sandbox.thing'})
+        self.assertIn({
+            'model': 'sandbox.materiel',
+            'fields': {'parent': ['P-9'], 'component': ['P-1'], 'quantity': 7},
+        }, records)
+        tombstones = [
+            record['fields'] for record in records if record['model'] == 'sandbox.tombstone']
+        self.assertIn(['P-0', 'P-2'], [fields['natural_key'] for fields in tombstones])
+        self.assertEqual(models.index('sandbox.tombstone'), len(models) - len(tombstones))
+        # The lines of the renamed Product are exported with its new key.
+        self.assertIn({
+            'model': 'sandbox.materiel',
+            'fields': {'parent': ['P-0'], 'component': ['P-9'], 'quantity': 4},
+        }, records)
+
+        stream = io.StringIO()
+        self.assertEqual((0, watermark), delta.export(stream, since=watermark))
+
+    def test_apply_idempotent(self):
+        """Test applying a delta, twice, to the catalog before the changes."""
+        with transaction.atomic():
+            self.change()
+            expected = catalog_dump()
+            rollup.update_rollups()
+            rollups = dict(Product.objects.values_list('iden', 'rollup_secs'))
+            stream = io.StringIO()
+            delta.export(stream, since=self.watermark)
+            transaction.set_rollback(True)
+        self.assertTrue(Thing.objects.filter(iden='P-4').exists())
+        data = stream.getvalue()
+        saved, deleted = delta.apply(io.StringIO(data))
+        self.assertGreater(saved, 0)
+        # The Materiel and the renamed Product, with its Thing and lines.
+        self.assertEqual(2, deleted)
+        self.assertEqual(expected, catalog_dump())
+        self.assertEqual(rollups, dict(Product.objects.values_list('iden', 'rollup_secs')))
+        self.assertEqual((saved, 0), delta.apply(io.StringIO(data)))
+        self.assertEqual(expected, catalog_dump())
+
+    def test_catalog_excludes_bookkeeping(self):
+        self.assertNotIn(Tombstone, streaming.catalog_models())
+
+
+class NumberingTransactionTest(TransactionTestCase):
+    """Test the numbers are taken in the transactions of the rows."""
+    def test_autocommit(self):
+        kind = Kind.objects.create(iden='F', name='Fruit')
+        self.assertEqual(1, kind.change_seq)
+        with transaction.atomic():
+            kind.save()
+        self.assertEqual(2, Kind.objects.get(iden='F').change_seq)
+
+    def test_deserialized(self):
+        """Test deserialized objects saved in autocommit are numbered."""
+        make_catalog(size=3)
+        data = serializers.serialize(
+            'json', [obj for model in delta.tracked_models() for obj in model.objects.all()],
+            use_natural_foreign_keys=True, use_natural_primary_keys=True)
+        Materiel.objects.all().delete()
+        Product.objects.all().delete()
+        start = delta.current_change_seq()
+        count = 0
+        for obj in serializers.deserialize('json', data):
+            obj.save()
+            count += 1
+            self.assertEqual(start + count, obj.object.change_seq)
+            self.assertEqual(start + count, type(obj.object).objects.get(
+                pk=obj.object.pk).change_seq)
+        self.assertEqual(start + count, delta.current_change_seq())
+        self.assertEqual(
+            sorted(Product.objects.values_list('change_seq', flat=True)),
+            sorted(Thing.objects.filter(
+                product__isnull=False).values_list('change_seq', flat=True)))
+        self.assertFalse(Tombstone.objects.exists())
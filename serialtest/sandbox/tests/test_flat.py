@@ -0,0 +1,81 @@
+"""Sandbox: Flattened Product read model unit tests"""
+
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from sandbox import bom, flat, lowlevel
+from sandbox.bulk import bulk_create_products
+from sandbox.models import FlatProduct, Kind, Product, Thing
+
+from .catalog import make_catalog
+
+FIELDS = ('iden', 'name', 'kind_iden', 'kind_rank', 'rank', 'prod_secs', 'low_level')
+MTI_FIELDS = ('iden', 'name', 'kind__iden', 'kind__rank', 'rank', 'prod_secs', 'low_level')
+
+
+class FlatProductTest(TestCase):
+    """Test the FlatProducts follow the Things, Products and Kinds."""
+    def setUp(self):
+        self.prods = make_catalog(size=3)
+
+    def assertFlat(self):
+        """Assert the FlatProducts are the Products read through the joins."""
+        self.assertEqual(
+            list(Product.objects.values_list(*MTI_FIELDS)),
+            list(Product.objects.flat().values_list(*FIELDS)))
+
+    def test_raw_saves(self):
+        """Test the catalog's raw Product saves built the rows."""
+        self.assertEqual(3, FlatProduct.objects.count())
+        self.assertFlat()
+
+    def test_saves(self):
+        """Test a save updates its row in one query, the Kind loaded (as by save())."""
+        product = Product.objects.select_related('kind').get(iden='P-1')
+        product.name = 'Renamed'
+        product.prod_secs = 99
+        with self.assertNumQueries(1):
+            flat.track_saved(product, raw=False)
+        thing = Thing.objects.get(iden='P-2')
+        thing.rank = 10
+        thing.save()
+        product.save()
+        self.assertFlat()
+        self.assertEqual('Renamed', Product.objects.flat().get(iden='P-1').name)
+
+    def test_kind(self):
+        kind = Kind.objects.get(iden='F')
+        kind.iden = 'G'
+        kind.rank = 5
+        kind.save()
+        self.assertFlat()
+        self.assertEqual(['P-1', 'P-0', 'P-2'], [row.iden for row in Product.objects.flat()])
+
+    def test_deletes(self):
+        Thing.objects.filter(iden='P-1').delete()
+        Kind.objects.filter(iden='B').delete()
+        self.assertEqual(['P-0', 'P-2'], list(
+            Product.objects.flat().values_list('iden', flat=True)))
+
+    def test_bulk(self):
+        kind = Kind.objects.get(iden='F')
+        bulk_create_products(Product, [
+            Product(iden='N-1', kind=kind, name='New', desc='', rank=9, prod_secs=5)])
+        Product.objects.update(low_level=-1)
+        lowlevel.update_low_level_codes()
+        self.assertFlat()
+
+    def test_bom(self):
+        """Test the BOM explosion reads the details from FlatProduct."""
+        FlatProduct.objects.filter(iden='P-1').update(name='Flat')
+        self.assertIn('Flat', [line.name for line in bom.explode(self.prods[0].pk)])
+
+    def test_rebuild(self):
+        Thing.objects.filter(iden='P-1').update(name='Updated')
+        FlatProduct.objects.filter(iden='P-2').delete()
+        stdout = io.StringIO()
+        call_command('flatproducts', stdout=stdout)
+        self.assertIn('Rebuilt 3 flat product(s)', stdout.getvalue())
+        self.assertFlat()
@@ -0,0 +1,69 @@
+"""Sandbox: Image ingestion unit tests"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from PIL import Image
+
+from sandbox import ingest, thumbnails
+from sandbox.models import Thing
+
+from .test_thumbnails import ThumbnailTestCase, png
+
+
+class IngestTest(ThumbnailTestCase):
+    """Test ingesting a directory of images."""
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for iden in ('A', 'B', 'C', 'D'):
+            self.thing(iden)
+
+    def write(self, filename, data):
+        with open(os.path.join(self.directory, filename), 'wb') as file:
+            file.write(data)
+
+    def test_ingest(self):
+        self.write('A.png', png())
+        self.write('B.png', png())  # The same content as A.
+        self.write('C.gif', png(size=(2000, 500)))
+        self.write('D.png', b'Not an image')
+        self.write('E.png', png())
+        stats = ingest.ingest(self.directory, processes=0, chunk_size=2, max_size=1000)
+        self.assertEqual((5, 3, 0, 2), (stats.files, stats.updated, stats.skipped, stats.stored))
+        self.assertEqual([os.path.join(self.directory, 'E.png')], stats.unmatched)
+        self.assertEqual(['D.png'], [os.path.basename(path) for path, _ in stats.failed])
+
+        things = {thing.iden: thing for thing in Thing.objects.all()}
+        source_hash = hashlib.sha1(png()).hexdigest()
+        self.assertEqual(f'ingested/{source_hash}.png', things['A'].image.name)
+        self.assertEqual(things['A'].image.name, things['B'].image.name)
+        self.assertEqual(source_hash, things['A'].image_hash)
+        with things['C'].image.open('rb') as file:
+            self.assertEqual((1000, 250), Image.open(file).size)
+        self.assertEqual('', things['D'].image.name)
+        self.assertTrue(self.storage.exists(thumbnails.thumbnail_name(things['C'].image_hash)))
+        self.assertGreater(things['A'].change_seq, things['D'].change_seq)
+
+        stats = ingest.ingest(self.directory, processes=0)
+        self.assertEqual((0, 3, 0), (stats.updated, stats.skipped, stats.stored))
+
+    def test_duplicates(self):
+        self.write('A.png', png())
+        self.write('A.jpg', png())
+        stats = ingest.ingest(self.directory, processes=0)
+        self.assertEqual(0, stats.updated)
+        self.assertEqual(1, len(stats.failed))
+
+    def test_command(self):
+        self.write('A.png', png())
+        stdout = io.StringIO()
+        call_command(
+            'ingestimages', self.directory, processes=1, stdout=stdout, stderr=io.StringIO())
+        self.assertIn('1 file(s): 1 updated', stdout.getvalue())
+        self.assertTrue(Thing.objects.get(iden='A').image)
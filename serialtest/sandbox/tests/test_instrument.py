@@ -0,0 +1,84 @@
+"""Sandbox: Serialization instrumentation unit tests"""
+
+import json
+
+from django.core import serializers
+from django.core.serializers import json as json_serializer
+from django.db import models
+from django.test import TestCase
+
+from sandbox import instrument, streaming
+from sandbox.models import Materiel, Thing
+
+from .catalog import make_catalog
+
+
+class ProfilingTest(TestCase):
+    """Test phases are timed and their queries counted."""
+    def setUp(self):
+        make_catalog(size=4)
+
+    def test_serialize_phases(self):
+        with self.assertLogs('sandbox.instrument', 'INFO') as logs:
+            with instrument.profiling('dump') as profile:
+                serializers.serialize('json', Materiel.objects.all(), use_natural_foreign_keys=True)
+        report = profile.report()
+        phase = report['phases']['serialize_object']
+        self.assertEqual(Materiel.objects.count(), phase['calls'])
+        # The natural keys of the parent and component of each Materiel.
+        self.assertEqual(2 * phase['calls'], phase['queries'])
+        self.assertEqual(phase['queries'] + 1, report['queries'])
+        self.assertEqual(report, json.loads(logs.records[0].getMessage()))
+        self.assertEqual('dump', logs.records[0].profile['label'])
+
+    def test_deserialize_phases(self):
+        data = serializers.serialize(
+            'json', Thing.objects.all(), use_natural_foreign_keys=True,
+            use_natural_primary_keys=True)
+        with instrument.profiling(log=False) as profile:
+            for obj in serializers.deserialize('json', data):
+                obj.save()
+        phases = profile.report()['phases']
+        count = Thing.objects.count()
+        # The Thing's own natural key and its Kind's.
+        self.assertEqual(2 * count, phases['get_by_natural_key']['calls'])
+        self.assertEqual(count, phases['save_base']['calls'])
+        self.assertGreaterEqual(phases['save_base']['queries'], count)
+
+    def test_streaming_phases(self):
+        """Test the JSON Lines serializer and bulk lookups are profiled."""
+        data = serializers.serialize('jsonl', Thing.objects.all(), use_natural_foreign_keys=True)
+        with instrument.profiling(log=False) as profile:
+            list(serializers.deserialize('jsonl', data))
+        phases = profile.report()['phases']
+        self.assertEqual(1, phases['in_bulk_by_natural_key']['calls'])
+        self.assertNotIn('serialize_object', phases)
+
+    def test_nested(self):
+        with instrument.profiling(log=False) as outer:
+            with instrument.profiling('inner') as inner:
+                Thing.objects.get_by_natural_key('P-1')
+        self.assertIs(outer, inner)
+        self.assertEqual(1, outer.report()['phases']['get_by_natural_key']['queries'])
+
+    def test_disabled(self):
+        """Test hooks are removed on exit and nothing is recorded when off."""
+        save_base = vars(models.Model)['save_base']
+        end_object = vars(json_serializer.Serializer)['end_object']
+        with instrument.profiling(log=False):
+            self.assertIsNot(save_base, vars(models.Model)['save_base'])
+        self.assertIs(save_base, vars(models.Model)['save_base'])
+        self.assertIs(end_object, vars(json_serializer.Serializer)['end_object'])
+        self.assertIsNone(instrument.active())
+        with instrument.profiling(enabled=False) as profile:
+            Thing.objects.get_by_natural_key('P-1')
+        self.assertIsNone(profile)
+        self.assertIsNone(instrument.active())
+
+    def test_unbalanced_phases(self):
+        """Test a serializer failing between start and end still reports."""
+        with self.assertRaises(ZeroDivisionError):
+            with instrument.profiling(log=False) as profile:
+                streaming.Serializer().start_object(Thing.objects.first())
+                1 / 0
+        self.assertEqual(1, profile.report()['phases']['serialize_object']['calls'])
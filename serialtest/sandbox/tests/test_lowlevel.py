@@ -0,0 +1,132 @@
+"""Sandbox: Low-level code unit tests"""
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from sandbox import lowlevel
+from sandbox.models import Materiel, Product
+
+from .catalog import make_catalog
+
+
+class ComputeLowLevelCodesTest(TestCase):
+    """Test the topological pass on edge lists."""
+    def test_deepest_level(self):
+        """Test a component takes the deepest level it is used at."""
+        edges = [(1, 2), (2, 3), (1, 3), (3, 4), (5, 4)]
+        self.assertEqual(
+            {1: 0, 2: 1, 3: 2, 4: 3, 5: 0, 6: 0},
+            lowlevel.compute_low_level_codes(edges, products=[6]))
+
+    def test_cycle(self):
+        """Test a multi-hop cycle is reported with its Products."""
+        edges = [(1, 2), (2, 3), (3, 4), (4, 2), (4, 5)]
+        with self.assertRaises(lowlevel.BOMCycleError) as context:
+            lowlevel.compute_low_level_codes(edges)
+        cycle = context.exception.products
+        self.assertEqual({2, 3, 4}, set(cycle))
+        self.assertIn(tuple(cycle), {(2, 3, 4), (3, 4, 2), (4, 2, 3)})
+
+
+class UpdateLowLevelCodesTest(TestCase):
+    """Test saving the low-level codes of the catalog."""
+    def setUp(self):
+        self.prods = make_catalog(size=5)
+
+    def levels(self):
+        return dict(Product.objects.values_list('iden', 'low_level'))
+
+    def test_update(self):
+        """Test the codes are saved, and only changed codes are updated."""
+        Product.objects.update(low_level=-1)
+        self.assertEqual(5, lowlevel.update_low_level_codes())
+        # P-0 is made of all, P-n of P-(n-1): P-4 > P-3 > P-2 > P-1.
+        self.assertEqual(
+            {'P-0': 0, 'P-1': 4, 'P-2': 3, 'P-3': 2, 'P-4': 1}, self.levels())
+        self.assertEqual(0, lowlevel.update_low_level_codes())
+
+    def test_command_cycle(self):
+        """Test the command reports a cycle without saving any codes."""
+        Product.objects.update(low_level=-1)
+        # A raw save skips the checks.
+        Materiel(parent=self.prods[1], component=self.prods[4], quantity=1).save_base(raw=True)
+        with self.assertRaisesRegex(CommandError, 'cycle'):
+            call_command('lowlevelcodes')
+        self.assertEqual({-1}, set(self.levels().values()))
+
+
+class IncrementalLowLevelCodesTest(TestCase):
+    """Test Materiel saves and deletes maintain the low-level codes."""
+    def setUp(self):
+        self.prods = make_catalog(size=5)
+
+    def levels(self):
+        return dict(Product.objects.values_list('iden', 'low_level'))
+
+    def test_save_and_delete(self):
+        """Test the codes follow the BOM as lines are added and removed."""
+        self.assertEqual(
+            {'P-0': 0, 'P-1': 4, 'P-2': 3, 'P-3': 2, 'P-4': 1}, self.levels())
+
+        Materiel.objects.get(parent=self.prods[2], component=self.prods[1]).delete()
+        self.assertEqual(
+            {'P-0': 0, 'P-1': 1, 'P-2': 3, 'P-3': 2, 'P-4': 1}, self.levels())
+
+        Materiel.objects.create(parent=self.prods[3], component=self.prods[1], quantity=1)
+        self.assertEqual(
+            {'P-0': 0, 'P-1': 3, 'P-2': 3, 'P-3': 2, 'P-4': 1}, self.levels())
+
+    def test_move(self):
+        """Test moving a line recomputes below its old and new component and parent."""
+        line = Materiel.objects.get(parent=self.prods[3], component=self.prods[2])
+        line.component = self.prods[1]
+        line.save()
+        self.assertEqual(
+            {'P-0': 0, 'P-1': 3, 'P-2': 1, 'P-3': 2, 'P-4': 1}, self.levels())
+        line.parent = self.prods[4]
+        line.save()
+        self.assertEqual(
+            {'P-0': 0, 'P-1': 2, 'P-2': 1, 'P-3': 2, 'P-4': 1}, self.levels())
+
+    def test_deferred(self):
+        """Test queued maintenance runs once at the end of the block."""
+        lowlevel.update_low_level_codes()
+        with CaptureQueriesContext(connection) as context:
+            with lowlevel.deferred():
+                Materiel.objects.filter(component=self.prods[1]).delete()
+                Materiel.objects.filter(component=self.prods[2]).delete()
+        updates = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "sandbox_product" SET "low_level"')]
+        self.assertEqual(1, len(updates))
+        self.assertEqual(
+            {'P-0': 0, 'P-1': 0, 'P-2': 0, 'P-3': 2, 'P-4': 1}, self.levels())
+
+    def test_clean_multi_hop_cycle(self):
+        """Test clean() refuses a line closing a cycle through other lines."""
+        materiel = Materiel(parent=self.prods[1], component=self.prods[4], quantity=1)
+        with self.assertRaisesRegex(ValidationError, 'own parent'):
+            materiel.clean()
+        Materiel(parent=self.prods[4], component=self.prods[1], quantity=1).clean()
+
+    def test_save_cycle(self):
+        """Test saving a line that closes a cycle raises BOMCycleError."""
+        with self.assertRaises(lowlevel.BOMCycleError):
+            with transaction.atomic():
+                Materiel.objects.create(parent=self.prods[1], component=self.prods[4], quantity=1)
+        self.assertFalse(Materiel.objects.filter(parent=self.prods[1]).exists())
+
+    def test_stale_instance(self):
+        """Test saving a Product loaded before its code changed keeps the new code."""
+        product = Product.objects.get(pk=self.prods[1].pk)
+        Materiel.objects.get(parent=self.prods[2], component=self.prods[1]).delete()
+        self.assertEqual(1, self.levels()['P-1'])
+        product.prod_secs = 25
+        product.save()
+        self.assertEqual(1, self.levels()['P-1'])
+        self.assertEqual(1, Product.objects.flat().get(iden='P-1').low_level)
+        self.assertEqual(25, Product.objects.get(iden='P-1').prod_secs)
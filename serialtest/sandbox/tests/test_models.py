@@ -241,3 +241,42 @@ class MaterielModelTest(TestCase, ModelTestCollectionMixins):
         self.obj_pk = self.obj.pk
 
         self.obj_nk = self.prod2.natural_key() + self.prod.natural_key()
+
+
+class ThingKindRankTest(TestCase):
+    """Test the denormalized Thing.kind_rank follows Kind.rank."""
+    def setUp(self):
+        self.kind = Kind(
+            iden='F', name='Fruit', desc='You know ... fruit', rank=1)
+        self.kind.save()
+
+        self.thing = Thing(
+            iden='F-A', kind=self.kind, name='Apple',
+            desc='You know ... apple', rank=1)
+        self.thing.save()
+
+    def test_save(self):
+        """Test saving a Thing copies its Kind's rank."""
+        self.assertEqual(1, Thing.objects.get(pk=self.thing.pk).kind_rank)
+
+    def test_kind_rank_changed(self):
+        """Test saving a Kind updates its Things."""
+        self.kind.rank = 5
+        self.kind.save()
+        self.assertEqual(5, Thing.objects.get(pk=self.thing.pk).kind_rank)
+
+    def test_sync_kind_ranks(self):
+        """Test raw saves are fixed by sync_kind_ranks()."""
+        Thing.objects.filter(pk=self.thing.pk).update(kind_rank=0)
+        self.assertEqual(1, Thing.objects.sync_kind_ranks())
+        self.assertEqual(1, Thing.objects.get(pk=self.thing.pk).kind_rank)
+        self.assertEqual(0, Thing.objects.sync_kind_ranks())
+
+    def test_not_serialized(self):
+        """Test kind_rank is left out of dumps, and set by raw loads."""
+        data = serializers.serialize('json', [self.thing])
+        self.assertNotIn('kind_rank', data)
+        self.thing.delete()
+        for obj in serializers.deserialize('json', data):
+            obj.save()
+        self.assertEqual(1, Thing.objects.get(iden='F-A').kind_rank)
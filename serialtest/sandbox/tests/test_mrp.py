@@ -0,0 +1,89 @@
+"""Sandbox: MRP netting unit tests"""
+
+import io
+import os
+import tempfile
+import unittest
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from sandbox import bomindex, mrp
+from sandbox.lowlevel import BOMCycleError
+from sandbox.management.commands.benchmrp import generate, reference
+from sandbox.models import Materiel
+
+from .catalog import make_catalog
+from .test_views import TEST_CACHES
+
+
+@unittest.skipIf(mrp.np is None, 'NumPy is not installed.')
+class PlanArraysTest(TestCase):
+    """Test the netting of BOMs given as arrays."""
+    def test_generated(self):
+        """Test a generated BOM against the plan in plain Python."""
+        arrays = generate(products=400, lines=3000, levels=5, seed=1)
+        levels, gross, net, secs = mrp.plan_arrays(*arrays)
+        self.assertEqual(reference(*arrays), secs.tolist())
+        self.assertEqual(list(range(5)), sorted(set(levels.tolist())))
+        self.assertEqual(gross.tolist(), net.tolist())
+
+    def test_cycle(self):
+        # 0 -> 1 -> 2 -> 1
+        with self.assertRaises(BOMCycleError) as context:
+            mrp.plan_arrays([0, 1, 2, 3], [1, 2, 1], [1, 1, 1], [1, 1, 1], [1, 0, 0])
+        self.assertEqual({1, 2}, set(context.exception.products))
+
+    def test_overflow(self):
+        with self.assertRaises(OverflowError):
+            mrp.plan_arrays([0, 1, 1], [1], [2 ** 40], [1, 1], [2 ** 20, 0])
+
+
+@unittest.skipIf(mrp.np is None, 'NumPy is not installed.')
+class PlanTest(TestCase):
+    """Test planning the test catalog."""
+    def setUp(self):
+        self.prods = make_catalog(size=5)
+        self.pks = [prod.pk for prod in self.prods]
+        self.index = bomindex.BOMIndex.build()
+
+    def plan(self, demand, on_hand=None):
+        plan = mrp.plan(demand, on_hand, index=self.index)
+        return {pk: (level, gross, net, secs) for pk, level, gross, net, secs in plan.rows()}
+
+    def test_plan(self):
+        """Test the machine seconds of one P-0 are its rolled-up seconds."""
+        plan = mrp.plan({self.pks[0]: 1}, index=self.index)
+        self.assertEqual(2350, plan.total_secs())
+        self.assertEqual(
+            {self.pks[0]: (0, 1, 1, 10), self.pks[4]: (1, 4, 4, 200),
+             self.pks[3]: (2, 11, 11, 440), self.pks[2]: (3, 24, 24, 720),
+             self.pks[1]: (4, 49, 49, 980)},
+            self.plan({self.pks[0]: 1}))
+
+    def test_on_hand(self):
+        rows = self.plan({self.pks[0]: 1, self.pks[2]: 1}, on_hand={self.pks[3]: 5})
+        self.assertEqual((2, 11, 6, 240), rows[self.pks[3]])
+        self.assertEqual((3, 2 + 2 * 6 + 1, 15, 450), rows[self.pks[2]])
+        self.assertEqual((4, 1 + 2 * 15, 31, 620), rows[self.pks[1]])
+
+    def test_not_product(self):
+        with self.assertRaises(KeyError):
+            mrp.plan({-1: 1}, index=self.index)
+
+    def test_cycle(self):
+        Materiel.objects.bulk_create([
+            Materiel(parent=self.prods[1], component=self.prods[4], quantity=1)])
+        with self.assertRaises(BOMCycleError) as context:
+            mrp.plan({self.pks[0]: 1}, index=bomindex.BOMIndex.build())
+        self.assertIn(self.pks[1], context.exception.products)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                CACHES=TEST_CACHES, SANDBOX_VERSION_CACHE='sandbox',
+                SANDBOX_BOM_INDEX_PATH=os.path.join(directory, 'bomindex.bin')):
+            bomindex._current = None
+            stdout = io.StringIO()
+            call_command('mrp', 'P-0=2', '--on-hand', 'P-1=8', stdout=stdout)
+            bomindex._current = None
+        self.assertIn('Planned 5 product(s), 4540 machine seconds', stdout.getvalue())
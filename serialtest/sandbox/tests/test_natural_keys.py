@@ -0,0 +1,84 @@
+"""Sandbox: Batched natural key resolution unit tests"""
+
+from django.core import serializers
+from django.test import TestCase
+
+from sandbox import natural_keys
+from sandbox.models import Kind, Materiel, Product, Thing
+
+
+class NaturalKeyResolverTest(TestCase):
+    """Test deserializing a natural key fixture with bulk resolution."""
+    def setUp(self):
+        self.kind = Kind.objects.create(
+            iden='F', name='Fruit', desc='You know ... fruit', rank=1)
+        self.things = [
+            Thing.objects.create(
+                iden=f'F-{index}', kind=self.kind, name=f'Fruit {index}',
+                desc='Some fruit', rank=index)
+            for index in range(5)]
+        self.prods = []
+        for thing in self.things:
+            prod = Product(thing=thing, prod_secs=42)
+            prod.save_base(raw=True)
+            prod.refresh_from_db()
+            self.prods.append(prod)
+        self.materiels = [
+            Materiel.objects.create(
+                parent=self.prods[0], component=prod, quantity=index + 1)
+            for index, prod in enumerate(self.prods[1:])]
+
+        self.objects = (
+            [self.kind] + self.things + self.prods + self.materiels)
+        self.data = serializers.serialize(
+            'json', self.objects,
+            use_natural_primary_keys=True, use_natural_foreign_keys=True)
+
+    def test_in_bulk_by_natural_key(self):
+        """Test the managers return pk's by natural key, omitting missing keys."""
+        self.assertEqual(
+            {('F-0',): self.things[0].pk, ('F-1',): self.things[1].pk},
+            Thing.objects.in_bulk_by_natural_key([('F-0',), ('F-1',), ('X',)]))
+        self.assertEqual(
+            {('F-0', 'F-1'): self.materiels[0].pk},
+            Materiel.objects.in_bulk_by_natural_key(
+                [('F-0', 'F-1'), ('F-1', 'F-0')]))
+
+    def test_deserialize_existing(self):
+        """Test deserialized objects match, with one lookup per model batch."""
+        resolver = natural_keys.NaturalKeyResolver()
+        # Kind (pk and Thing kind), Thing (pk and Product thing),
+        # Product (Materiel parent/component) and Materiel pk.
+        with self.assertNumQueries(4):
+            desobjs = list(natural_keys.deserialize(
+                'json', self.data, resolver=resolver))
+        self.assertEqual(4, resolver.bulk_lookups)
+        self.assertEqual(self.objects, [desobj.object for desobj in desobjs])
+
+    def test_bounded(self):
+        """Test the resolved keys are bounded, the keys of each batch kept until built."""
+        resolver = natural_keys.NaturalKeyResolver(max_keys=2)
+        desobjs = list(natural_keys.deserialize(
+            'json', self.data, batch_size=2, resolver=resolver))
+        self.assertEqual(self.objects, [desobj.object for desobj in desobjs])
+        # Two Materiels: their pk's, and their parent and components.
+        self.assertLessEqual(len(resolver.pks), 2 + 2 + 3)
+
+    def test_deserialize_matches_django(self):
+        """Test the batched objects have the same field values as Django's."""
+        expected = serializers.deserialize('json', self.data)
+        for desobj, batched in zip(expected, natural_keys.deserialize('json', self.data)):
+            self.assertEqual(
+                serializers.serialize('python', [desobj.object]),
+                serializers.serialize('python', [batched.object]))
+
+    def test_deserialize_new(self):
+        """Test loading the fixture into an empty database."""
+        Kind.objects.all().delete()
+        for desobj in natural_keys.deserialize('json', self.data, batch_size=2):
+            desobj.save()
+        self.assertEqual(5, Product.objects.count())
+        self.assertEqual(
+            [1, 2, 3, 4],
+            list(Materiel.objects.filter(parent__thing__iden='F-0')
+                 .order_by('quantity').values_list('quantity', flat=True)))
@@ -0,0 +1,120 @@
+"""Sandbox: Natural key cache unit tests"""
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from sandbox import lowlevel, rollup
+from sandbox.models import Kind, Materiel, Product, Thing
+from sandbox.nkcache import NaturalKeyCache, natural_key_cache
+
+from .catalog import make_catalog
+
+
+@override_settings(SANDBOX_NATURAL_KEY_CACHE_SIZE=100)
+class NaturalKeyCacheTest(TransactionTestCase):
+    """Test cached get_by_natural_key() lookups and their invalidation.
+
+    Lookups in transactions are not cached, so the tests run in autocommit.
+    """
+    def setUp(self):
+        natural_key_cache.clear()
+        natural_key_cache.hits.clear()
+        natural_key_cache.misses.clear()
+        self.prods = make_catalog(size=3)
+
+    def tearDown(self):
+        natural_key_cache.clear()
+
+    def test_cached_lookups(self):
+        """Test repeated lookups are served from the cache as new instances."""
+        for model, key in ((Kind, ('F',)), (Thing, ('P-1',)), (Product, ('P-1',)),
+                           (Materiel, ('P-0', 'P-1'))):
+            with self.subTest(model=model.__name__):
+                first = model.objects.get_by_natural_key(*key)
+                with self.assertNumQueries(0):
+                    second = model.objects.get_by_natural_key(*key)
+                self.assertEqual(first, second)
+                self.assertIsNot(first, second)
+                self.assertFalse(second._state.adding)
+        stats = natural_key_cache.stats()
+        self.assertEqual(4, stats['size'])
+        self.assertEqual(1, stats['hits']['sandbox.materiel'])
+        self.assertEqual(1, stats['misses']['sandbox.materiel'])
+
+    def test_in_bulk_uses_cache(self):
+        """Test in_bulk_by_natural_key() only queries uncached keys."""
+        thing = Thing.objects.get_by_natural_key('P-1')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                {('P-1',): thing.pk}, Thing.objects.in_bulk_by_natural_key([('P-1',)]))
+
+    def test_invalidate_on_save(self):
+        """Test saving a Thing drops it and the entries referring to it."""
+        Thing.objects.get_by_natural_key('P-1')
+        Product.objects.get_by_natural_key('P-1')
+        Materiel.objects.get_by_natural_key('P-0', 'P-1')
+        Kind.objects.get_by_natural_key('F')
+        thing = Thing.objects.get(iden='P-1')
+        thing.iden = 'P-X'
+        thing.save()
+        self.assertEqual(1, natural_key_cache.stats()['size'])
+        with self.assertRaises(Thing.DoesNotExist):
+            Thing.objects.get_by_natural_key('P-1')
+
+    def test_invalidate_on_kind_save(self):
+        """Test saving a Kind drops its Things (their kind_rank changes)."""
+        Thing.objects.get_by_natural_key('P-0')
+        kind = Kind.objects.get(iden='F')
+        kind.rank = 9
+        kind.save()
+        self.assertEqual(9, Thing.objects.get_by_natural_key('P-0').kind_rank)
+
+    def test_invalidate_on_bulk_updates(self):
+        """Test the derived columns' QuerySet.update() drop the rows they change."""
+        Product.objects.filter(iden='P-1').update(rollup_secs=0, low_level=-1)
+        Thing.objects.filter(iden='P-0').update(kind_rank=0)
+        self.assertEqual(0, Product.objects.get_by_natural_key('P-1').rollup_secs)
+        self.assertEqual(0, Thing.objects.get_by_natural_key('P-0').kind_rank)
+        rollup.update_rollups()
+        self.assertEqual(20, Product.objects.get_by_natural_key('P-1').rollup_secs)
+        lowlevel.update_low_level_codes()
+        self.assertEqual(2, Product.objects.get_by_natural_key('P-1').low_level)
+        Thing.objects.sync_kind_ranks()
+        self.assertEqual(1, Thing.objects.get_by_natural_key('P-0').kind_rank)
+
+    def test_rollback(self):
+        """Test rows read in a transaction rolled back are not cached."""
+        with self.assertRaises(ValueError), transaction.atomic():
+            thing = Thing.objects.get(iden='P-1')
+            thing.iden = 'ROLLED BACK'
+            thing.save()
+            Thing.objects.get_by_natural_key('ROLLED BACK')
+            raise ValueError
+        with self.assertRaises(Thing.DoesNotExist):
+            Thing.objects.get_by_natural_key('ROLLED BACK')
+        self.assertEqual('P-1', Thing.objects.get_by_natural_key('P-1').iden)
+
+    def test_invalidate_on_delete(self):
+        """Test deleting a Materiel drops it."""
+        Materiel.objects.get_by_natural_key('P-0', 'P-1').delete()
+        with self.assertRaises(Materiel.DoesNotExist):
+            Materiel.objects.get_by_natural_key('P-0', 'P-1')
+
+
+class NaturalKeyCacheSizeTest(TestCase):
+    """Test the size budget is shared by all the models."""
+    def test_least_recently_used_evicted(self):
+        cache = NaturalKeyCache(max_size=2)
+        kind = Kind.objects.create(iden='F', name='Fruit', rank=1)
+        thing = Thing.objects.create(iden='F-A', kind=kind, name='Apple')
+        cache.put(Kind, 'default', ('F',), kind)
+        cache.put(Thing, 'default', ('F-A',), thing)
+        self.assertIsNotNone(cache.get(Kind, 'default', ('F',)))
+        cache.put(Thing, 'default', ('F-B',), thing)
+        self.assertIsNone(cache.get(Thing, 'default', ('F-A',)))
+        self.assertIsNotNone(cache.get(Kind, 'default', ('F',)))
+        self.assertEqual(2, cache.stats()['size'])
+
+    def test_disabled(self):
+        """Test the cache is off unless a size is set."""
+        self.assertFalse(natural_key_cache.enabled)
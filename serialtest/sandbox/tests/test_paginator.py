@@ -0,0 +1,99 @@
+"""Sandbox: Keyset paginator unit tests"""
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from sandbox import paginator
+from sandbox.models import Kind, Materiel, Thing
+
+
+class KeysetPaginatorTest(TestCase):
+    """Test keyset pages match OFFSET pages."""
+    def setUp(self):
+        cache.clear()
+        kinds = [
+            Kind.objects.create(iden=iden, name=iden, rank=rank)
+            for iden, rank in (('A', 2), ('B', 1))]
+        for index in range(25):
+            Thing.objects.create(
+                iden=f'T-{index}', kind=kinds[index % 2], name=f'Thing {index}',
+                rank=index % 4)
+
+    def queryset(self):
+        return Thing.objects.select_related('kind')
+
+    def test_ordering(self):
+        """Test the ordering comes from the model, ending in the pk."""
+        self.assertEqual(
+            ['kind_rank', 'rank', 'id'],
+            paginator.KeysetPaginator.seek_ordering(Thing.objects.all()))
+        self.assertEqual(
+            ['-quantity', 'pk'],
+            paginator.KeysetPaginator.seek_ordering(Materiel.objects.order_by('-quantity')))
+
+    def test_pages_match_offset(self):
+        """Test every page, forward and backward, matches Paginator's."""
+        expected = Paginator(self.queryset(), 10, orphans=2)
+        keyset = paginator.KeysetPaginator(self.queryset(), 10, orphans=2)
+        self.assertEqual(expected.num_pages, keyset.num_pages)
+        for number in (1, 2, 3, 2, 1, 3):
+            self.assertEqual(
+                list(expected.page(number)), list(keyset.page(number)), f'page {number}')
+
+    def test_relation_ordering(self):
+        """Test ordering by a relation seeks by its model's ordering, not its key."""
+        queryset = self.queryset().order_by('kind', 'pk')
+        self.assertEqual(
+            ['kind__rank', 'kind__id', 'pk'],
+            paginator.KeysetPaginator.seek_ordering(queryset))
+        self.assertEqual(
+            ['-kind__rank', '-kind__id', 'pk'],
+            paginator.KeysetPaginator.seek_ordering(queryset.order_by('-kind')))
+        self.assertEqual(
+            ['kind_id', 'pk'],
+            paginator.KeysetPaginator.seek_ordering(queryset.order_by('kind_id')))
+        for ordering in ('kind', '-kind'):
+            expected = Paginator(queryset.order_by(ordering, 'pk'), 10)
+            keyset = paginator.KeysetPaginator(queryset.order_by(ordering), 10)
+            for number in (1, 2, 3):
+                self.assertEqual(
+                    list(expected.page(number)), list(keyset.page(number)),
+                    f'{ordering} page {number}')
+
+    def test_seek_without_offset(self):
+        """Test the page after a page served is read without OFFSET."""
+        keyset = paginator.KeysetPaginator(self.queryset(), 10)
+        keyset.page(1)
+        with CaptureQueriesContext(connection) as context:
+            keyset.page(2)
+        self.assertNotIn('OFFSET', context.captured_queries[-1]['sql'])
+        self.assertEqual(
+            list(self.queryset()[20:]),
+            list(paginator.KeysetPaginator(self.queryset(), 10).page(3)))
+
+    def test_empty(self):
+        """Test querysets without SQL give an empty first page, in every count mode."""
+        for queryset in (self.queryset().none(), self.queryset().filter(pk__in=[])):
+            for count_mode in (paginator.EXACT, paginator.CACHED, paginator.APPROXIMATE):
+                keyset = paginator.KeysetPaginator(queryset, 10, count_mode=count_mode)
+                self.assertEqual(0, keyset.count)
+                self.assertEqual([], list(keyset.page(1)))
+
+    def test_cached_count(self):
+        """Test the cached count is counted once."""
+        paginator.KeysetPaginator(self.queryset(), 10, count_mode=paginator.CACHED).count
+        with self.assertNumQueries(0):
+            self.assertEqual(25, paginator.KeysetPaginator(
+                self.queryset(), 10, count_mode=paginator.CACHED).count)
+
+    def test_approximate_count(self):
+        """Test the approximate count reads the SQLite statistics."""
+        keyset = paginator.KeysetPaginator(
+            Thing.objects.all(), 10, count_mode=paginator.APPROXIMATE)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.assertEqual(25, keyset.count)
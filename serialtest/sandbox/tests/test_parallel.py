@@ -0,0 +1,74 @@
+"""Sandbox: Parallel staged fixture loading unit tests"""
+
+import io
+import json
+
+from django.core import serializers
+from django.test import TestCase
+
+from sandbox import parallel, streaming
+from sandbox.models import Kind, Materiel, Product, Product4, Product5, Thing
+
+from .catalog import make_catalog
+
+
+class ModelStagesTest(TestCase):
+    """Test the models are staged after their dependencies."""
+    def test_sandbox_stages(self):
+        stages = parallel.model_stages([Materiel, Product4, Product, Product5, Thing, Kind])
+        self.assertEqual([[Kind], [Thing], [Product4, Product, Product5], [Materiel]], stages)
+
+
+class ParallelLoadTest(TestCase):
+    """Test loading a dump whose records are out of dependency order."""
+    def setUp(self):
+        make_catalog(size=6, product4=True)
+        self.expected = self.serialize_bom()
+        stream = io.StringIO()
+        streaming.dump(stream)
+        self.lines = stream.getvalue().splitlines(keepends=True)
+        Kind.objects.all().delete()
+
+    @staticmethod
+    def serialize_bom():
+        return serializers.serialize(
+            'python', Materiel.objects.order_by('parent__thing__iden', 'component__thing__iden'),
+            use_natural_foreign_keys=True, use_natural_primary_keys=True)
+
+    def check_load(self, **kwargs):
+        stats = parallel.load(io.StringIO(''.join(reversed(self.lines))), chunk_size=5, **kwargs)
+        self.assertEqual(len(self.lines), stats.count)
+        self.assertEqual(['sandbox.kind'], stats.stages[0])
+        self.assertEqual(['sandbox.materiel'], stats.stages[-1])
+        self.assertEqual(6, Product.objects.count())
+        self.assertEqual(6, Product4.objects.count())
+        self.assertEqual(self.expected, self.serialize_bom())
+        self.assertEqual([1, 2], sorted(set(Thing.objects.values_list('kind_rank', flat=True))))
+
+    def test_load_in_process(self):
+        self.check_load(processes=0)
+
+    def test_load_with_pool(self):
+        self.check_load(processes=2)
+
+    def test_parse_converts_values(self):
+        """Test field values are converted and foreign keys left as keys."""
+        staged = parallel.parse(self.lines, processes=0)
+        record = staged['sandbox.materiel'][0]
+        self.assertEqual(['P-0'], record['fields']['parent'])
+        thing = staged['sandbox.thing'][0]
+        self.assertEqual(['F'], thing['fields']['kind'])
+        self.assertEqual(0, thing['fields']['rank'])
+
+    def test_ignorenonexistent(self):
+        """Test unknown models and fields are skipped when asked."""
+        lines = [
+            json.dumps({'model': 'sandbox.nothing', 'fields': {}}) + '\n',
+            json.dumps({'model': 'sandbox.kind',
+                        'fields': {'iden': 'X', 'name': 'X', 'colour': 'red'}}) + '\n',
+        ]
+        with self.assertRaises(serializers.base.DeserializationError):
+            parallel.parse(lines, processes=0)
+        stats = parallel.load(lines, processes=0, ignorenonexistent=True)
+        self.assertEqual(1, stats.count)
+        self.assertTrue(Kind.objects.filter(iden='X').exists())
@@ -0,0 +1,103 @@
+"""Sandbox: Rolled-up production seconds unit tests"""
+
+import io
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from sandbox import rollup
+from sandbox.models import Materiel, Product
+
+from .catalog import make_catalog
+
+
+class ComputeRollupsTest(TestCase):
+    """Test the rollup computation, without the database."""
+    def test_compute(self):
+        lines = [(1, 2, 2), (1, 3, 1), (2, 3, 3)]
+        self.assertEqual(
+            {1: 1 + 2 * (10 + 3 * 100) + 100, 2: 10 + 3 * 100, 3: 100},
+            rollup.compute_rollups({1: 1, 2: 10, 3: 100}, lines))
+
+    def test_base(self):
+        """Test components left out take their saved rollups."""
+        self.assertEqual(
+            {1: 1 + 2 * 50}, rollup.compute_rollups({1: 1}, [(1, 2, 2)], base={2: 50}))
+
+    def test_saturate(self):
+        self.assertEqual(
+            rollup.MAX_SECS,
+            rollup.compute_rollups({1: 1, 2: rollup.MAX_SECS}, [(1, 2, 2)])[1])
+
+
+class RollupTest(TestCase):
+    """Test the rollups of the test catalog are kept by saves and deletes."""
+    def setUp(self):
+        self.prods = make_catalog(size=5)
+        rollup.update_rollups()
+
+    def rollups(self):
+        return dict(Product.objects.values_list('iden', 'rollup_secs'))
+
+    def test_update(self):
+        self.assertEqual(
+            {'P-0': 2350, 'P-1': 20, 'P-2': 70, 'P-3': 180, 'P-4': 410}, self.rollups())
+        self.assertEqual(0, rollup.update_rollups())
+
+    def test_prod_secs(self):
+        """Test a Product save recomputes it and its ancestors only."""
+        product = Product.objects.get(iden='P-2')
+        product.prod_secs = 130
+        with CaptureQueriesContext(connection) as context:
+            product.save()
+        self.assertEqual(
+            {'P-0': 2350 + 100 * (2 + 3 * 2 + 4 * 4), 'P-1': 20, 'P-2': 170,
+             'P-3': 380, 'P-4': 810}, self.rollups())
+        updates = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "sandbox_product" SET "rollup_secs"')]
+        self.assertEqual(1, len(updates))
+
+    def test_materiel(self):
+        """Test Materiel quantity changes, adds and deletes."""
+        materiel = Materiel.objects.get(parent=self.prods[0], component=self.prods[4])
+        materiel.quantity = 1
+        materiel.save()
+        self.assertEqual(2350 - 3 * 410, self.rollups()['P-0'])
+        materiel.delete()
+        self.assertEqual(2350 - 4 * 410, self.rollups()['P-0'])
+        Materiel.objects.create(parent=self.prods[4], component=self.prods[1], quantity=5)
+        self.assertEqual(
+            {'P-0': 2350 - 4 * 410, 'P-1': 20, 'P-2': 70, 'P-3': 180, 'P-4': 410 + 5 * 20},
+            self.rollups())
+
+    def test_move(self):
+        """Test moving a line to another parent recomputes the old parent too."""
+        materiel = Materiel.objects.get(parent=self.prods[3], component=self.prods[2])
+        materiel.parent = self.prods[4]
+        materiel.save()
+        self.assertEqual(
+            {'P-0': 10 + 20 + 2 * 70 + 3 * 40 + 4 * 270, 'P-1': 20, 'P-2': 70, 'P-3': 40,
+             'P-4': 50 + 2 * 40 + 2 * 70}, self.rollups())
+
+    def test_deferred(self):
+        """Test queued maintenance runs once at the end of the block."""
+        with CaptureQueriesContext(connection) as context:
+            with rollup.deferred():
+                for materiel in Materiel.objects.filter(parent=self.prods[0]):
+                    materiel.quantity += 1
+                    materiel.save()
+        updates = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "sandbox_product" SET "rollup_secs"')]
+        self.assertEqual(1, len(updates))
+        self.assertEqual(2350 + 20 + 70 + 180 + 410, self.rollups()['P-0'])
+
+    def test_command(self):
+        Product.objects.update(rollup_secs=0)
+        stdout = io.StringIO()
+        call_command('rollupsecs', stdout=stdout)
+        self.assertIn('Updated 5 product(s)', stdout.getvalue())
+        self.assertEqual(2350, self.rollups()['P-0'])
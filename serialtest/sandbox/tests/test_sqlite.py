@@ -0,0 +1,90 @@
+"""Sandbox: SQLite profile unit tests"""
+
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.transaction import TransactionManagementError
+from django.test import TransactionTestCase, override_settings
+
+from sandbox import sqlite, streaming
+from sandbox.models import Materiel, Product
+
+from .catalog import make_catalog
+
+
+class ProfileTest(TransactionTestCase):
+    """Test the profile's pragmas are set on the connections."""
+    def tearDown(self):
+        sqlite.apply_profile(connection, 'default')
+
+    def pragmas(self):
+        return sqlite.get_pragmas(connection, ['busy_timeout', 'synchronous', 'cache_size'])
+
+    def test_not_set(self):
+        """Test the test database's connection was left with SQLite's settings."""
+        self.assertEqual(
+            {'busy_timeout': 5000, 'synchronous': 2, 'cache_size': -2000}, self.pragmas())
+
+    @override_settings(SANDBOX_SQLITE_PROFILE='tuned')
+    def test_tuned(self):
+        """Test the tuned profile is set when the setting opts in."""
+        sqlite.apply_profile(connection)
+        self.assertEqual(
+            {'busy_timeout': 30000, 'synchronous': 1, 'cache_size': -64 * 1024}, self.pragmas())
+
+    @override_settings(SANDBOX_SQLITE_PROFILE={'busy_timeout': 1234, 'cache_size': -100})
+    def test_setting(self):
+        sqlite.apply_profile(connection)
+        self.assertEqual(
+            {'busy_timeout': 1234, 'synchronous': 2, 'cache_size': -100}, self.pragmas())
+        sqlite.apply_profile(connection, 'default')
+        self.assertEqual(
+            {'busy_timeout': 5000, 'synchronous': 2, 'cache_size': -2000}, self.pragmas())
+
+
+class BulkLoadTest(TransactionTestCase):
+    """Test bulk_load() drops, and always rebuilds, the secondary indexes."""
+    def setUp(self):
+        make_catalog(size=3)
+
+    def indexes(self):
+        return sqlite.secondary_indexes(connection, [Materiel._meta.db_table])
+
+    def test_bulk_load(self):
+        indexes = self.indexes()
+        synchronous = sqlite.get_pragmas(connection, ['synchronous'])
+        self.assertTrue(indexes)
+        self.assertFalse(any(sql.startswith('CREATE UNIQUE') for _, sql in indexes))
+        with sqlite.bulk_load():
+            self.assertEqual([], self.indexes())
+            self.assertEqual(0, sqlite.get_pragmas(connection, ['synchronous'])['synchronous'])
+        self.assertEqual(indexes, self.indexes())
+        self.assertEqual(synchronous, sqlite.get_pragmas(connection, ['synchronous']))
+
+    def test_error(self):
+        indexes = self.indexes()
+        with self.assertRaises(ValueError):
+            with sqlite.bulk_load():
+                raise ValueError
+        self.assertEqual(indexes, self.indexes())
+
+    def test_transaction(self):
+        with transaction.atomic(), self.assertRaises(TransactionManagementError):
+            with sqlite.bulk_load():
+                pass
+
+    def test_loadcatalog(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.jsonl')
+            with open(path, 'w', encoding='utf-8') as stream:
+                count = streaming.dump(stream)
+            Materiel.objects.all().delete()
+            Product.objects.all().delete()
+            stdout = io.StringIO()
+            call_command('loadcatalog', path, '--bulk', stdout=stdout)
+        self.assertIn(f'Loaded {count} object(s).', stdout.getvalue())
+        self.assertEqual(3, Product.objects.count())
+        self.assertTrue(self.indexes())
@@ -0,0 +1,67 @@
+"""Sandbox: Streaming JSON Lines serialization unit tests"""
+
+import io
+import json
+
+from django.core import serializers
+from django.test import TestCase
+
+from sandbox import streaming
+from sandbox.models import Kind, Materiel, Product, Product4, Thing
+
+from .catalog import make_catalog
+
+
+class StreamingTest(TestCase):
+    """Test dumping and loading the catalog as JSON Lines."""
+    def setUp(self):
+        make_catalog(size=6, product4=True)
+
+    def dump(self):
+        stream = io.StringIO()
+        count = streaming.dump(stream, chunk_size=4)
+        return count, stream.getvalue()
+
+    def test_dump_one_record_per_line(self):
+        """Test each line is a record with natural keys."""
+        count, data = self.dump()
+        lines = data.splitlines()
+        self.assertEqual(count, len(lines))
+        records = [json.loads(line) for line in lines]
+        models = [record['model'] for record in records]
+        self.assertLess(models.index('sandbox.thing'), models.index('sandbox.product'))
+        self.assertLess(models.index('sandbox.product'), models.index('sandbox.materiel'))
+        self.assertIn({
+            'model': 'sandbox.materiel',
+            'fields': {'parent': ['P-0'], 'component': ['P-1'], 'quantity': 1},
+        }, records)
+
+    def test_dump_queries_do_not_grow(self):
+        """Test natural foreign keys are joined rather than queried per row."""
+        with self.assertNumQueries(len(streaming.catalog_models())):
+            self.dump()
+
+    def test_load_round_trip(self):
+        """Test loading the dump into an empty database."""
+        expected = serializers.serialize(
+            'python', Materiel.objects.order_by('parent__thing__iden', 'component__thing__iden'),
+            use_natural_foreign_keys=True, use_natural_primary_keys=True)
+        _, data = self.dump()
+        Kind.objects.all().delete()
+        self.assertEqual(0, Thing.objects.count())
+
+        count = streaming.load(io.StringIO(data), batch_size=4)
+        self.assertEqual(len(data.splitlines()), count)
+        self.assertEqual(6, Product.objects.count())
+        self.assertEqual(6, Product4.objects.count())
+        self.assertEqual(expected, serializers.serialize(
+            'python', Materiel.objects.order_by('parent__thing__iden', 'component__thing__iden'),
+            use_natural_foreign_keys=True, use_natural_primary_keys=True))
+
+    def test_registered_format(self):
+        """Test the 'jsonl' format through Django's serializer registry."""
+        things = list(Thing.objects.all())
+        data = serializers.serialize('jsonl', things, use_natural_foreign_keys=True)
+        self.assertEqual(len(things), len(data.splitlines()))
+        desobjs = list(serializers.deserialize('jsonl', data))
+        self.assertEqual(things, [desobj.object for desobj in desobjs])
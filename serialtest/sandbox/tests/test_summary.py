@@ -0,0 +1,97 @@
+"""Sandbox: Summary queryset and serializer profile unit tests"""
+
+import io
+import json
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from sandbox import summary
+from sandbox.models import Product, Thing
+
+from .catalog import make_catalog
+
+
+class SummaryQuerySetTest(TestCase):
+    """Test that summaries defer the other fields, then load them in bulk."""
+    def setUp(self):
+        make_catalog(5)
+
+    def test_deferred(self):
+        things = list(Thing.objects.summary())
+        self.assertEqual(
+            {'desc', 'image', 'image_hash', 'kind_rank', 'change_seq'},
+            things[0].get_deferred_fields())
+        product = Product.objects.summary('prod_secs').get(iden='P-1')
+        self.assertNotIn('prod_secs', product.get_deferred_fields())
+        self.assertIn('desc', product.get_deferred_fields())
+
+    def test_bulk_load(self):
+        products = list(Product.objects.summary())
+        with self.assertNumQueries(1):
+            descs = {product.iden: product.desc for product in products}
+            prod_secs = [product.prod_secs for product in products]
+            self.assertFalse(any(product.get_deferred_fields() for product in products))
+        self.assertEqual('Thing number 3', descs['P-3'])
+        self.assertEqual(sorted(prod_secs), [10, 20, 30, 40, 50])
+
+    def test_cohorts(self):
+        old, summary.SummaryIterable.cohort_size = summary.SummaryIterable.cohort_size, 2
+        try:
+            things = list(Thing.objects.summary())
+        finally:
+            summary.SummaryIterable.cohort_size = old
+        with self.assertNumQueries(3):
+            for thing in things:
+                thing.desc
+
+    def test_save(self):
+        thing = Thing.objects.summary().get(iden='P-2')
+        thing.name = 'Renamed'
+        thing.save()
+        thing = Thing.objects.get(iden='P-2')
+        self.assertEqual(('Renamed', 'Thing number 2'), (thing.name, thing.desc))
+
+    def test_edits_kept(self):
+        """Test loading a cohort keeps the fields assigned on its other instances."""
+        things = list(Thing.objects.summary())
+        things[1].desc = 'Edited'
+        self.assertEqual('Thing number 0', things[0].desc)
+        self.assertEqual('Edited', things[1].desc)
+        things[1].save()
+        self.assertEqual('Edited', Thing.objects.get(pk=things[1].pk).desc)
+
+    def test_other_querysets(self):
+        thing = Thing.objects.only('iden').get(iden='P-2')
+        with self.assertNumQueries(1):
+            self.assertEqual('Thing number 2', thing.desc)
+
+
+class SummarySerializerTest(TestCase):
+    """Test the serializer field profiles."""
+    def setUp(self):
+        make_catalog(3)
+
+    def test_serializer_fields(self):
+        self.assertEqual(('iden', 'kind', 'name', 'rank'), summary.serializer_fields(Thing))
+        self.assertEqual(
+            ('thing', 'prod_secs', 'low_level'), summary.serializer_fields(Product))
+
+    def test_serialize(self):
+        with self.assertNumQueries(1):
+            data = json.loads(summary.serialize('json', Thing.objects.all()))
+        self.assertEqual(
+            {'iden': 'P-0', 'kind': 1, 'name': 'Thing 0', 'rank': 0}, data[0]['fields'])
+        with self.assertNumQueries(1):
+            data = json.loads(summary.serialize('json', Product.objects.all()))
+        self.assertEqual({'thing', 'prod_secs', 'low_level'}, set(data[0]['fields']))
+
+
+class BenchSummaryTest(TestCase):
+    """Test the benchsummary command runs."""
+    def test_command(self):
+        stdout = io.StringIO()
+        call_command('benchsummary', rows=10, stdout=stdout)
+        self.assertEqual(8, len(stdout.getvalue().splitlines()))
+        self.assertIn('Product.objects.summary()', stdout.getvalue())
+        self.assertEqual(0, Thing.objects.count())
@@ -0,0 +1,125 @@
+"""Sandbox: Thumbnail unit tests"""
+
+import hashlib
+import io
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from sandbox import thumbnails
+from sandbox.models import Kind, Thing
+from sandbox.nkcache import natural_key_cache
+
+
+def png(color='red', size=(200, 100)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ThumbnailStorageMixin():
+    """Use a temporary image storage."""
+    def setUp(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        field = Thing._meta.get_field('image')
+        self.addCleanup(setattr, field, 'storage', field.storage)
+        self.storage = field.storage = FileSystemStorage(location=tempdir, base_url='/images/')
+        thumbnails.clear_fragments()
+        self.kind = Kind.objects.create(iden='F', name='Fruit')
+
+    def thing(self, iden, **kwargs):
+        return Thing.objects.create(iden=iden, kind=self.kind, name=f'Thing {iden}', **kwargs)
+
+
+class ThumbnailTestCase(ThumbnailStorageMixin, TestCase):
+    """Use a temporary image storage, in a transaction."""
+
+
+class ThumbnailTest(ThumbnailTestCase):
+    """Test the thumbnails generated on upload, and the img_html() fragments."""
+    def test_upload(self):
+        data = png()
+        thing = self.thing('A', image=SimpleUploadedFile('a.png', data))
+        image_hash = hashlib.sha1(data).hexdigest()
+        self.assertEqual(image_hash, thing.image_hash)
+        name = f'thumbnails/{image_hash}-64x64.png'
+        with self.storage.open(name) as file:
+            self.assertEqual((64, 32), Image.open(file).size)
+        self.assertIn(f'src="/images/{name}"', thing.img_html())
+        self.assertIn('Thing A', thing.img_name_html())
+
+    def test_shared(self):
+        self.thing('A', image=SimpleUploadedFile('a.png', png()))
+        self.thing('B', image=SimpleUploadedFile('b.png', png()))
+        self.assertEqual(1, len(self.storage.listdir('thumbnails')[1]))
+        self.assertEqual(1, len(set(Thing.objects.values_list('image_hash', flat=True))))
+
+    def test_changed(self):
+        thing = self.thing('A', image=SimpleUploadedFile('a.png', png()))
+        self.storage.save('b.png', ContentFile(png('blue')))
+        thing = Thing.objects.get(pk=thing.pk)
+        thing.image = 'b.png'
+        thing.save()
+        self.assertEqual(hashlib.sha1(png('blue')).hexdigest(), thing.image_hash)
+        self.assertEqual(2, len(self.storage.listdir('thumbnails')[1]))
+        thing.image = ''
+        thing.save()
+        self.assertEqual('', Thing.objects.get(pk=thing.pk).image_hash)
+
+    def test_memoized(self):
+        thing = self.thing('A', image=SimpleUploadedFile('a.png', png()))
+        html = thing.img_html()
+        self.storage.delete(thumbnails.thumbnail_name(thing.image_hash))
+        self.assertEqual(html, Thing.objects.get(pk=thing.pk).img_html())
+        thing.name = 'Renamed'
+        self.assertIn('src="/images/a.png"', thing.img_html())
+
+    def test_raw(self):
+        self.storage.save('a.png', ContentFile(png()))
+        thing = Thing(iden='A', kind=self.kind, name='Thing A', image='a.png')
+        thing.save_base(raw=True)
+        self.assertEqual('', thing.image_hash)
+        self.assertIn('src="/images/a.png"', thing.img_html())
+
+
+class ThumbnailsCommandTest(ThumbnailTestCase):
+    """Test the batch hashing of the thumbnails command."""
+    def test_command(self):
+        for iden, color in (('A', 'red'), ('B', 'blue'), ('C', 'red')):
+            self.storage.save(f'{iden}.png', ContentFile(png(color)))
+            Thing(iden=iden, kind=self.kind, name=iden, image=f'{iden}.png').save_base(raw=True)
+        Thing(iden='D', kind=self.kind, name='D', image='missing.png').save_base(raw=True)
+        self.thing('E')
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('thumbnails', workers=2, chunk_size=2, stdout=stdout, stderr=stderr)
+        self.assertIn('4 image(s), 3 hash(es) saved, 1 failed', stdout.getvalue())
+        self.assertIn('missing.png', stderr.getvalue())
+        hashes = dict(Thing.objects.values_list('iden', 'image_hash'))
+        self.assertEqual(hashlib.sha1(png('blue')).hexdigest(), hashes['B'])
+        self.assertEqual(hashes['A'], hashes['C'])
+        self.assertEqual(2, len(self.storage.listdir('thumbnails')[1]))
+
+        stdout = io.StringIO()
+        call_command('thumbnails', stdout=stdout, stderr=io.StringIO())
+        self.assertIn('0 hash(es) saved', stdout.getvalue())
+
+
+class ThumbnailsCacheTest(ThumbnailStorageMixin, TransactionTestCase):
+    """Test the thumbnails command drops cached rows, cached in autocommit."""
+    @override_settings(SANDBOX_NATURAL_KEY_CACHE_SIZE=10)
+    def test_cached_thing(self):
+        """Test the hashes saved drop the Things' cached rows."""
+        self.addCleanup(natural_key_cache.clear)
+        self.storage.save('A.png', ContentFile(png()))
+        Thing(iden='A', kind=self.kind, name='A', image='A.png').save_base(raw=True)
+        self.assertEqual('', Thing.objects.get_by_natural_key('A').image_hash)
+        thumbnails.generate(Thing.objects.all(), workers=1)
+        self.assertEqual(
+            hashlib.sha1(png()).hexdigest(), Thing.objects.get_by_natural_key('A').image_hash)
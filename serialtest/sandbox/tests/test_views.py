@@ -0,0 +1,107 @@
+"""Sandbox: JSON API unit tests"""
+
+import json
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+
+from sandbox import lowlevel, versions
+from sandbox.models import Kind, Materiel, Product, Thing
+
+from .catalog import make_catalog
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sandbox': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES, SANDBOX_VERSION_CACHE='sandbox')
+class APITest(TransactionTestCase):
+    """Test the API resources, and their ETags following the versions."""
+    def setUp(self):
+        versions.version_cache().clear()
+        self.prods = make_catalog(size=3)
+
+    def get(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def data(self, url):
+        response = self.get(url)
+        self.assertEqual(200, response.status_code)
+        if response.streaming:
+            return json.loads(b''.join(response.streaming_content).decode())
+        return json.loads(response.content.decode())
+
+    def test_lists(self):
+        self.assertEqual(
+            [{'iden': 'F', 'name': 'Fruit', 'desc': 'You know ... fruit', 'rank': 1},
+             {'iden': 'B', 'name': 'Baked', 'desc': 'Something baked.', 'rank': 2}],
+            self.data('/api/kinds/'))
+        self.assertIn('no-cache', self.get('/api/kinds/')['Cache-Control'])
+        products = self.data('/api/products/')
+        self.assertEqual(['P-0', 'P-2', 'P-1'], [product['iden'] for product in products])
+        self.assertEqual(
+            {'iden': 'P-1', 'kind': 'B', 'name': 'Thing 1', 'desc': 'Thing number 1',
+             'rank': 1, 'image': None, 'prod_secs': 20, 'low_level': 2, 'rollup_secs': 0},
+            products[2])
+
+    def test_details(self):
+        self.assertEqual('Thing 2', self.data('/api/things/P-2/')['name'])
+        self.assertEqual('F', self.data('/api/kinds/F/')['iden'])
+        self.assertEqual(404, self.get('/api/products/X/').status_code)
+        self.assertEqual(405, self.client.post('/api/kinds/').status_code)
+
+    def test_bom(self):
+        data = self.data('/api/products/P-0/bom/?quantity=2')
+        self.assertEqual(2, data['quantity'])
+        self.assertEqual(
+            [(0, None, 'P-0', 2), (1, 'P-0', 'P-2', 4), (2, 'P-2', 'P-1', 8), (1, 'P-0', 'P-1', 2)],
+            [(line['level'], line['parent'], line['iden'], line['extended_quantity'])
+             for line in data['lines']])
+        self.assertEqual(400, self.get('/api/products/P-0/bom/?quantity=x').status_code)
+        self.assertEqual(404, self.get('/api/products/X/bom/').status_code)
+
+    def test_not_modified(self):
+        """Test a matching If-None-Match is answered 304 without a query."""
+        etag = self.get('/api/products/').get('ETag')
+        self.assertRegex(etag, r'^"v1-\d+-\d+"$')
+        with self.assertNumQueries(0):
+            response = self.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(200, self.get('/api/products/', HTTP_IF_NONE_MATCH='"v0"').status_code)
+
+    def test_etags_change(self):
+        """Test saves, and bulk updates, change the ETags of what they cover."""
+        kinds, things, bom = (
+            self.get(url)['ETag']
+            for url in ('/api/kinds/', '/api/things/', '/api/products/P-0/bom/'))
+        thing = Thing.objects.get(iden='P-1')
+        thing.name = 'Renamed'
+        thing.save()
+        self.assertEqual(kinds, self.get('/api/kinds/')['ETag'])
+        self.assertNotEqual(things, self.get('/api/things/')['ETag'])
+        self.assertNotEqual(bom, self.get('/api/products/P-0/bom/')['ETag'])
+
+        products = self.get('/api/products/')['ETag']
+        Product.objects.update(low_level=-1)
+        self.assertEqual(products, self.get('/api/products/')['ETag'])
+        lowlevel.update_low_level_codes()
+        self.assertNotEqual(products, self.get('/api/products/')['ETag'])
+
+        bom = self.get('/api/products/P-0/bom/')['ETag']
+        Materiel.objects.filter(parent=self.prods[0]).first().delete()
+        self.assertNotEqual(bom, self.get('/api/products/P-0/bom/')['ETag'])
+
+
+@override_settings(CACHES=TEST_CACHES, SANDBOX_VERSION_CACHE='sandbox')
+class BumpVersionTest(TransactionTestCase):
+    """Test a transaction bumps a version once."""
+    def test_once(self):
+        kind = Kind.objects.create(iden='F', name='Fruit')
+        version = versions.get_version(versions.model_version_name(Thing))
+        with transaction.atomic():
+            for index in range(3):
+                Thing.objects.create(iden=f'T{index}', kind=kind, name='Thing')
+            self.assertEqual(1, len(connection.run_on_commit))
+        self.assertEqual(version + 1, versions.get_version(versions.model_version_name(Thing)))
@@ -0,0 +1,212 @@
+"""Thumbnails of the Thing images, and memoized img_html() fragments.
+
+Thing.image_hash is the SHA-1 of the image file's content. Non-raw saves
+changing the image (an upload, or another file name) hash it and generate
+its thumbnail (see sandbox.signals); the thumbnails command does the same
+in a batch, e.g. after loading fixtures.
+
+A thumbnail is a PNG fitting in SANDBOX_THUMBNAIL_SIZE (default 64x64),
+saved in the image field's storage under a name made of the hash and size:
+
+    thumbnails/<image_hash>-64x64.png
+
+so images of the same content share one, and a changed image never gets a
+stale one. Thing.img_html() serves the thumbnail. Its fragments are
+memoized per process by (pk, image_hash, name); until the thumbnail exists
+the full-size image is served, and that fragment is not memoized.
+"""
+
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.html import format_html
+from PIL import Image
+
+from .nkcache import natural_key_cache
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_PATH = 'thumbnails'
+DEFAULT_SIZE = (64, 64)
+
+FRAGMENT_CACHE_SIZE = 10000
+_fragments = OrderedDict()  # (pk, image_hash, name): html
+_fragments_lock = threading.Lock()
+
+IMG_HTML = '<img src="{0}" alt="{1}" title={1}>'
+
+DEFAULT_CHUNK_SIZE = 500
+
+BatchStats = namedtuple('BatchStats', [
+    'things',  # Things with an image
+    'hashed',  # Image hashes saved
+    'failed',  # List of (image name, error) of the missing or invalid images
+])
+
+
+def thumbnail_size():
+    return tuple(getattr(settings, 'SANDBOX_THUMBNAIL_SIZE', DEFAULT_SIZE))
+
+
+def thumbnail_name(image_hash, size=None):
+    width, height = size or thumbnail_size()
+    return f'{THUMBNAILS_PATH}/{image_hash}-{width}x{height}.png'
+
+
+def content_hash(file):
+    """SHA-1 hex digest of a File's content."""
+    digest = hashlib.sha1()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_thumbnail(storage, file, image_hash, size=None):
+    """Save the thumbnail of an image File to the storage, unless it exists.
+
+    Returns the thumbnail's name. Raises OSError if the File is not an image.
+    """
+    size = size or thumbnail_size()
+    name = thumbnail_name(image_hash, size)
+    if storage.exists(name):
+        return name
+    file.seek(0)
+    image = Image.open(file)
+    image.draft('RGB', size)
+    if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    image.thumbnail(size)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    saved = storage.save(name, ContentFile(buffer.getvalue()))
+    if saved != name:
+        # Saved meanwhile by another process, the same content.
+        storage.delete(saved)
+    return name
+
+
+def image_changed(thing):
+    """Whether a Thing's image is new or another file since it was loaded."""
+    if 'image' in thing.get_deferred_fields():
+        return False
+    image = thing.image
+    if not image._committed:
+        return True
+    return (image.name != getattr(thing, '_loaded_image', None) or
+            bool(image) != bool(thing.image_hash))
+
+
+def hash_image(thing):
+    """The content hash of a Thing's image, '' if none or missing."""
+    image = thing.image
+    if not image:
+        return ''
+    try:
+        return content_hash(image)
+    except OSError:
+        return ''
+    finally:
+        if image._committed:
+            image.close()
+
+
+def track_saving(thing):
+    """Hash the image of a Thing being saved, if changed."""
+    thing._image_changed = image_changed(thing)
+    if thing._image_changed:
+        thing.image_hash = hash_image(thing)
+
+
+def track_saved(thing):
+    """Generate the thumbnail of a saved Thing's changed image."""
+    if getattr(thing, '_image_changed', False) and thing.image_hash:
+        try:
+            with thing.image.open('rb') as image:
+                make_thumbnail(thing.image.storage, image, thing.image_hash)
+        except OSError as exc:
+            logger.warning('No thumbnail of %s: %s', thing.image.name, exc)
+    thing._image_changed = False
+    if 'image' not in thing.get_deferred_fields():
+        thing._loaded_image = thing.image.name
+
+
+def process_file(storage, name, image_hash='', size=None):
+    """Hash (unless image_hash is given) and thumbnail an image file.
+
+    Runs in a pool thread. Returns (image_hash, error message or None).
+    """
+    try:
+        with storage.open(name, 'rb') as file:
+            image_hash = image_hash or content_hash(file)
+            make_thumbnail(storage, file, image_hash, size)
+        return image_hash, None
+    except OSError as exc:
+        return image_hash, str(exc) or type(exc).__name__
+
+
+def generate(queryset, workers=4, rehash=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Hash the images of a Thing queryset and generate the missing thumbnails.
+
+    Images already hashed are not read again unless rehash. The files are
+    processed by a pool of worker threads, the hashes saved by this one
+    with QuerySet.update(), a chunk of pk's at a time. Returns BatchStats.
+    """
+    storage = queryset.model._meta.get_field('image').storage
+    manager = queryset.model._base_manager.db_manager(queryset.db)
+    size = thumbnail_size()
+    rows = queryset.exclude(image='').order_by('pk').values_list('pk', 'image', 'image_hash')
+    things = hashed = 0
+    failed = []
+
+    def process(row):
+        return process_file(storage, row[1], '' if rehash else row[2], size)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        last = None
+        while True:
+            chunk = list((rows if last is None else rows.filter(pk__gt=last))[:chunk_size])
+            if not chunk:
+                break
+            things += len(chunk)
+            last = chunk[-1][0]
+            with transaction.atomic(using=queryset.db):
+                for (pk, name, old_hash), (new_hash, error) in zip(chunk, pool.map(process, chunk)):
+                    if error is not None:
+                        failed.append((name, error))
+                    if new_hash != old_hash:
+                        manager.filter(pk=pk).update(image_hash=new_hash)
+                        natural_key_cache.invalidate_pks(queryset.model, [pk])
+                        hashed += 1
+    return BatchStats(things, hashed, failed)
+
+
+def img_html(thing):
+    """The img tag of a Thing with an image, memoized once its thumbnail exists."""
+    key = (thing.pk, thing.image_hash, thing.name)
+    with _fragments_lock:
+        html = _fragments.get(key)
+        if html is not None:
+            _fragments.move_to_end(key)
+            return html
+    storage = thing.image.storage
+    name = thumbnail_name(thing.image_hash)
+    if not thing.image_hash or thing.pk is None or not storage.exists(name):
+        return format_html(IMG_HTML, thing.image.url, thing.name)
+    html = format_html(IMG_HTML, storage.url(name), thing.name)
+    with _fragments_lock:
+        _fragments[key] = html
+        while len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return html
+
+
+def clear_fragments():
+    with _fragments_lock:
+        _fragments.clear()
@@ -0,0 +1,17 @@
+"""Sandbox API URL Configuration (see sandbox.views)."""
+
+from django.urls import path
+
+from . import views
+
+app_name = 'sandbox'
+
+urlpatterns = [
+    path('kinds/', views.kind_list, name='kind-list'),
+    path('kinds/<str:iden>/', views.kind_detail, name='kind-detail'),
+    path('things/', views.thing_list, name='thing-list'),
+    path('things/<str:iden>/', views.thing_detail, name='thing-detail'),
+    path('products/', views.product_list, name='product-list'),
+    path('products/<str:iden>/', views.product_detail, name='product-detail'),
+    path('products/<str:iden>/bom/', views.product_bom, name='product-bom'),
+]
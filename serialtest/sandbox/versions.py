@@ -0,0 +1,94 @@
+"""Version counters shared by the worker processes.
+
+A counter is bumped when the data it covers changes, letting each process
+tell whether what it built from that data (e.g. the BOM index snapshot) is
+stale. The counters live in the SANDBOX_VERSION_CACHE cache, which must be
+shared by the processes (e.g. file based or memcached) for that to work.
+
+Each catalog model's rows have a counter, bumped by their saves and deletes
+(see sandbox.signals) and by the bulk updates writing them; the models of a
+multi-table inheritance share their root's (see model_version_name()).
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .nkcache import root_label
+
+KEY_PREFIX = 'sandbox:version:'
+
+
+def version_cache():
+    """The cache holding the version counters."""
+    return caches[getattr(settings, 'SANDBOX_VERSION_CACHE', 'default')]
+
+
+def get_version(name):
+    """Return the current version of name.
+
+    A missing counter (new, or evicted) starts from the clock, so it can not
+    come back to a version seen before.
+    """
+    cache = version_cache()
+    key = KEY_PREFIX + name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(names):
+    """Return a dict of the current versions of names, in one cache read."""
+    found = version_cache().get_many([KEY_PREFIX + name for name in names])
+    return {
+        name: found[KEY_PREFIX + name] if KEY_PREFIX + name in found else get_version(name)
+        for name in names}
+
+
+def _increment(name):
+    cache = version_cache()
+    key = KEY_PREFIX + name
+    if type(cache).incr is BaseCache.incr:
+        # BaseCache.incr() (e.g. FileBasedCache's) sets the counter with the
+        # cache's default timeout, and it would expire. Its get() and set()
+        # are no less atomic done here, without a timeout.
+        version = cache.get(key)
+        if version is None:
+            get_version(name)
+        else:
+            cache.set(key, version + 1, timeout=None)
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(name)
+
+
+def bump_version(name, using=DEFAULT_DB_ALIAS):
+    """Increment the version of name once the current transaction commits.
+
+    Once per transaction: a bump already waiting for the commit is enough.
+    """
+    for entry in connections[using].run_on_commit:
+        if getattr(entry[1], 'version_name', None) == name:
+            return
+
+    def increment():
+        _increment(name)
+    increment.version_name = name
+    transaction.on_commit(increment, using=using)
+
+
+def model_version_name(model):
+    """The version name of a model's rows, that of its multi-table root."""
+    return 'model:' + root_label(model)
+
+
+def bump_model_version(model, using=DEFAULT_DB_ALIAS):
+    """Increment the version of a model's rows once the transaction commits."""
+    bump_version(model_version_name(model), using=using)
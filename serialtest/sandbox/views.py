@@ -1,3 +1,146 @@
-from django.shortcuts import render
+"""Read-only JSON API of the catalog and BOM explosions.
 
-# Create your views here.
+Kinds, Things and Products are identified by their iden:
+
+    /api/kinds/                   /api/kinds/<iden>/
+    /api/things/                  /api/things/<iden>/
+    /api/products/                /api/products/<iden>/
+    /api/products/<iden>/bom/?quantity=<n>
+
+Lists are streamed as a JSON array, a chunk of rows at a time, from
+values() rather than model instances. Every response has a strong ETag
+made of the version counters (see sandbox.versions) of the models it is
+read from, so a conditional GET whose If-None-Match matches is answered
+304 Not Modified from the version cache alone, without a query.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+
+from . import bom, bomindex, versions
+from .models import Kind, Product, Thing
+
+API_VERSION = 1
+CHUNK_SIZE = 2000
+
+KIND_FIELDS = ('iden', 'name', 'desc', 'rank')
+THING_FIELDS = ('iden', 'kind__iden', 'name', 'desc', 'rank', 'image')
+PRODUCT_FIELDS = THING_FIELDS + ('prod_secs', 'low_level', 'rollup_secs')
+
+
+def etag_of(*names):
+    """Strong ETag of the current versions of the named counters."""
+    return '"{}"'.format('-'.join(
+        [f'v{API_VERSION}'] + [str(versions.get_version(name)) for name in names]))
+
+
+def catalog_etag(*models):
+    return lambda request, *args, **kwargs: etag_of(
+        *[versions.model_version_name(model) for model in models])
+
+
+def bom_etag(request, *args, **kwargs):
+    return etag_of(
+        versions.model_version_name(Kind), versions.model_version_name(Thing),
+        bomindex.VERSION_NAME)
+
+
+def resource(row):
+    """The JSON resource of a values() row, the kind by iden and image by URL."""
+    row = dict(row)
+    if 'kind__iden' in row:
+        row['kind'] = row.pop('kind__iden')
+    if 'image' in row:
+        name = row['image']
+        row['image'] = Thing._meta.get_field('image').storage.url(name) if name else None
+    return row
+
+
+def stream_list(rows):
+    """Yield a JSON array of the resources of rows, an element at a time."""
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps(resource(row), cls=DjangoJSONEncoder)
+        separator = ','
+    yield ']'
+
+
+def list_response(queryset, fields):
+    rows = queryset.values(*fields).iterator(chunk_size=CHUNK_SIZE)
+    return StreamingHttpResponse(stream_list(rows), content_type='application/json')
+
+
+def detail_response(queryset, fields, iden):
+    row = queryset.filter(iden=iden).values(*fields).first()
+    if row is None:
+        raise Http404(f'No {queryset.model._meta.verbose_name} {iden}.')
+    return JsonResponse(resource(row), encoder=DjangoJSONEncoder)
+
+
+def api_view(etag_func):
+    """Decorate a GET (and HEAD) only view with ETags, revalidated on each use."""
+    def decorator(view):
+        return require_safe(cache_control(no_cache=True)(condition(etag_func=etag_func)(view)))
+    return decorator
+
+
+@api_view(catalog_etag(Kind))
+def kind_list(request):
+    return list_response(Kind.objects.all(), KIND_FIELDS)
+
+
+@api_view(catalog_etag(Kind))
+def kind_detail(request, iden):
+    return detail_response(Kind.objects.all(), KIND_FIELDS, iden)
+
+
+@api_view(catalog_etag(Kind, Thing))
+def thing_list(request):
+    return list_response(Thing.objects.all(), THING_FIELDS)
+
+
+@api_view(catalog_etag(Kind, Thing))
+def thing_detail(request, iden):
+    return detail_response(Thing.objects.all(), THING_FIELDS, iden)
+
+
+@api_view(catalog_etag(Kind, Product))
+def product_list(request):
+    return list_response(Product.objects.all(), PRODUCT_FIELDS)
+
+
+@api_view(catalog_etag(Kind, Product))
+def product_detail(request, iden):
+    return detail_response(Product.objects.all(), PRODUCT_FIELDS, iden)
+
+
+@api_view(bom_etag)
+def product_bom(request, iden):
+    try:
+        quantity = int(request.GET.get('quantity', 1))
+    except ValueError:
+        return HttpResponseBadRequest('quantity must be an integer.')
+    pk = Product.objects.filter(iden=iden).values_list('pk', flat=True).first()
+    if pk is None:
+        raise Http404(f'No product {iden}.')
+    lines = bom.explode(pk, quantity)
+    idens = {line.product_id: line.iden for line in lines}
+    return JsonResponse({
+        'product': iden,
+        'quantity': quantity,
+        'lines': [{
+            'level': line.level,
+            'parent': idens.get(line.above_id),
+            'iden': line.iden,
+            'name': line.name,
+            'quantity': line.quantity,
+            'extended_quantity': line.extended_quantity,
+            'prod_secs': line.prod_secs,
+            'cumulative_secs': line.cumulative_secs,
+        } for line in lines],
+    })
@@ -0,0 +1,17 @@
+"""
+ASGI config for serialtest project.
+
+It exposes the ASGI callable of the async API paths (see sandbox.asgi) as a
+module-level variable named ``application``, e.g. for
+
+    uvicorn serialtest.asgi:application
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "serialtest.settings")
+django.setup()
+
+from sandbox.asgi import application  # noqa: E402,F401
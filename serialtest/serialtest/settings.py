@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.0/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -82,6 +83,77 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+#
+# The 'sandbox' cache holds the version counters (sandbox.versions) and must
+# be shared by all the worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sandbox': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'serialtest_cache'),
+        # The version counters (see sandbox.versions) must not expire.
+        'TIMEOUT': None,
+    },
+}
+
+SANDBOX_VERSION_CACHE = 'sandbox'
+
+
+# Serialization formats
+# https://docs.djangoproject.com/en/2.0/ref/settings/#serialization-modules
+
+SERIALIZATION_MODULES = {
+    'columnar': 'sandbox.columnar',
+    'jsonl': 'sandbox.streaming',
+}
+
+
+# Sandbox SQLite profile, the pragmas set on each new connection
+# (sandbox.sqlite): a name in sandbox.sqlite.PROFILES, or a dict of pragmas.
+# None leaves SQLite's settings. 'tuned' switches the database file to WAL
+# mode for good, so opt in deliberately (benchsqlite compares the two).
+
+SANDBOX_SQLITE_PROFILE = None
+
+
+# Sandbox BOM index snapshot, mapped by the worker processes (sandbox.bomindex)
+
+SANDBOX_BOM_INDEX_PATH = os.path.join(BASE_DIR, 'bomindex.bin')
+
+
+# Sandbox natural key cache entries, shared by all models (sandbox.nkcache)
+# 0 disables the cache.
+
+SANDBOX_NATURAL_KEY_CACHE_SIZE = 0
+
+
+# Logging
+# https://docs.djangoproject.com/en/2.0/topics/logging/
+# sandbox.instrument logs each profile as one line of JSON.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'sandbox.instrument': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
 